@@ -8,14 +8,24 @@ of AprilTags markers.
 
 from .camera import Camera, FileCamera
 from .coordinates import Cartesian, LegacyPolar, Spherical, cartesian_to_spherical
-from .tokens import Token
+from .find_3D_coords import ResolutionFit
+from .frames import Frame
+from .pipeline import FrameMetadata, VisionStream
+from .pose import PoseEngine
+from .tokens import Token, TokenSet
 from .vision import Vision
 
 __all__ = [
     'Vision',
     'Camera',
     'FileCamera',
+    'Frame',
+    'FrameMetadata',
+    'VisionStream',
+    'PoseEngine',
+    'ResolutionFit',
     'Token',
+    'TokenSet',
     'Cartesian',
     'LegacyPolar',
     'Spherical',
@@ -0,0 +1,274 @@
+"""
+Adaptive configuration of the marker detector and the camera.
+
+Detecting quads in a decimated image is much cheaper than doing so at full
+resolution, though small (distant) markers are then missed. The controllers here
+choose between a ladder of detector settings, frame by frame, to keep the time
+spent on each frame within a budget while still seeing the markers in view; and
+between the resolutions a camera captures at, to raise the frame rate while the
+markers in view are large.
+"""
+
+import math
+from typing import Iterable, Optional, Sequence, Tuple  # noqa: F401
+
+from .native.apriltag import DEFAULT_QUAD_SETTINGS, QuadSettings
+
+# Ordered from the most expensive (full resolution) to the cheapest. Decimating
+# simply drops pixels, so the more heavily decimated levels also blur a little
+# to reduce the resulting noise.
+DEFAULT_LEVELS = (
+    DEFAULT_QUAD_SETTINGS,
+    QuadSettings(quad_decimate=1.5, quad_sigma=0.0, refine_edges=True),
+    QuadSettings(quad_decimate=2.0, quad_sigma=0.0, refine_edges=True),
+    QuadSettings(quad_decimate=3.0, quad_sigma=0.8, refine_edges=True),
+    QuadSettings(quad_decimate=4.0, quad_sigma=0.8, refine_edges=True),
+)
+
+# The side length, in pixels of the decimated image, below which we consider a
+# marker at risk of not being detected.
+MIN_DECIMATED_MARKER_SIZE = 24
+
+# How many consecutive frames without any markers before assuming they've
+# become too small to see and returning to full resolution.
+FRAMES_BEFORE_FULL_SEARCH = 2
+
+# Weighting given to the latest measurement in the running average of frame
+# processing times.
+SMOOTHING = 0.5
+
+# The area, in pixels of the captured image, below which we consider a marker at
+# risk of not being detected.
+MIN_MARKER_AREA = 32 ** 2
+
+# How much larger than `MIN_MARKER_AREA` the smallest marker must be at a lower
+# resolution before moving to it, so that a marker hovering around the threshold
+# doesn't cause the resolution to flap back and forth.
+RESOLUTION_HYSTERESIS = 2.0
+
+# How many consecutive frames must allow a lower resolution before moving to it.
+# Changing resolution means the camera discarding frames while it settles, so
+# it's only worth doing for a reasonably stable scene.
+FRAMES_BEFORE_REDUCTION = 15
+
+# How many consecutive frames without any markers before assuming they've
+# become too small to see and returning to the full resolution.
+FRAMES_BEFORE_FULL_RESOLUTION = 5
+
+
+def marker_pixel_size(pixel_corners: Sequence[Tuple[float, float]]) -> float:
+    """
+    Approximate side length, in pixels, of a marker with the given corners.
+
+    This is the square root of the area of the quadrilateral.
+    """
+    area = 0.0
+    for (x1, y1), (x2, y2) in zip(
+        pixel_corners,
+        list(pixel_corners[1:]) + [pixel_corners[0]],
+    ):
+        area += x1 * y2 - x2 * y1
+    return math.sqrt(abs(area) / 2)
+
+
+class AdaptiveDetectorController:
+    """
+    Choose detector settings to process frames within a latency budget.
+
+    After each frame, `update` is told how long the frame took and the sizes of
+    the markers seen. Settings are only made cheaper while the smallest marker
+    would remain comfortably detectable, and return towards full resolution as
+    markers get smaller or disappear.
+    """
+
+    def __init__(
+        self,
+        latency_budget: float,
+        *,
+        levels: Sequence[QuadSettings] = DEFAULT_LEVELS,
+        min_marker_size: float = MIN_DECIMATED_MARKER_SIZE
+    ) -> None:
+        """
+        Create a controller with the given budget (in seconds) per frame.
+
+        ``levels`` are the settings to choose between, from the most expensive
+        to the cheapest.
+        """
+        if latency_budget <= 0:
+            raise ValueError(
+                "Latency budget must be positive (got {})".format(latency_budget),
+            )
+        if not levels:
+            raise ValueError("Must provide at least one level of settings")
+
+        self.latency_budget = latency_budget
+        self.levels = tuple(levels)
+        self.min_marker_size = min_marker_size
+
+        self._level = 0
+        self._average_duration = None  # type: Optional[float]
+        self._frames_without_markers = 0
+
+    @property
+    def settings(self) -> QuadSettings:
+        """The settings to use for the next frame."""
+        return self.levels[self._level]
+
+    def _coarsest_level_for(self, marker_size: float) -> int:
+        """The cheapest level at which a marker of the given size is detectable."""
+        level = 0
+        for index, settings in enumerate(self.levels):
+            if marker_size / settings.quad_decimate >= self.min_marker_size:
+                level = index
+        return level
+
+    def _set_level(self, level: int) -> None:
+        if level != self._level:
+            self._level = level
+            # Timings from other settings don't tell us about these ones
+            self._average_duration = None
+
+    def update(self, duration: float, marker_sizes: Iterable[float]) -> QuadSettings:
+        """
+        Record the outcome of processing a frame with the current settings.
+
+        :param duration: time taken to process the frame, in seconds
+        :param marker_sizes: side lengths, in pixels, of the markers seen
+        :return: the settings to use for the next frame
+        """
+        marker_sizes = list(marker_sizes)
+
+        if not marker_sizes:
+            self._frames_without_markers += 1
+            if self._frames_without_markers >= FRAMES_BEFORE_FULL_SEARCH:
+                self._set_level(0)
+            return self.settings
+
+        self._frames_without_markers = 0
+
+        average = self._average_duration
+        if average is not None:
+            duration = SMOOTHING * duration + (1 - SMOOTHING) * average
+        self._average_duration = duration
+
+        coarsest = self._coarsest_level_for(min(marker_sizes))
+
+        if coarsest < self._level:
+            # Markers are getting too small for the current settings
+            self._set_level(coarsest)
+        elif duration > self.latency_budget:
+            self._set_level(min(self._level + 1, coarsest))
+
+        return self.settings
+
+
+class AdaptiveResolutionController:
+    """
+    Choose the resolution to capture at, to raise the frame rate when possible.
+
+    After each frame, `update` is told the areas of the markers seen. While the
+    smallest is comfortably large the resolution is reduced, after a number of
+    frames to be sure the scene is stable. It returns to full resolution as
+    soon as the smallest marker becomes too small, or once nothing has been
+    seen for a few frames.
+    """
+
+    def __init__(
+        self,
+        resolutions: Sequence[Tuple[int, int]],
+        *,
+        min_marker_area: float = MIN_MARKER_AREA,
+        hysteresis: float = RESOLUTION_HYSTERESIS,
+        frames_before_reduction: int = FRAMES_BEFORE_REDUCTION,
+        frames_before_full_resolution: int = FRAMES_BEFORE_FULL_RESOLUTION
+    ) -> None:
+        """
+        Create a controller choosing between the given resolutions.
+
+        ``resolutions`` are (width, height) pairs, from the full resolution to
+        the smallest.
+        """
+        if not resolutions:
+            raise ValueError("Must provide at least one resolution")
+
+        areas = [width * height for width, height in resolutions]
+        if areas != sorted(areas, reverse=True):
+            raise ValueError(
+                "Resolutions must be ordered from the largest (got {})".format(
+                    resolutions,
+                ),
+            )
+        if hysteresis < 1:
+            raise ValueError(
+                "Hysteresis must be at least 1 (got {})".format(hysteresis),
+            )
+
+        self.resolutions = tuple(resolutions)
+        self.min_marker_area = min_marker_area
+        self.hysteresis = hysteresis
+        self.frames_before_reduction = frames_before_reduction
+        self.frames_before_full_resolution = frames_before_full_resolution
+
+        self._index = 0
+        self._frames_allowing_reduction = 0
+        self._frames_without_markers = 0
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        """The resolution to capture the next frame at."""
+        return self.resolutions[self._index]
+
+    def _set_index(self, index: int) -> None:
+        self._index = index
+        self._frames_allowing_reduction = 0
+
+    def update(
+        self,
+        image_size: Tuple[int, int],
+        marker_areas: Iterable[float],
+    ) -> Tuple[int, int]:
+        """
+        Record the markers seen in a frame.
+
+        :param image_size: the size of the frame, which may have been captured
+                           before the resolution last changed
+        :param marker_areas: areas, in pixels, of the markers seen
+        :return: the resolution to capture the next frame at
+        """
+        marker_areas = list(marker_areas)
+
+        if not marker_areas:
+            self._frames_allowing_reduction = 0
+            self._frames_without_markers += 1
+            if self._frames_without_markers >= self.frames_before_full_resolution:
+                self._set_index(0)
+            return self.resolution
+
+        self._frames_without_markers = 0
+
+        # The area of the smallest marker per pixel of the image
+        width, height = image_size
+        smallest = min(marker_areas) / (width * height)
+
+        def smallest_at(resolution: Tuple[int, int]) -> float:
+            width, height = resolution
+            return smallest * width * height
+
+        if smallest_at(self.resolution) < self.min_marker_area:
+            self._set_index(0)
+            return self.resolution
+
+        comfortable_area = self.min_marker_area * self.hysteresis
+        target = self._index
+        for index in range(self._index + 1, len(self.resolutions)):
+            if smallest_at(self.resolutions[index]) >= comfortable_area:
+                target = index
+
+        if target == self._index:
+            self._frames_allowing_reduction = 0
+        else:
+            self._frames_allowing_reduction += 1
+            if self._frames_allowing_reduction >= self.frames_before_reduction:
+                self._set_index(target)
+
+        return self.resolution
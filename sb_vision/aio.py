@@ -0,0 +1,315 @@
+"""
+asyncio interfaces to the vision system.
+
+Capturing frames and detecting markers block for a long time, so they're run
+on a dedicated thread rather than on the event loop. The native calls release
+the GIL, so the event loop carries on running while they do.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+from typing import (  # noqa: F401
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .frames import Frame
+from .pipeline import DEFAULT_DEPTH, FrameMetadata, VisionStream
+from .tokens import Token, TokenSet
+from .vision import Vision
+
+if TYPE_CHECKING:
+    from .cvcapture import CaptureDevice  # noqa: F401
+
+# Returned in place of raising `StopIteration`, which can't cross a future
+_EXHAUSTED = object()
+
+
+def _next_or_exhausted(stream: VisionStream) -> Any:
+    try:
+        return next(stream)
+    except StopIteration:
+        return _EXHAUSTED
+
+
+class _Executor:
+    """
+    A single worker thread, on which blocking calls are run in turn.
+
+    Running the calls one at a time means that objects which aren't thread
+    safe (such as `Vision`) can be used safely from any number of tasks.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[concurrent.futures.Executor],
+    ) -> None:
+        self._owned = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.executor = executor
+
+    def run(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run the function on the worker, returning an awaitable of its result.
+
+        Cancelling the awaitable doesn't interrupt the function if it has
+        already started, though its result is then discarded.
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(
+            self.executor,
+            functools.partial(function, *args, **kwargs),
+        )
+
+    def shutdown(self) -> None:
+        """Stop the worker, if it's ours, once it's finished what it's doing."""
+        if self._owned:
+            self.executor.shutdown(wait=False)
+
+
+class AsyncFrames:
+    """
+    Asynchronous iterator over the tokens seen in successive frames.
+
+    This wraps a `VisionStream`, giving ``(metadata, tokens)`` for each frame
+    in the same way. The stream's queues provide the backpressure: with
+    ``drop_oldest`` a consumer which falls behind misses frames, otherwise
+    the stream waits for it.
+
+    The stream is started, on the executor, when the first frame is wanted.
+    It must be closed once finished with (for example by using this as an
+    asynchronous context manager).
+    """
+
+    def __init__(
+        self,
+        start_stream: Callable[[], VisionStream],
+        executor: _Executor,
+    ) -> None:
+        """Iterate over the stream which ``start_stream`` starts."""
+        self._start_stream = start_stream
+        self._stream = None  # type: Optional[VisionStream]
+        self._executor = executor
+
+    def __aiter__(self) -> 'AsyncFrames':
+        """Asynchronous iterator protocol."""
+        return self
+
+    async def __anext__(self) -> Tuple[FrameMetadata, TokenSet]:
+        """Get the tokens seen in the next frame, waiting for it if needed."""
+        if self._stream is None:
+            self._stream = await self._executor.run(self._start_stream)
+
+        item = await self._executor.run(_next_or_exhausted, self._stream)
+        if item is _EXHAUSTED:
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self) -> None:
+        """Stop the stream, waiting for it to finish."""
+        if self._stream is None:
+            return
+
+        # Not on our executor, since that may be waiting for the next frame,
+        # which closing the stream abandons.
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._stream.close)
+
+    async def __aenter__(self) -> 'AsyncFrames':
+        """Asynchronous context manager protocol. Closes the stream on exit."""
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        """Asynchronous context manager protocol. Closes the stream on exit."""
+        await self.aclose()
+
+
+class AsyncVision:
+    """
+    asyncio wrapper around a `Vision` instance.
+
+    All the work is done on one dedicated thread (or on the given
+    ``executor``), so the `Vision` is only used by one thread at a time and
+    the event loop never waits for the camera or the detector. Calls made
+    while another is in progress wait for it to finish.
+
+    While iterating over `frames` the `Vision` is in use by the stream, so
+    mustn't otherwise be used until that's closed.
+    """
+
+    def __init__(
+        self,
+        vision: Vision,
+        *,
+        executor: Optional[concurrent.futures.Executor] = None
+    ) -> None:
+        """
+        Wrap the given `Vision` instance.
+
+        If an ``executor`` is given it should have a single worker, and isn't
+        shut down by `close`.
+        """
+        self.vision = vision
+        self._executor = _Executor(executor)
+
+    async def snapshot(
+        self,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> List[Token]:
+        """Get a single list of tokens from one camera snapshot."""
+        return await self._executor.run(
+            self.vision.snapshot,
+            marker_ids=marker_ids,
+        )
+
+    async def snapshot_token_set(
+        self,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> TokenSet:
+        """Get the set of tokens seen in one camera snapshot."""
+        return await self._executor.run(
+            self.vision.snapshot_token_set,
+            marker_ids=marker_ids,
+        )
+
+    async def process_frame(
+        self,
+        frame: Frame,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> List[Token]:
+        """Run the given frame through the apriltags detection library."""
+        return await self._executor.run(
+            self.vision.process_frame,
+            frame,
+            marker_ids=marker_ids,
+        )
+
+    def frames(
+        self,
+        *,
+        depth: int = DEFAULT_DEPTH,
+        drop_oldest: bool = True,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> AsyncFrames:
+        """
+        Stream the tokens seen in successive camera snapshots.
+
+        This should be used as::
+
+            async with async_vision.frames() as frames:
+                async for metadata, tokens in frames:
+                    ...
+
+        The arguments are as for `Vision.stream`.
+        """
+        start_stream = functools.partial(
+            self.vision.stream,
+            depth=depth,
+            drop_oldest=drop_oldest,
+            marker_ids=marker_ids,
+        )
+        return AsyncFrames(start_stream, self._executor)
+
+    def close(self) -> None:
+        """Stop the dedicated thread, once it's finished what it's doing."""
+        self._executor.shutdown()
+
+    async def __aenter__(self) -> 'AsyncVision':
+        """Asynchronous context manager protocol. Closes on exit."""
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        """Asynchronous context manager protocol. Closes on exit."""
+        self.close()
+
+
+class AsyncCaptureDevice:
+    """
+    asyncio wrapper around a `cvcapture.CaptureDevice`.
+
+    Captures are done on one dedicated thread (or on the given ``executor``),
+    so the event loop never waits for the device.
+    """
+
+    def __init__(
+        self,
+        device: 'CaptureDevice',
+        *,
+        executor: Optional[concurrent.futures.Executor] = None
+    ) -> None:
+        """
+        Wrap the given device.
+
+        If an ``executor`` is given it should have a single worker, and isn't
+        shut down by `close`.
+        """
+        self.device = device
+        self._executor = _Executor(executor)
+        self._closed = False
+
+    async def acquire_frame(
+        self,
+        width: int,
+        height: int,
+        *,
+        max_age: Optional[float] = None
+    ) -> Frame:
+        """
+        Capture a single frame with the given width and height.
+
+        As `CaptureDevice.acquire_frame`, the frame must be released once the
+        caller is done with it. If this is cancelled, the frame is released
+        once it has been captured.
+        """
+        future = self._executor.run(
+            self.device.acquire_frame,
+            width,
+            height,
+            max_age=max_age,
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(_release_frame)
+            raise
+
+    async def capture(self, width: int, height: int) -> bytes:
+        """Capture a single image with the given width and height."""
+        return await self._executor.run(self.device.capture, width, height)
+
+    def close(self) -> None:
+        """
+        Close the device, and stop the dedicated thread once it's done.
+
+        The device is closed on the executor, after any capture in progress.
+        Closing an already closed device has no effect.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        self._executor.executor.submit(self.device.close)
+        self._executor.shutdown()
+
+    async def __aenter__(self) -> 'AsyncCaptureDevice':
+        """Asynchronous context manager protocol. Closes on exit."""
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        """Asynchronous context manager protocol. Closes on exit."""
+        self.close()
+
+
+def _release_frame(future: 'asyncio.Future[Frame]') -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().release()
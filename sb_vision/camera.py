@@ -7,13 +7,25 @@ Camera class could, for instance, fetch images from a file.
 """
 
 import pathlib
-from typing import Optional, Tuple, Union  # noqa: F401
-
+from typing import (  # noqa: F401
+    Callable,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
 from PIL import Image
 
 from sb_vision.cvcapture import CaptureDevice
 
+from .adaptive import AdaptiveResolutionController
 from .camera_base import CameraBase
+from .capture_backends import CaptureBackend
+from .find_3D_coords import ResolutionFit, load_camera_calibrations
+from .frames import Frame
 
 _PathLike = Union[str, pathlib.Path]
 
@@ -26,20 +38,83 @@ class Camera(CameraBase):
         device_id: int,
         proposed_image_size: Tuple[int, int],
         camera_model: Optional[str],
+        *,
+        streaming: bool = False,
+        resolution_fit: ResolutionFit = ResolutionFit.SCALE,
+        reduced_image_sizes: Sequence[Tuple[int, int]] = (),
+        raw_frames: bool = False,
+        pixel_format: Optional[str] = None,
+        fps: Optional[float] = None,
+        capture_backend: Optional[Callable[[], CaptureBackend]] = None
     ) -> None:
-        """Initialise camera with focal length and image size."""
-        super().__init__(camera_model)
+        """
+        Initialise camera with focal length and image size.
+
+        When ``streaming`` is enabled frames are grabbed continuously in the
+        background, so that capturing an image returns the latest frame
+        without waiting for stale frames to be discarded.
+
+        The calibration of the ``camera_model`` is rescaled to the image size,
+        if that differs, as described by ``resolution_fit``.
+
+        If any ``reduced_image_sizes`` are given (from the largest), the camera
+        captures at those lower resolutions while the markers in view are
+        large enough, as chosen by an `AdaptiveResolutionController`. Each
+        must fit the calibration of the ``camera_model`` as described by
+        ``resolution_fit``, otherwise `ResolutionMismatchError` is raised.
+
+        ``raw_frames``, ``pixel_format`` and ``fps`` are passed to the
+        `CaptureDevice`; the format and frame rate actually negotiated can be
+        read back with `get_pixel_format` and `get_fps`.
+
+        To capture other than through OpenCV, ``capture_backend`` creates the
+        `CaptureBackend` to use each time the camera is initialised. Those
+        options are then the backend's to choose, so can't also be given.
+        """
+        super().__init__(camera_model, resolution_fit=resolution_fit)
         self.cam_image_size = proposed_image_size
         self.device_id = device_id
+        self.streaming = streaming
+        self.raw_frames = raw_frames
+        self.pixel_format = pixel_format
+        self.fps = fps
+        self.capture_backend = capture_backend
         self.camera = None  # type: Optional[CaptureDevice]
 
+        if capture_backend is not None:
+            if raw_frames or pixel_format is not None or fps is not None:
+                raise ValueError(
+                    "Capture options must be given to the capture backend",
+                )
+
+        self.resolution_controller = None  # type: Optional[AdaptiveResolutionController]
+        if reduced_image_sizes:
+            if camera_model is not None:
+                # Raises ResolutionMismatchError (a ValueError) now, rather
+                # than only once the camera first switches to the size.
+                for image_size in reduced_image_sizes:
+                    load_camera_calibrations(camera_model, image_size, resolution_fit)
+            self.resolution_controller = AdaptiveResolutionController(
+                [proposed_image_size] + list(reduced_image_sizes),
+            )
+
     def init(self) -> None:
         """Open the actual device."""
         super().init()  # Call parent
         self._init_camera()
 
     def _init_camera(self) -> None:
-        self.camera = CaptureDevice(self.device_id)
+        if self.capture_backend is not None:
+            self.camera = CaptureDevice.from_backend(self.capture_backend())
+        else:
+            self.camera = CaptureDevice(
+                self.device_id,
+                raw_frames=self.raw_frames,
+                pixel_format=self.pixel_format,
+                fps=self.fps,
+            )
+        if self.streaming:
+            self.camera.start_streaming(*self._current_image_size())
 
     def _deinit_camera(self) -> None:
         if self.camera:
@@ -56,6 +131,27 @@ class Camera(CameraBase):
             raise RuntimeError(
                 "Must initialise camera before getting image size",
             )
+        return self._current_image_size()
+
+    def get_pixel_format(self) -> Optional[str]:
+        """Get the FOURCC code of the format the camera provides frames in."""
+        if self.camera is None:
+            raise RuntimeError(
+                "Must initialise camera before getting pixel format",
+            )
+        return self.camera.pixel_format
+
+    def get_fps(self) -> Optional[float]:
+        """Get the frame rate negotiated with the camera."""
+        if self.camera is None:
+            raise RuntimeError(
+                "Must initialise camera before getting frame rate",
+            )
+        return self.camera.fps
+
+    def _current_image_size(self) -> Tuple[int, int]:
+        if self.resolution_controller is not None:
+            return self.resolution_controller.resolution
         return self.cam_image_size
 
     def capture_image(self) -> Image:
@@ -65,27 +161,65 @@ class Camera(CameraBase):
         :return: PIL image object of the captured image in Luminosity
                  color scale
         """
+        with self.capture_frame() as frame:
+            return Image.frombytes('L', frame.size, frame.data)
+
+    def capture_frame(self) -> Frame:
+        """
+        Capture a frame, directly into a reusable buffer.
+
+        :return: Frame of the captured image in Luminosity color scale, which
+                 must be released once the caller is done with it
+        """
         if self.camera is None:
             raise RuntimeError("Capture device not available")
 
-        image_bytes = self.camera.capture(*self.cam_image_size)
-        return Image.frombytes('L', self.cam_image_size, image_bytes)
+        image_size = self._current_image_size()
+        if self.streaming:
+            # Restarts the stream if the resolution has changed
+            self.camera.start_streaming(*image_size)
+
+        return self.camera.acquire_frame(*image_size)
+
+    def update_resolution(
+        self,
+        image_size: Tuple[int, int],
+        marker_areas: Iterable[float],
+    ) -> None:
+        """Choose the resolution of later frames, given the markers seen."""
+        if self.resolution_controller is not None:
+            self.resolution_controller.update(image_size, marker_areas)
 
 
 class FileCamera(CameraBase):
     """Pseudo-camera debug class, getting images from files."""
 
-    def __init__(self, file_path: _PathLike, camera_model: Optional[str]) -> None:
+    live = False
+
+    def __init__(
+        self,
+        file_path: _PathLike,
+        camera_model: Optional[str],
+        *,
+        resolution_fit: ResolutionFit = ResolutionFit.SCALE
+    ) -> None:
         """Open from a given path, with a given pseudo-focal-length."""
-        super().__init__(camera_model)
+        super().__init__(camera_model, resolution_fit=resolution_fit)
         self.file_name = file_path
         self.image = None  # type: Optional[Image]
+        self._frame = None  # type: Optional[Frame]
 
     def init(self) -> None:
         """Open the file and read in the image."""
         super().init()
         self.image = Image.open(self.file_name).convert('L')
 
+        array = np.asarray(self.image, dtype=np.uint8)
+        # The same frame is handed out for every capture, so ensure that
+        # nothing can modify it.
+        array.setflags(write=False)
+        self._frame = Frame(array)
+
     def get_image_size(self) -> Tuple[int, int]:
         """Get the size of images captured by the camera."""
         if self.image is None:
@@ -104,3 +238,13 @@ class FileCamera(CameraBase):
         if self.image is None:
             raise RuntimeError("init() not called")
         return self.image
+
+    def capture_frame(self) -> Frame:
+        """
+        Capture a single frame.
+
+        As with `capture_image`, this is always the image loaded from the file.
+        """
+        if self._frame is None:
+            raise RuntimeError("init() not called")
+        return self._frame
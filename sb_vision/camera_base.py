@@ -5,17 +5,35 @@ A camera is an arbitrary source of images.
 """
 
 import abc
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Tuple
 
 import PIL
 
+from .find_3D_coords import ResolutionFit
+from .frames import Frame
+
 
 class CameraBase(metaclass=abc.ABCMeta):
     """Base class for all cameras."""
 
-    def __init__(self, camera_model: Optional[str]) -> None:
-        """Basic, general initialisation."""
+    # Whether frames arrive at the camera's own rate, as from a real camera,
+    # rather than being available as soon as they're asked for
+    live = True
+
+    def __init__(
+        self,
+        camera_model: Optional[str],
+        *,
+        resolution_fit: ResolutionFit = ResolutionFit.SCALE
+    ) -> None:
+        """
+        Basic, general initialisation.
+
+        ``resolution_fit`` describes how the camera's images relate to those
+        its model was calibrated with, if they are a different size.
+        """
         self.camera_model = camera_model
+        self.resolution_fit = resolution_fit
 
     def init(self) -> None:
         """
@@ -38,3 +56,29 @@ class CameraBase(metaclass=abc.ABCMeta):
         :return: PIL Image captured
         """
         raise NotImplementedError()
+
+    def capture_frame(self) -> Frame:
+        """
+        Capture a single frame from this camera.
+
+        The returned frame must be released once the caller is done with it
+        (for example by using it as a context manager).
+
+        Cameras which can capture directly into reusable buffers should
+        override this; the default implementation copies the result of
+        `capture_image`.
+        """
+        return Frame.from_image(self.capture_image())
+
+    def update_resolution(
+        self,
+        image_size: Tuple[int, int],
+        marker_areas: Iterable[float],
+    ) -> None:
+        """
+        Be told the areas, in pixels, of the markers seen in a frame.
+
+        Cameras which can adapt the resolution they capture at to what's in
+        view should override this; by default it does nothing.
+        """
+        pass
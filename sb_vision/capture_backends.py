@@ -0,0 +1,487 @@
+"""
+Sources of frames for a `CaptureDevice`.
+
+OpenCV's capture works with the widest range of cameras, though leaves no
+control over the driver's buffering. Video4Linux can be used directly instead,
+capturing into buffers mapped from the kernel. For testing (and benchmarking)
+without a camera, frames can be generated in-process.
+
+The native modules are only imported when a backend which needs them is
+created, so that (for instance) synthetic frames don't need OpenCV.
+"""
+
+import abc
+import io
+import math
+import time
+from typing import Callable, Dict, Optional, Tuple  # noqa: F401
+
+import numpy as np
+from PIL import Image
+
+from .cvcapture import (
+    DeviceOpenError,
+    ImageCaptureError,
+    fourcc_code,
+    fourcc_name,
+)
+
+# Kernel buffers to capture into: enough that the camera always has one to
+# fill while we read the others
+DEFAULT_BUFFER_COUNT = 4
+
+# How long, in seconds, to wait for the camera to provide a frame
+DEFAULT_TIMEOUT = 2.0
+
+DEFAULT_SYNTHETIC_FPS = 30.0
+
+# Generates a frame given its index, writing it into an array of its shape
+FrameGenerator = Callable[[int, np.ndarray], None]
+
+# Takes the luminance from a frame in the camera's format, given its stride
+_Converter = Callable[[memoryview, np.ndarray, int], None]
+
+
+def _check_fps(fps: Optional[float]) -> None:
+    if fps is not None and not fps > 0:
+        raise ValueError("Frame rate must be positive (got {})".format(fps))
+
+
+class CaptureBackend(metaclass=abc.ABCMeta):
+    """
+    A source of greyscale frames.
+
+    A `CaptureDevice` serialises calls to its backend, so backends need not be
+    thread safe. Frames are captured into an array whose shape gives the size
+    wanted, and the time (from `time.monotonic`) at which the frame was
+    grabbed is returned.
+    """
+
+    @abc.abstractmethod
+    def capture(self, array: np.ndarray) -> float:
+        """
+        Capture a new frame into the array.
+
+        Any frames the camera grabbed before this call are discarded.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def capture_latest(self, array: np.ndarray) -> float:
+        """
+        Capture the next frame into the array, as when streaming.
+
+        This is the most recent frame the camera grabbed since the last
+        capture, waiting for one if there isn't one.
+        """
+        raise NotImplementedError
+
+    @property
+    def raw_frames(self) -> bool:
+        """Whether frames are captured in the camera's own format."""
+        return True
+
+    @property
+    def pixel_format(self) -> Optional[str]:
+        """The FOURCC code of the format frames are provided in, if known."""
+        return None
+
+    @property
+    def fps(self) -> Optional[float]:
+        """The frame rate frames are provided at, if known."""
+        return None
+
+    def close(self) -> None:
+        """Release the camera."""
+        pass
+
+
+class OpenCVBackend(CaptureBackend):
+    """Capture through OpenCV's `VideoCapture`."""
+
+    def __init__(
+        self,
+        device_id: int,
+        *,
+        raw_frames: bool = False,
+        pixel_format: Optional[str] = None,
+        fps: Optional[float] = None
+    ) -> None:
+        """Open the device, as described by `CaptureDevice`."""
+        from .native import _cvcapture
+
+        self._ffi = _cvcapture.ffi
+        self._lib = _cvcapture.lib
+        self._instance = None
+
+        fourcc = 0
+        if pixel_format is not None:
+            fourcc = fourcc_code(pixel_format)
+        _check_fps(fps)
+
+        instance = self._lib.cvopen(device_id, raw_frames, fourcc, fps or 0)
+        if instance == self._ffi.NULL:
+            raise DeviceOpenError(device_id)
+        self._instance = instance
+
+    def _read_into(self, capture_function, array: np.ndarray) -> float:
+        height, width = array.shape
+        status = capture_function(
+            self._instance,
+            self._ffi.from_buffer(array),
+            width,
+            height,
+        )
+
+        if status == 0:
+            raise ImageCaptureError()
+        return time.monotonic()
+
+    def capture(self, array: np.ndarray) -> float:
+        """Capture a new frame into the array."""
+        return self._read_into(self._lib.cvcapture, array)
+
+    def capture_latest(self, array: np.ndarray) -> float:
+        """Capture the next frame into the array."""
+        return self._read_into(self._lib.cvcapture_latest, array)
+
+    @property
+    def raw_frames(self) -> bool:
+        """Whether OpenCV is providing frames in the camera's own format."""
+        return bool(self._lib.cvraw_frames(self._instance))
+
+    @property
+    def pixel_format(self) -> Optional[str]:
+        """The FOURCC code of the format the camera is providing frames in."""
+        return fourcc_name(self._lib.cvfourcc(self._instance))
+
+    @property
+    def fps(self) -> Optional[float]:
+        """The frame rate negotiated with the camera."""
+        fps = self._lib.cvfps(self._instance)
+        return fps if fps > 0 else None
+
+    def close(self) -> None:
+        """Release the camera."""
+        if self._instance is not None:
+            self._lib.cvclose(self._instance)
+            self._instance = None
+
+
+def _packed_luminance(offset: int) -> _Converter:
+    # For 4:2:2 formats, where every other byte is a luminance sample
+    def convert(data: memoryview, array: np.ndarray, bytes_per_line: int) -> None:
+        height, width = array.shape
+        rows = np.frombuffer(data, dtype=np.uint8, count=bytes_per_line * height)
+        rows = rows.reshape(height, bytes_per_line)
+        np.copyto(array, rows[:, offset:offset + 2 * width:2])
+
+    return convert
+
+
+def _greyscale(data: memoryview, array: np.ndarray, bytes_per_line: int) -> None:
+    height, width = array.shape
+    rows = np.frombuffer(data, dtype=np.uint8, count=bytes_per_line * height)
+    np.copyto(array, rows.reshape(height, bytes_per_line)[:, :width])
+
+
+def _jpeg_luminance(data: memoryview, array: np.ndarray, bytes_per_line: int) -> None:
+    image = Image.open(io.BytesIO(data))
+    # Decode only the luminance, without converting through colour
+    image.draft('L', image.size)
+    luminance = image.convert('L')
+
+    height, width = array.shape
+    if luminance.size != (width, height):
+        raise ImageCaptureError(
+            "Frame is {}x{}, expected {}x{}".format(
+                luminance.width,
+                luminance.height,
+                width,
+                height,
+            ),
+        )
+    np.copyto(array, np.asarray(luminance))
+
+
+# How to take the luminance from the formats we can capture in
+_CONVERTERS = {
+    'GREY': _greyscale,
+    'YUYV': _packed_luminance(0),
+    'YVYU': _packed_luminance(0),
+    'UYVY': _packed_luminance(1),
+    'VYUY': _packed_luminance(1),
+    'MJPG': _jpeg_luminance,
+    'JPEG': _jpeg_luminance,
+}  # type: Dict[str, _Converter]
+
+
+class V4L2Backend(CaptureBackend):
+    """
+    Capture through Video4Linux, into buffers mapped from the kernel.
+
+    The driver fills a queue of ``buffer_count`` buffers, which are handed
+    back to it as soon as each frame is read, so there is always somewhere to
+    put new frames. Frames are timestamped by the kernel as they're grabbed,
+    rather than when they are read.
+    """
+
+    def __init__(
+        self,
+        device_id: int,
+        *,
+        pixel_format: Optional[str] = None,
+        fps: Optional[float] = None,
+        buffer_count: int = DEFAULT_BUFFER_COUNT,
+        timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+        """
+        Open the device with the given udev 'MINOR' device number.
+
+        ``pixel_format`` and ``fps`` are requested as with `CaptureDevice`.
+        The format must be one whose luminance we know how to take (greyscale,
+        packed 4:2:2 YUV, or MJPEG). ``timeout`` is how long, in seconds, to
+        wait for each frame.
+        """
+        from .native import _v4l2capture
+
+        self._ffi = _v4l2capture.ffi
+        self._lib = _v4l2capture.lib
+        self._context = None
+
+        self._fourcc = 0
+        if pixel_format is not None:
+            if pixel_format not in _CONVERTERS:
+                raise ValueError(
+                    "Unsupported pixel format {!r}, must be one of {}".format(
+                        pixel_format,
+                        ", ".join(sorted(_CONVERTERS)),
+                    ),
+                )
+            self._fourcc = fourcc_code(pixel_format)
+        _check_fps(fps)
+        self._fps = fps
+
+        if not 2 <= buffer_count <= self._lib.V4L2CAPTURE_MAX_BUFFERS:
+            raise ValueError(
+                "Buffer count must be between 2 and {} (got {})".format(
+                    self._lib.V4L2CAPTURE_MAX_BUFFERS,
+                    buffer_count,
+                ),
+            )
+        self.buffer_count = buffer_count
+        self.timeout = timeout
+
+        # The size the device is configured for, along with the stride of its
+        # frames and how to convert them
+        self._size = None  # type: Optional[Tuple[int, int]]
+        self._bytes_per_line = 0
+        self._convert = _greyscale  # type: _Converter
+
+        # Dequeued frames: the one being read, and any newer one
+        self._frame = self._ffi.new('struct v4l2capture_frame *')
+        self._newer_frame = self._ffi.new('struct v4l2capture_frame *')
+
+        context = self._lib.v4l2capture_open(device_id)
+        if context == self._ffi.NULL:
+            raise DeviceOpenError(device_id)
+        self._context = context
+
+    def _capture_format(self):
+        capture_format = self._ffi.new('struct v4l2capture_format *')
+        if not self._lib.v4l2capture_get_format(self._context, capture_format):
+            raise ImageCaptureError("Unable to get the capture format")
+        return capture_format
+
+    def _configure(self, array: np.ndarray) -> None:
+        height, width = array.shape
+        if self._size == (width, height):
+            return
+
+        self._size = None
+        configured = self._lib.v4l2capture_configure(
+            self._context,
+            width,
+            height,
+            self._fourcc,
+            self._fps or 0,
+            self.buffer_count,
+        )
+        if not configured:
+            raise ImageCaptureError(
+                "Unable to capture at {}x{}".format(width, height),
+            )
+
+        capture_format = self._capture_format()
+        pixel_format = fourcc_name(capture_format.fourcc)
+        if pixel_format is None or pixel_format not in _CONVERTERS:
+            raise ImageCaptureError(
+                "Unsupported pixel format {!r}".format(pixel_format),
+            )
+
+        self._convert = _CONVERTERS[pixel_format]
+        self._bytes_per_line = capture_format.bytes_per_line
+        self._size = (width, height)
+
+    def _dequeue(self, frame, timeout: float) -> bool:
+        status = self._lib.v4l2capture_dequeue(self._context, timeout, frame)
+        if status < 0:
+            raise ImageCaptureError("Unable to dequeue a frame")
+        return status == 1
+
+    def _requeue(self, frame) -> None:
+        if not self._lib.v4l2capture_requeue(self._context, frame.index):
+            raise ImageCaptureError("Unable to requeue a frame")
+
+    def _wait_for_frame(self) -> None:
+        if not self._dequeue(self._frame, self.timeout):
+            raise ImageCaptureError(
+                "No frame within {} seconds".format(self.timeout),
+            )
+
+    def _read_frame(self, array: np.ndarray) -> float:
+        frame = self._frame
+        try:
+            self._convert(
+                self._ffi.buffer(frame.data, frame.length),
+                array,
+                self._bytes_per_line,
+            )
+        except (ValueError, OSError) as e:
+            # Truncated or corrupt frames
+            raise ImageCaptureError(
+                "Unable to read frame: {}".format(e),
+            ) from e
+        finally:
+            self._requeue(frame)
+
+        if frame.timestamp < 0:
+            return time.monotonic()
+        return frame.timestamp
+
+    def capture(self, array: np.ndarray) -> float:
+        """Capture a new frame into the array."""
+        self._configure(array)
+
+        # Hand back any frames grabbed before now
+        while self._dequeue(self._frame, 0):
+            self._requeue(self._frame)
+
+        self._wait_for_frame()
+        return self._read_frame(array)
+
+    def capture_latest(self, array: np.ndarray) -> float:
+        """Capture the next frame into the array."""
+        self._configure(array)
+
+        self._wait_for_frame()
+        # Skip to the newest frame already waiting
+        while self._dequeue(self._newer_frame, 0):
+            self._requeue(self._frame)
+            self._frame, self._newer_frame = self._newer_frame, self._frame
+
+        return self._read_frame(array)
+
+    @property
+    def pixel_format(self) -> Optional[str]:
+        """The FOURCC code of the format the camera is providing frames in."""
+        return fourcc_name(self._capture_format().fourcc)
+
+    @property
+    def fps(self) -> Optional[float]:
+        """The frame rate negotiated with the camera."""
+        fps = self._capture_format().fps
+        return fps if fps > 0 else None
+
+    def close(self) -> None:
+        """Release the camera, and the buffers mapped from it."""
+        if self._context is not None:
+            self._lib.v4l2capture_close(self._context)
+            self._context = None
+
+
+def gradient_frames(index: int, array: np.ndarray) -> None:
+    """Generate a diagonal gradient, which moves one pixel each frame."""
+    height, width = array.shape
+    columns = np.arange(width, dtype=np.int64)
+    rows = np.arange(height, dtype=np.int64)[:, np.newaxis]
+    array[...] = (columns + rows + index) % 256
+
+
+def still_frames(image: Image.Image) -> FrameGenerator:
+    """Generate frames which are all the given image, scaled to fit."""
+    image = image.convert('L')
+    scaled = {}  # type: Dict[Tuple[int, int], np.ndarray]
+
+    def generate(index: int, array: np.ndarray) -> None:
+        height, width = array.shape
+        size = (width, height)
+        if size not in scaled:
+            resized = image
+            if image.size != size:
+                resized = image.resize(size, Image.BILINEAR)  # type: ignore
+            scaled[size] = np.asarray(resized)
+        np.copyto(array, scaled[size])
+
+    return generate
+
+
+class SyntheticBackend(CaptureBackend):
+    """
+    Generate frames in-process, standing in for a camera.
+
+    Frames are emitted at a steady ``fps`` from when the backend is created,
+    whether or not they're captured, so captures wait for (and are timestamped
+    at) the next frame due as they would with a camera.
+    """
+
+    def __init__(
+        self,
+        fps: float = DEFAULT_SYNTHETIC_FPS,
+        *,
+        generate: FrameGenerator = gradient_frames
+    ) -> None:
+        """
+        Emit frames at ``fps``, each written by ``generate``.
+
+        ``generate`` is given the index of the frame, counting all those
+        emitted, along with the array to write it into.
+        """
+        _check_fps(fps)
+        self._fps = fps
+        self._generate = generate
+        self._start = time.monotonic()
+        self._last_index = -1
+
+    def _latest_index(self) -> int:
+        return int(math.floor((time.monotonic() - self._start) * self._fps))
+
+    def _emit(self, index: int, array: np.ndarray) -> float:
+        timestamp = self._start + index / self._fps
+        delay = timestamp - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        self._generate(index, array)
+        self._last_index = index
+        return timestamp
+
+    def capture(self, array: np.ndarray) -> float:
+        """Wait for, and generate, the next frame due."""
+        index = max(self._latest_index() + 1, self._last_index + 1)
+        return self._emit(index, array)
+
+    def capture_latest(self, array: np.ndarray) -> float:
+        """Generate the latest frame due, waiting for one if needed."""
+        index = max(self._latest_index(), self._last_index + 1)
+        return self._emit(index, array)
+
+    @property
+    def pixel_format(self) -> Optional[str]:
+        """Frames are generated in greyscale."""
+        return 'GREY'
+
+    @property
+    def fps(self) -> Optional[float]:
+        """The rate at which frames are emitted."""
+        return self._fps
@@ -1,10 +1,12 @@
 """Debug code, load the first video device seen and capture an image."""
 
+import argparse
 import contextlib
 import math
 import pathlib
 
 from ..camera import Camera, CameraBase, FileCamera  # noqa: F401
+from ..find_3D_coords import ResolutionFit
 from ..token_display import display_tokens
 from ..vision import Vision
 
@@ -42,15 +44,34 @@ def _capture_and_display_image(
             pass
 
 
-def main(input_file, device_id, camera_model, **options):
+def _resolution(text):
+    try:
+        width, height = (int(x) for x in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "Resolution must be given as WIDTHxHEIGHT (got {!r})".format(text),
+        ) from None
+    return width, height
+
+
+def main(
+    input_file,
+    device_id,
+    camera_model,
+    resolution,
+    resolution_fit,
+    **options
+):
     """Execute this command."""
+    resolution_fit = ResolutionFit(resolution_fit)
+
     with contextlib.suppress(KeyboardInterrupt):
         if device_id is not None:
-            CAM_IMAGE_SIZE = (1280, 720)
             camera = Camera(
                 device_id,
-                CAM_IMAGE_SIZE,
+                resolution,
                 camera_model,
+                resolution_fit=resolution_fit,
             )  # type: CameraBase
 
             def should_continue():
@@ -59,7 +80,11 @@ def main(input_file, device_id, camera_model, **options):
                 ).lower() in ('y', '')
 
         else:
-            camera = FileCamera(input_file, camera_model)
+            camera = FileCamera(
+                input_file,
+                camera_model,
+                resolution_fit=resolution_fit,
+            )
 
             def should_continue():
                 return False
@@ -93,6 +118,21 @@ def add_arguments(parser):
         type=pathlib.Path,
         help="Model of the camera to use calibrations for.",
     )
+    parser.add_argument(
+        '-r',
+        '--resolution',
+        type=_resolution,
+        default=(1280, 720),
+        help="Resolution to capture images from the camera at, as WIDTHxHEIGHT, "
+             "default: 1280x720.",
+    )
+    parser.add_argument(
+        '--resolution-fit',
+        choices=[x.value for x in ResolutionFit],
+        default=ResolutionFit.SCALE.value,
+        help="How images relate to the resolution the camera model was "
+             "calibrated at, if different, default: %(default)s.",
+    )
     parser.add_argument(
         '--draw-tokens',
         action='store_true',
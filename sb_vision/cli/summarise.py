@@ -2,43 +2,130 @@
 
 import argparse
 import contextlib
+import functools
 import json
+import multiprocessing
 import pathlib
 import sys
-from typing import Sequence, TextIO
+from typing import (  # noqa: F401
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+import numpy as np
 
 from ..camera import FileCamera
+from ..coordinates import (
+    Cartesian,
+    LegacyPolar,
+    Spherical,
+    cartesians_to_legacy_polars,
+    cartesians_to_sphericals,
+)
 from ..vision import Vision
 
+# Name -> (the names of the fields, conversion from an (N, 3) array of
+# cartesians to an (N, 3) array in this system)
+COORDINATE_SYSTEMS = {
+    'cartesian': (Cartesian._fields, np.asarray),
+    'spherical': (Spherical._fields, cartesians_to_sphericals),
+    'legacy-polar': (LegacyPolar._fields, cartesians_to_legacy_polars),
+}  # type: Dict[str, Tuple[Sequence[str], Callable[[np.ndarray], np.ndarray]]]
+
+
+# Name -> (the line starting the output, if any; how each position is written)
+OUTPUT_FORMATS = {
+    'yaml': ('version: 1\nfiles:', ' - {}'.format),
+    'json-lines': (None, str),
+}  # type: Dict[str, Tuple[Optional[str], Callable[[str], str]]]
+
+# The position of the marker seen in an image, or a message explaining why
+# there wasn't one
+_Summary = Tuple[Optional[Dict[str, Any]], Optional[str]]
+
+
+def _summarise(
+    image_file: pathlib.Path,
+    camera_model: str,
+    coordinates: str,
+) -> _Summary:
+    """
+    Find the position of the one marker in the given image.
+
+    This is run in the worker processes, so only deals in things which can
+    be pickled.
+    """
+    fields, convert = COORDINATE_SYSTEMS[coordinates]
+
+    camera = FileCamera(image_file, camera_model)
+    tokens = Vision(camera).snapshot_token_set()
+
+    if len(tokens) != 1:
+        return None, "Didn't see one token in '{}' (saw {:d})".format(
+            image_file,
+            len(tokens),
+        )
+
+    translations = tokens.translations
+    if translations is None:
+        return None, "Positions need a camera model"
+
+    position, = convert(translations).tolist()
+    info = {'image': str(image_file)}  # type: Dict[str, Any]
+    info.update(
+        (field, round(value, 4))
+        for field, value in zip(fields, position)
+    )
+    return info, None
+
 
-def main(files: Sequence[pathlib.Path], camera_model: str, output: TextIO):
+def main(
+    files: Sequence[pathlib.Path],
+    camera_model: str,
+    output: TextIO,
+    coordinates: str = 'cartesian',
+    output_format: str = 'yaml',
+    jobs: int = 1,
+):
     """Execute this command."""
-    with contextlib.suppress(KeyboardInterrupt):
-        print('version: 1', file=output)
-        print('files:', file=output)
-
-        for image_file in sorted(files):
-            camera = FileCamera(image_file, camera_model)
-            tokens = Vision(camera).snapshot()
-
-            if len(tokens) != 1:
-                print(
-                    "Didn't see one token in '{}' (saw {:d})".format(
-                        image_file,
-                        len(tokens),
-                    ),
-                    file=sys.stderr,
-                )
+    if camera_model is None:
+        print("Positions need a camera model", file=sys.stderr)
+        return
+
+    header, format_line = OUTPUT_FORMATS[output_format]
+    summarise = functools.partial(
+        _summarise,
+        camera_model=camera_model,
+        coordinates=coordinates,
+    )
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(contextlib.suppress(KeyboardInterrupt))
+
+        if jobs > 1:
+            pool = stack.enter_context(multiprocessing.Pool(jobs))
+            # In order, but each as soon as it (and those before it) are done
+            summaries = pool.imap(summarise, sorted(files))  # type: Iterable[_Summary]
+        else:
+            summaries = map(summarise, sorted(files))
+
+        if header is not None:
+            print(header, file=output)
+
+        for info, message in summaries:
+            if info is None:
+                print(message, file=sys.stderr)
                 continue
 
-            token, = tokens
-            info = {
-                'image': str(image_file),
-                'x': round(token.cartesian[0], 4),
-                'y': round(token.cartesian[1], 4),
-                'z': round(token.cartesian[2], 4),
-            }
-            print(' - {}'.format(json.dumps(info, sort_keys=True)), file=output)
+            print(format_line(json.dumps(info, sort_keys=True)), file=output)
+            # Let whatever is reading the output see each result as it comes
+            output.flush()
 
 
 def add_arguments(parser):
@@ -62,3 +149,28 @@ def add_arguments(parser):
         type=argparse.FileType(mode='w'),
         default=sys.stdout,
     )
+    parser.add_argument(
+        '-c',
+        '--coordinates',
+        choices=sorted(COORDINATE_SYSTEMS),
+        default='cartesian',
+        help="The coordinate system to give positions in, default: %(default)s",
+    )
+    parser.add_argument(
+        '-f',
+        '--format',
+        dest='output_format',
+        choices=sorted(OUTPUT_FORMATS),
+        default='yaml',
+        help=(
+            "The format to write the output in, default: %(default)s; "
+            "json-lines gives one JSON object per image"
+        ),
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help="The number of processes to look at images in, default: %(default)s",
+    )
@@ -61,3 +61,55 @@ def cartesian_to_legacy_polar(cartesian: Cartesian) -> LegacyPolar:
     polar_x = np.arctan2(cart_z, cart_x)
     polar_y = np.arctan2(cart_z, cart_y)
     return LegacyPolar(polar_x, polar_y, polar_dist)
+
+
+def _cartesian_rows(cartesians: np.ndarray) -> np.ndarray:
+    """View (or copy) the given cartesians as an (N, 3) array of float64."""
+    cartesians = np.asarray(cartesians, dtype=float64)
+    if cartesians.ndim != 2 or cartesians.shape[1] != 3:
+        raise ValueError(
+            "Expected an (N, 3) array of cartesians (got shape {})".format(
+                cartesians.shape,
+            ),
+        )
+    return cartesians
+
+
+def _norms(cartesians: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Calculate the length of each row of an (N, 3) array into ``out``."""
+    np.einsum('ij,ij->i', cartesians, cartesians, out=out)
+    return np.sqrt(out, out=out)
+
+
+def cartesians_to_sphericals(cartesians: np.ndarray) -> np.ndarray:
+    """
+    Convert an (N, 3) array of Cartesian coordinates into spherical ones.
+
+    This is as `cartesian_to_spherical` for each row, with the columns of the
+    result in the order of the fields of `Spherical`.
+    """
+    cartesians = _cartesian_rows(cartesians)
+    x, y, z = cartesians.T
+
+    sphericals = np.empty_like(cartesians)
+    arctan2(y, z, out=sphericals[:, 0])
+    arctan2(x, z, out=sphericals[:, 1])
+    _norms(cartesians, sphericals[:, 2])
+    return sphericals
+
+
+def cartesians_to_legacy_polars(cartesians: np.ndarray) -> np.ndarray:
+    """
+    Convert an (N, 3) array of Cartesian coordinates into legacy "polar" ones.
+
+    This is as `cartesian_to_legacy_polar` for each row, with the columns of
+    the result in the order of the fields of `LegacyPolar`.
+    """
+    cartesians = _cartesian_rows(cartesians)
+    x, y, z = cartesians.T
+
+    polars = np.empty_like(cartesians)
+    arctan2(z, x, out=polars[:, 0])
+    arctan2(z, y, out=polars[:, 1])
+    _norms(cartesians, polars[:, 2])
+    return polars
@@ -2,12 +2,25 @@
 Python wrapping around cffi layer to interop to OpenCV 3D functions.
 """
 
-from typing import Sequence, Tuple
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 from sb_vision.native import _cv3d  # type: ignore
 
 from .coordinates import Cartesian, PixelCoordinate
 
+# Values which may be given to OpenCV, either as arrays or as nested sequences
+Matrix = Union[np.ndarray, Sequence[Sequence[float]]]
+
+# The native functions support OpenCV's 5 coefficient distortion model
+DISTANCE_COEFFICIENTS_COUNT = 5
+
+
+# Methods which `solve_pnp_batch` can use
+PNP_METHOD_ITERATIVE = _cv3d.lib.PNP_METHOD_ITERATIVE
+PNP_METHOD_IPPE_SQUARE = _cv3d.lib.PNP_METHOD_IPPE_SQUARE
+
 
 class Cv3dError(RuntimeError):
     """A 3D related OpenCV error."""
@@ -15,47 +28,121 @@ class Cv3dError(RuntimeError):
     pass
 
 
-def _ffi_flattened_float_array(values: Sequence[Sequence[float]]):
-    if not values:
-        raise ValueError("Refusing to create ffi matrix for empty 'values'.")
+def pnp_method_supported(method: int) -> bool:
+    """Whether the version of OpenCV in use supports the given PnP method."""
+    return bool(_cv3d.lib.pnp_method_supported(method))
+
+
+def _as_double_array(values: Any, size: int, description: str) -> np.ndarray:
+    """
+    Convert the given values to a C-contiguous array of doubles.
 
-    lengths = list({len(x) for x in values})
-    if len(lengths) != 1:
+    Arrays which are already suitable are used as they are, without copying.
+    """
+    try:
+        array = np.ascontiguousarray(values, dtype=np.float64)
+    except ValueError:
         raise ValueError(
-            "'values' is not rectangular (got row lengths of {} and {})".format(
-                ", ".join(str(x) for x in lengths[:-1]),
-                lengths[-1],
-            ),
+            "{} is not rectangular (got {!r})".format(description, values),
+        ) from None
+
+    if array.size != size:
+        raise ValueError("Expected {} values for {}, got {} ({!r})".format(
+            size,
+            description,
+            array.size,
+            values,
+        ))
+
+    return array
+
+
+def _ffi_double_pointer(array: np.ndarray):
+    """
+    Get a pointer to the data of a C-contiguous array of doubles.
+
+    The caller must keep ``array`` alive for as long as the pointer is used.
+    """
+    return _cv3d.ffi.cast('double *', _cv3d.ffi.from_buffer(array))
+
+
+class CameraCalibration:
+    """
+    The calibration of a camera, prepared for repeated use with OpenCV.
+
+    The calibration values are held in (read-only) arrays which are passed to
+    OpenCV directly, so are only converted once however many markers they are
+    used for.
+
+    For compatibility, this unpacks into lists of the camera matrix and the
+    distance coefficients:
+
+    >>> camera_matrix, distance_coefficients = calibration
+    """
+
+    def __init__(
+        self,
+        camera_matrix: Matrix,
+        distance_coefficients: Matrix,
+    ) -> None:
+        """Prepare the given (3x3) camera matrix and distance coefficients."""
+        self.camera_matrix = _as_double_array(camera_matrix, 9, "camera matrix")
+        self.distance_coefficients = _as_double_array(
+            distance_coefficients,
+            DISTANCE_COEFFICIENTS_COUNT,
+            "distance coefficients",
         )
 
-    flattened_values = sum([tuple(x) for x in values], ())
-    count = len(values) * lengths[0]
+        self.camera_matrix.setflags(write=False)
+        self.distance_coefficients.setflags(write=False)
+
+        self._camera_matrix_pointer = _ffi_double_pointer(self.camera_matrix)
+        self._distance_coefficients_pointer = _ffi_double_pointer(
+            self.distance_coefficients,
+        )
 
-    return _cv3d.ffi.new('double[{}]'.format(count), flattened_values)
+    def __iter__(self) -> Iterator[List[List[float]]]:
+        """Unpack into the camera matrix and distance coefficients, as lists."""
+        yield self.camera_matrix.tolist()
+        yield self.distance_coefficients.tolist()
+
+    def __repr__(self) -> str:
+        """General debug representation."""
+        return "CameraCalibration({!r}, {!r})".format(*self)
 
 
 def solve_pnp(
-    object_points: Sequence[Sequence[float]],
-    pixel_corners: Sequence[PixelCoordinate],
-    camera_matrix: Sequence[Sequence[float]],
-    distance_coefficients: Sequence[Sequence[float]],
+    object_points: Matrix,
+    pixel_corners: Union[np.ndarray, Sequence[PixelCoordinate]],
+    camera_matrix: Matrix,
+    distance_coefficients: Matrix,
 ) -> Tuple[Cartesian, Tuple[float, float, float]]:
     """
     Wrapper around OpenCV solvePnP.
 
-    See the OpenCV docs for details.
+    See the OpenCV docs for details. Each of the arguments may either be NumPy
+    arrays or nested sequences of values.
     """
     # https://docs.opencv.org/2.4/modules/calib3d/doc/camera_calibration_and_3d_reconstruction.html#solvepnp
     # https://docs.opencv.org/master/d9/d0c/group__calib3d.html#ga549c2075fac14829ff4a58bc931c033d
 
+    object_points_array = _as_double_array(object_points, 4 * 3, "object points")
+    pixel_corners_array = _as_double_array(pixel_corners, 4 * 2, "pixel corners")
+    camera_matrix_array = _as_double_array(camera_matrix, 9, "camera matrix")
+    distance_coefficients_array = _as_double_array(
+        distance_coefficients,
+        DISTANCE_COEFFICIENTS_COUNT,
+        "distance coefficients",
+    )
+
     orientation_vector = _cv3d.ffi.new('double[3]')
     translation_vector = _cv3d.ffi.new('double[3]')
 
     return_value = _cv3d.lib.solve_pnp(
-        _ffi_flattened_float_array(object_points),
-        _ffi_flattened_float_array(pixel_corners),
-        _ffi_flattened_float_array(camera_matrix),
-        _ffi_flattened_float_array(distance_coefficients),
+        _ffi_double_pointer(object_points_array),
+        _ffi_double_pointer(pixel_corners_array),
+        _ffi_double_pointer(camera_matrix_array),
+        _ffi_double_pointer(distance_coefficients_array),
         orientation_vector,
         translation_vector,
     )
@@ -70,3 +157,105 @@ def solve_pnp(
             float(orientation_vector[2]),
         ),
     )
+
+
+def solve_pnp_batch(
+    object_points: np.ndarray,
+    image_points: np.ndarray,
+    calibration: CameraCalibration,
+    *,
+    method: int = PNP_METHOD_ITERATIVE,
+    initial_translations: Optional[np.ndarray] = None,
+    initial_orientations: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Wrapper around OpenCV solvePnP, for several markers at once.
+
+    With ``method`` as `PNP_METHOD_IPPE_SQUARE`, square markers are solved with
+    OpenCV's closed form solver for squares, rather than iteratively. Other
+    markers are always solved iteratively.
+
+    The iterative solver can be started from an initial guess at each marker's
+    pose, such as its pose in the previous frame, which is both faster and
+    gives steadier results. Markers without a guess have rows of NaN.
+
+    :param object_points: (N, 4, 3) array of the corners of each marker
+    :param image_points: (N, 4, 2) array of the pixel corners of each marker
+    :param calibration: the calibration of the camera, shared by all markers
+    :param method: the method to solve with
+    :param initial_translations: optional (N, 3) array of the initial guess at
+                                 the translation of each marker
+    :param initial_orientations: optional (N, 3) array of the initial guess at
+                                 the orientation of each marker
+    :return: (N, 3) arrays of the translation and orientation vectors of each
+             marker
+    """
+    object_points = np.ascontiguousarray(object_points, dtype=np.float64)
+    image_points = np.ascontiguousarray(image_points, dtype=np.float64)
+
+    count = len(object_points)
+    if object_points.shape != (count, 4, 3):
+        raise ValueError(
+            "Expected object points of shape (N, 4, 3), got {}".format(
+                object_points.shape,
+            ),
+        )
+    if image_points.shape != (count, 4, 2):
+        raise ValueError(
+            "Expected image points of shape ({}, 4, 2), got {}".format(
+                count,
+                image_points.shape,
+            ),
+        )
+
+    if not pnp_method_supported(method):
+        raise Cv3dError(
+            "PnP method {} is not supported by this version of OpenCV".format(
+                method,
+            ),
+        )
+
+    if (initial_translations is None) != (initial_orientations is None):
+        raise ValueError(
+            "Must provide both initial translations and orientations, or neither",
+        )
+
+    # The solver overwrites the initial guesses with its results
+    use_extrinsic_guess = _cv3d.ffi.NULL
+    if initial_translations is None or initial_orientations is None:
+        orientation_vectors = np.empty((count, 3), dtype=np.float64)
+        translation_vectors = np.empty((count, 3), dtype=np.float64)
+    else:
+        orientation_vectors = np.array(initial_orientations, dtype=np.float64)
+        translation_vectors = np.array(initial_translations, dtype=np.float64)
+        if orientation_vectors.shape != (count, 3):
+            raise ValueError("Expected initial orientations of shape (N, 3)")
+        if translation_vectors.shape != (count, 3):
+            raise ValueError("Expected initial translations of shape (N, 3)")
+
+        has_guess = np.isfinite(orientation_vectors).all(axis=1)
+        has_guess &= np.isfinite(translation_vectors).all(axis=1)
+        use_extrinsic_guess_array = has_guess.astype(np.uint8)
+        use_extrinsic_guess = _cv3d.ffi.cast(
+            'unsigned char *',
+            _cv3d.ffi.from_buffer(use_extrinsic_guess_array),
+        )
+
+    if count == 0:
+        return translation_vectors, orientation_vectors
+
+    return_value = _cv3d.lib.solve_pnp_batch(
+        count,
+        _ffi_double_pointer(object_points),
+        _ffi_double_pointer(image_points),
+        calibration._camera_matrix_pointer,
+        calibration._distance_coefficients_pointer,
+        method,
+        use_extrinsic_guess,
+        _ffi_double_pointer(orientation_vectors),
+        _ffi_double_pointer(translation_vectors),
+    )
+    if not return_value:
+        raise Cv3dError("OpenCV solvePnP failed")
+
+    return translation_vectors, orientation_vectors
@@ -1,12 +1,34 @@
 """
 Low-level device capture utility.
 
-This builds upon some functionality sneaked in here from OpenCV.
+Frames come from a `CaptureBackend` (see `capture_backends`): by default this
+builds upon some functionality sneaked in here from OpenCV.
 """
 
 import threading
+import time
+from typing import (  # noqa: F401
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
-from sb_vision.native import _cvcapture  # type: ignore
+from .frames import Frame, FramePool
+
+if TYPE_CHECKING:
+    from .capture_backends import CaptureBackend  # noqa: F401
+
+T = TypeVar('T')
+
+CapturedFrame = NamedTuple('CapturedFrame', (
+    ('image_bytes', bytes),
+    # The `time.monotonic` time at which the frame was grabbed.
+    ('timestamp', float),
+))
 
 
 class CvCaptureError(RuntimeError):
@@ -34,47 +56,347 @@ class DeviceClosedError(CvCaptureError):
 class ImageCaptureError(CvCaptureError):
     """An error when OpenCV cannot capture an image."""
 
-    def __init__(self) -> None:
+    def __init__(self, message: str = "cvcapture() failed") -> None:
         """Initialise the exception."""
-        super().__init__("cvcapture() failed")
+        super().__init__(message)
+
+
+class StreamingError(CvCaptureError):
+    """An error relating to the background streaming of frames."""
+
+    pass
+
+
+def fourcc_code(pixel_format: str) -> int:
+    """Convert a FOURCC code, such as ``'MJPG'``, to its integer form."""
+    try:
+        encoded = pixel_format.encode('ascii')
+    except UnicodeEncodeError:
+        encoded = b''
+    if len(encoded) != 4:
+        raise ValueError(
+            "Pixel format must be a four character code (got {!r})".format(
+                pixel_format,
+            ),
+        )
+    return int.from_bytes(encoded, 'little')
+
+
+def fourcc_name(code: int) -> Optional[str]:
+    """Convert a FOURCC code from its integer form, or ``None`` if unset."""
+    if code <= 0:
+        return None
+    return code.to_bytes(4, 'little').decode('ascii', errors='replace')
+
+
+class _FrameStreamer(object):
+    """
+    Background grabbing of frames into a small ring of reusable buffers.
+
+    A thread continuously reads frames from the device, which both keeps the
+    driver's queue of frames drained (so that what we have is always recent)
+    and means that the latest frame is available without blocking.
+    """
+
+    def __init__(
+        self,
+        device: 'CaptureDevice',
+        width: int,
+        height: int,
+        buffer_count: int,
+    ) -> None:
+        if buffer_count < 2:
+            raise ValueError(
+                "Streaming needs at least 2 buffers (got {})".format(
+                    buffer_count,
+                ),
+            )
+
+        self.size = (width, height)
+        self._device = device
+
+        self._pool = FramePool(self.size, buffer_count)
+        self._latest = None  # type: Optional[Frame]
+        self._error = None  # type: Optional[Exception]
+
+        self._condition = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='sb-vision-capture',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            # Frames which readers are still holding won't be handed out by the
+            # pool, so we never overwrite an image which is in use.
+            frame = self._pool.acquire()
+
+            try:
+                frame.timestamp = self._device._read_into(frame, latest=True)
+            except Exception as e:
+                frame.release()
+                with self._condition:
+                    self._error = e
+                    self._condition.notify_all()
+                return
+
+            with self._condition:
+                previous, self._latest = self._latest, frame
+                self._condition.notify_all()
+
+            if previous is not None:
+                previous.release()
+
+    def latest(self, max_age: Optional[float]) -> Frame:
+        """
+        Get the most recently grabbed frame, held on behalf of the caller.
+
+        Blocks only until a frame is available which was grabbed no more than
+        ``max_age`` seconds (if given) before this call.
+        """
+        oldest_acceptable = float('-inf')
+        if max_age is not None:
+            oldest_acceptable = time.monotonic() - max_age
+
+        with self._condition:
+            while True:
+                if self._error is not None:
+                    raise StreamingError(
+                        "Background capture failed: {}".format(self._error),
+                    ) from self._error
+
+                if self._latest is not None:
+                    if self._latest.timestamp >= oldest_acceptable:
+                        return self._latest.retain()
+
+                if self._stopping.is_set():
+                    raise StreamingError("Streaming has been stopped")
+
+                self._condition.wait()
+
+    def stop(self) -> None:
+        """Stop the background thread, waiting for it to finish."""
+        self._stopping.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+        with self._condition:
+            latest, self._latest = self._latest, None
+        if latest is not None:
+            latest.release()
 
 
 class CaptureDevice(object):
     """A single device for capturing images."""
 
-    def __init__(self, device_id: int) -> None:
+    # Set here so that a device which failed to open can still be closed
+    _backend = None  # type: Optional[CaptureBackend]
+    _streamer = None  # type: Optional[_FrameStreamer]
+
+    def __init__(
+        self,
+        device_id: int,
+        *,
+        raw_frames: bool = False,
+        pixel_format: Optional[str] = None,
+        fps: Optional[float] = None
+    ) -> None:
         """
-        Initialise the capture device.
+        Initialise the capture device, capturing through OpenCV.
 
         The ``device_id`` is the udev 'MINOR' device number for the camera
         device.
+
+        By default frames are converted to colour by OpenCV. With
+        ``raw_frames`` enabled, they are instead requested in the camera's own
+        format, and the luminance taken straight from YUYV frames, or decoded
+        alone from MJPEG ones. This is quicker, but relies on the OpenCV build
+        and camera supporting it; where OpenCV can't provide raw frames,
+        colour frames are converted as before.
+
+        ``pixel_format`` (a FOURCC code such as ``'MJPG'`` or ``'YUYV'``) and
+        ``fps`` request the format and frame rate the camera provides frames
+        in, which otherwise are left to the driver. These are only requests:
+        the driver picks the nearest it supports, so the values actually
+        negotiated should be read back from `pixel_format` and `fps`. They are
+        requested again whenever the resolution changes.
+
+        Use `from_backend` to capture some other way.
+        """
+        from .capture_backends import OpenCVBackend
+
+        self._init_backend(OpenCVBackend(
+            device_id,
+            raw_frames=raw_frames,
+            pixel_format=pixel_format,
+            fps=fps,
+        ))
+
+    @classmethod
+    def from_backend(cls, backend: 'CaptureBackend') -> 'CaptureDevice':
+        """
+        Create a capture device taking its frames from the given backend.
+
+        The device takes ownership of the backend, closing it along with the
+        device.
         """
+        device = cls.__new__(cls)
+        device._init_backend(backend)
+        return device
+
+    def _init_backend(self, backend: 'CaptureBackend') -> None:
         self.lock = threading.Lock()
-        self.instance = _cvcapture.lib.cvopen(device_id)
-        if self.instance == _cvcapture.ffi.NULL:
-            raise DeviceOpenError(device_id)
+        self._pools = {}  # type: Dict[Tuple[int, int], FramePool]
+        self._backend = backend
 
-    def capture(self, width: int, height: int) -> bytes:
-        """Capture a single image with the given width and height."""
-        if self.instance is None:
+    @property
+    def backend(self) -> 'CaptureBackend':
+        """The backend frames are captured from."""
+        backend = self._backend
+        if backend is None:
             raise DeviceClosedError()
+        return backend
 
-        capture_buffer = _cvcapture.ffi.new(
-            'uint8_t[{}]'.format(width * height),
-        )
+    def _read_into(self, frame: Frame, *, latest: bool = False) -> float:
+        # Returns the time at which the frame was grabbed
+        with self.lock:
+            backend = self.backend
+            if latest:
+                return backend.capture_latest(frame.array)
+            return backend.capture(frame.array)
 
+    def _query(self, query_function: Callable[['CaptureBackend'], T]) -> T:
         with self.lock:
-            status = _cvcapture.lib.cvcapture(
-                self.instance,
-                capture_buffer,
-                width,
-                height,
-            )
+            return query_function(self.backend)
+
+    @property
+    def raw_frames(self) -> bool:
+        """Whether frames are captured in the camera's own format."""
+        return self._query(lambda backend: backend.raw_frames)
+
+    @property
+    def pixel_format(self) -> Optional[str]:
+        """
+        The FOURCC code of the format the camera is providing frames in.
+
+        This is ``None`` where the backend can't tell.
+        """
+        return self._query(lambda backend: backend.pixel_format)
+
+    @property
+    def fps(self) -> Optional[float]:
+        """
+        The frame rate the camera is providing frames at.
+
+        This is the rate the driver negotiated, which the camera may not
+        achieve (for instance, in low light). It is ``None`` where the
+        backend can't tell.
+        """
+        return self._query(lambda backend: backend.fps)
+
+    @property
+    def streaming(self) -> bool:
+        """Whether frames are being grabbed continuously in the background."""
+        return self._streamer is not None
+
+    def start_streaming(self, width: int, height: int, buffer_count: int = 3) -> None:
+        """
+        Start grabbing frames of the given size continuously.
+
+        While streaming, `capture` returns the most recently grabbed frame
+        immediately rather than discarding stale frames before grabbing a new
+        one. Since frames are being read as fast as the camera provides them,
+        the latest frame is at most one frame period old.
+        """
+        if self._backend is None:
+            raise DeviceClosedError()
+
+        if self._streamer is not None:
+            if self._streamer.size == (width, height):
+                return
+            self.stop_streaming()
+
+        self._streamer = _FrameStreamer(self, width, height, buffer_count)
+
+    def stop_streaming(self) -> None:
+        """Stop grabbing frames in the background."""
+        streamer = self._streamer
+        self._streamer = None
+        if streamer is not None:
+            streamer.stop()
+
+    def _get_pool(self, width: int, height: int) -> FramePool:
+        size = (width, height)
+        pool = self._pools.get(size)
+        if pool is None:
+            pool = self._pools[size] = FramePool(size)
+        return pool
+
+    def acquire_frame(
+        self,
+        width: int,
+        height: int,
+        *,
+        max_age: Optional[float] = None
+    ) -> Frame:
+        """
+        Capture a single frame with the given width and height.
+
+        The image is captured directly into a reusable buffer, which must be
+        released (see `Frame.release`) once the caller is done with it.
+
+        When streaming, this is the most recent frame grabbed in the background.
+        ``max_age`` (in seconds) can be used to wait for a newer frame if the
+        latest one was grabbed too long before this call; it has no effect when
+        not streaming.
+        """
+        if self._backend is None:
+            raise DeviceClosedError()
+
+        streamer = self._streamer
+        if streamer is not None:
+            if streamer.size != (width, height):
+                raise ValueError(
+                    "Cannot capture at {}, device is streaming at {}".format(
+                        (width, height),
+                        streamer.size,
+                    ),
+                )
+            return streamer.latest(max_age)
+
+        frame = self._get_pool(width, height).acquire()
 
-        if status == 0:
-            raise ImageCaptureError()
+        try:
+            frame.timestamp = self._read_into(frame)
+        except Exception:
+            frame.release()
+            raise
 
-        return bytes(_cvcapture.ffi.buffer(capture_buffer))
+        return frame
+
+    def capture_frame(
+        self,
+        width: int,
+        height: int,
+        *,
+        max_age: Optional[float] = None
+    ) -> CapturedFrame:
+        """
+        Capture a single frame with the given width and height.
+
+        This is a copying version of `acquire_frame`.
+        """
+        with self.acquire_frame(width, height, max_age=max_age) as frame:
+            return CapturedFrame(frame.array.tobytes(), frame.timestamp)
+
+    def capture(self, width: int, height: int) -> bytes:
+        """Capture a single image with the given width and height."""
+        return self.capture_frame(width, height).image_bytes
 
     def __enter__(self) -> 'CaptureDevice':
         """Context manager protocol. Automatically closes on exit."""
@@ -90,10 +412,12 @@ class CaptureDevice(object):
 
         This enables, for instance, other processes to use this device.
         """
-        if self.instance is not None:
+        self.stop_streaming()
+
+        if self._backend is not None:
             with self.lock:
-                if self.instance is not None:
-                    _cvcapture.lib.cvclose(self.instance)
-                    self.instance = None
+                backend, self._backend = self._backend, None
+                if backend is not None:
+                    backend.close()
 
     __del__ = close
@@ -5,17 +5,19 @@ Also handles loading the calibration file which is passed into the
 location finding function.
 """
 
+import enum
 import functools
 import re
 import xml.etree.ElementTree as etree
 from pathlib import Path
-from typing import List, Tuple, cast
+from typing import List, Optional, Sequence, Tuple, Union, cast
 
 import numpy as np
 
 from sb_vision.coordinates import Cartesian, PixelCoordinate
 
 from . import cv3d
+from .pose import PoseEngine, homography_poses
 
 
 class ResolutionMismatchError(ValueError):
@@ -39,6 +41,102 @@ class ResolutionMismatchError(ValueError):
         )
 
 
+class ResolutionFit(enum.Enum):
+    """
+    How images of other resolutions relate to the one a camera was calibrated at.
+
+    Cameras typically produce smaller images by scaling down what their sensor
+    sees, so a calibration can be reused by scaling its focal lengths and
+    principal point to match. Where the aspect ratio changes too, the camera
+    must also either crop the sensor's image or pad it, and which it does
+    can't be told from the image size alone.
+    """
+
+    # Only the calibrated resolution may be used
+    EXACT = 'exact'
+
+    # Images are the calibrated image scaled, so must have the same aspect
+    # ratio (to within a pixel)
+    SCALE = 'scale'
+
+    # Images are the calibrated image scaled to cover them, with the excess
+    # cropped equally from either side
+    CROP = 'crop'
+
+    # Images are the calibrated image scaled to fit within them, padded
+    # equally on either side
+    LETTERBOX = 'letterbox'
+
+
+def _same_aspect_ratio(
+    calibrated_size: Tuple[int, int],
+    image_size: Tuple[int, int],
+) -> bool:
+    """
+    Whether the sizes have the same aspect ratio, allowing for rounding.
+
+    Scaling the image back up to the calibrated width must give the calibrated
+    height to within a pixel.
+    """
+    calibrated_width, calibrated_height = calibrated_size
+    width, height = image_size
+    return abs(height * calibrated_width / width - calibrated_height) <= 1
+
+
+def rescale_camera_matrix(
+    camera_matrix: Sequence[Sequence[float]],
+    calibrated_size: Tuple[int, int],
+    image_size: Tuple[int, int],
+    fit: ResolutionFit,
+) -> np.ndarray:
+    """
+    Adapt a camera matrix calibrated at one resolution for use at another.
+
+    The focal lengths and principal point are scaled (and, when cropping or
+    letterboxing, the principal point shifted) to match the pixels of the
+    new image. The distance coefficients apply to normalised coordinates, so
+    are the same at any resolution.
+
+    :raises ValueError: if the images don't fit the calibration as described
+    """
+    calibrated_width, calibrated_height = calibrated_size
+    width, height = image_size
+
+    scale_x = width / calibrated_width
+    scale_y = height / calibrated_height
+
+    if fit is ResolutionFit.EXACT:
+        if image_size != calibrated_size:
+            raise ValueError("Image size does not match the calibration")
+        offset_x, offset_y = 0.0, 0.0
+
+    elif fit is ResolutionFit.SCALE:
+        if not _same_aspect_ratio(calibrated_size, image_size):
+            raise ValueError("Image size has a different aspect ratio")
+        offset_x, offset_y = 0.0, 0.0
+
+    else:
+        if fit is ResolutionFit.CROP:
+            scale_x = scale_y = max(scale_x, scale_y)
+        else:
+            scale_x = scale_y = min(scale_x, scale_y)
+
+        # Where the top left of the scaled calibrated image is, in the image
+        offset_x = (width - calibrated_width * scale_x) / 2
+        offset_y = (height - calibrated_height * scale_y) / 2
+
+    rescaled = np.array(camera_matrix, dtype=np.float64)
+
+    rescaled[0, 0] *= scale_x
+    rescaled[1, 1] *= scale_y
+    # Pixel coordinates are of the centres of pixels, so scale about the
+    # corner of the image (half a pixel before the first centre)
+    rescaled[0, 2] = (rescaled[0, 2] + 0.5) * scale_x - 0.5 + offset_x
+    rescaled[1, 2] = (rescaled[1, 2] + 0.5) * scale_y - 0.5 + offset_y
+
+    return rescaled
+
+
 def _get_values_from_xml_element(element: etree.Element) -> List[str]:
     """Parse an xml tag with space-separated variables."""
     text = []  # type: List[str]
@@ -123,12 +221,23 @@ def get_calibration(file_name: Path) -> Tuple[
 def load_camera_calibrations(
     camera_model: str,
     image_size: Tuple[int, int],
-) -> Tuple[List[List[float]], List[List[float]]]:
+    fit: ResolutionFit = ResolutionFit.SCALE,
+) -> cv3d.CameraCalibration:
     """
     Load camera calibrations from a file.
 
+    The result is cached, so is shared by all the markers seen by a camera. For
+    compatibility, it can be unpacked into the camera matrix and the distance
+    coefficients as lists.
+
+    If the images are not the size the camera was calibrated at, the
+    calibration is rescaled to match according to ``fit``.
+
     :param camera_model: file to load
+    :param image_size: the size of the images the calibration is for
+    :param fit: how those images relate to the calibrated resolution
     :return: camera calibrations
+    :raises ResolutionMismatchError: if the images can't be fitted as described
     """
     # Handle older versions of robotd asking for a c270 calibration.
     camera_model = "C016" if camera_model == "c270" else camera_model
@@ -141,9 +250,43 @@ def load_camera_calibrations(
     camera_matrix, distance_coefficients, resolution = get_calibration(model_file)
 
     if resolution != image_size:
-        raise ResolutionMismatchError(camera_model, resolution, image_size)
+        try:
+            camera_matrix = rescale_camera_matrix(
+                camera_matrix,
+                resolution,
+                image_size,
+                fit,
+            ).tolist()
+        except ValueError:
+            raise ResolutionMismatchError(
+                camera_model,
+                resolution,
+                image_size,
+            ) from None
+
+    return cv3d.CameraCalibration(camera_matrix, distance_coefficients)
 
-    return camera_matrix, distance_coefficients
+
+@functools.lru_cache()
+def marker_object_points(marker_size: Tuple[float, float]) -> np.ndarray:
+    """
+    The corners of a marker of the given size, as a rectangle in 3D.
+
+    The (read-only) array of corners is cached, as there are only a handful of
+    distinct marker sizes.
+    """
+    w, h = marker_size
+    width_from_centre = w / 2
+    height_from_centre = h / 2
+
+    object_points = np.array([
+        [width_from_centre, height_from_centre, 0],
+        [width_from_centre, -height_from_centre, 0],
+        [-width_from_centre, -height_from_centre, 0],
+        [-width_from_centre, height_from_centre, 0],
+    ], dtype=np.float64)
+    object_points.setflags(write=False)
+    return object_points
 
 
 def calculate_transforms(
@@ -165,17 +308,7 @@ def calculate_transforms(
     :param distance_coefficients: distance calibration for the camera
     :return: translation and orientation of the marker
     """
-    w, h = marker_size
-    width_from_centre = w / 2
-    height_from_centre = h / 2
-
-    # create the rectangle representing the marker in 3D
-    object_points = [
-        [width_from_centre, height_from_centre, 0],
-        [width_from_centre, -height_from_centre, 0],
-        [-width_from_centre, -height_from_centre, 0],
-        [-width_from_centre, height_from_centre, 0],
-    ]
+    object_points = marker_object_points(tuple(marker_size))
 
     translation_vector, orientation_vector = cv3d.solve_pnp(
         object_points,
@@ -185,3 +318,63 @@ def calculate_transforms(
     )
 
     return translation_vector, orientation_vector
+
+
+def calculate_transforms_batch(
+    marker_sizes: Sequence[Tuple[float, float]],
+    pixel_corners: Union[np.ndarray, Sequence[List[PixelCoordinate]]],
+    calibration: cv3d.CameraCalibration,
+    *,
+    pose_engine: PoseEngine = PoseEngine.ITERATIVE,
+    homographies: Union[np.ndarray, Sequence[np.ndarray], None] = None,
+    initial_poses: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the positions of several markers seen in the same image.
+
+    This is equivalent to calling `calculate_transforms` for each marker, but
+    crosses into OpenCV only once for the whole image.
+
+    :param marker_sizes: size of each marker
+    :param pixel_corners: pixel co-ordinates of the corners of each marker
+        (clockwise around the marker from the top-left corner)
+    :param calibration: calibration of the camera, from `load_camera_calibrations`
+    :param pose_engine: how to calculate the positions
+    :param homographies: AprilTag's homography for each marker, required by
+        `PoseEngine.HOMOGRAPHY`
+    :param initial_poses: (N, 3) arrays of guesses at the translation and
+        orientation of each marker (NaN where there is no guess), to start
+        `PoseEngine.ITERATIVE` from
+    :return: (N, 3) arrays of the translation and orientation of each marker
+    """
+    if pose_engine is PoseEngine.HOMOGRAPHY:
+        if homographies is None:
+            raise ValueError("Homography pose engine requires the homographies")
+        return homography_poses(
+            np.array(homographies, dtype=np.float64).reshape(-1, 3, 3),
+            marker_sizes,
+            calibration,
+        )
+
+    initial_translations, initial_orientations = None, None
+    if pose_engine is PoseEngine.IPPE_SQUARE:
+        method = cv3d.PNP_METHOD_IPPE_SQUARE
+    else:
+        method = cv3d.PNP_METHOD_ITERATIVE
+        if initial_poses is not None:
+            initial_translations, initial_orientations = initial_poses
+
+    object_points = np.empty((len(marker_sizes), 4, 3), dtype=np.float64)
+    for index, marker_size in enumerate(marker_sizes):
+        object_points[index] = marker_object_points(tuple(marker_size))
+
+    image_points = np.array(pixel_corners, dtype=np.float64).reshape(-1, 4, 2)
+
+    return cv3d.solve_pnp_batch(
+        object_points,
+        image_points,
+        calibration,
+        method=method,
+        initial_translations=initial_translations,
+        initial_orientations=initial_orientations,
+    )
@@ -0,0 +1,136 @@
+"""
+Reusable greyscale frame buffers.
+
+Frames are captured directly into memory owned by a `FramePool`, which the
+detector can then read without any further copying. The memory is exposed via
+the buffer protocol (`Frame.data`) and as a NumPy array (`Frame.array`).
+"""
+
+import threading
+from typing import Any, List, Optional, Tuple  # noqa: F401
+
+import numpy as np
+from PIL import Image
+
+
+class Frame:
+    """
+    A single greyscale image, optionally owned by a `FramePool`.
+
+    Pooled frames are reference counted: once every holder of the frame has
+    called `release` (or left its context manager) the memory is handed back
+    to the pool for reuse, after which it must not be accessed.
+    """
+
+    def __init__(
+        self,
+        array: np.ndarray,
+        *,
+        timestamp: float = 0.0,
+        pool: Optional['FramePool'] = None
+    ) -> None:
+        """Wrap the given (height, width) array of uint8 values."""
+        if array.ndim != 2 or array.dtype != np.uint8:
+            raise ValueError(
+                "Frames must be 2D arrays of uint8 (got {}D array of {})".format(
+                    array.ndim,
+                    array.dtype,
+                ),
+            )
+
+        self.array = array
+        self.timestamp = timestamp
+        self._pool = pool
+        self._references = 0
+
+    @classmethod
+    def from_image(cls, image: Image.Image, *, timestamp: float = 0.0) -> 'Frame':
+        """Create a (non-pooled) frame holding a copy of the given PIL image."""
+        array = np.asarray(image.convert('L'), dtype=np.uint8)
+        return cls(array, timestamp=timestamp)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """The size of the frame, as a tuple of (width, height)."""
+        height, width = self.array.shape
+        return width, height
+
+    @property
+    def data(self) -> memoryview:
+        """The frame's memory, via the buffer protocol."""
+        return self.array.data
+
+    def __array__(self, dtype: Any = None) -> np.ndarray:
+        """Array protocol, giving a NumPy view onto the frame's memory."""
+        if dtype is None:
+            return self.array
+        return self.array.astype(dtype)
+
+    def to_image(self) -> Image.Image:
+        """
+        Create a PIL image which shares this frame's memory.
+
+        The image is only valid for as long as the frame is held.
+        """
+        return Image.frombuffer('L', self.size, self.array, 'raw', 'L', 0, 1)
+
+    def retain(self) -> 'Frame':
+        """Add a holder of this frame."""
+        if self._pool is not None:
+            self._pool._retain(self)
+        return self
+
+    def release(self) -> None:
+        """Remove a holder of this frame, returning it to its pool if unused."""
+        if self._pool is not None:
+            self._pool._release(self)
+
+    def __enter__(self) -> 'Frame':
+        """Context manager protocol. Releases the frame on exit."""
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        """Context manager protocol. Releases the frame on exit."""
+        self.release()
+
+
+class FramePool:
+    """
+    A pool of reusable frame buffers of a single size.
+
+    The pool is safe to use from multiple threads. If all the frames are in use
+    when one is requested a new one is allocated, though at most ``count``
+    frames are kept for reuse once released.
+    """
+
+    def __init__(self, size: Tuple[int, int], count: int = 3) -> None:
+        """Create a pool of ``count`` frames of the given (width, height)."""
+        self.size = size
+        self._count = count
+        self._lock = threading.Lock()
+        self._free = [self._allocate() for _ in range(count)]  # type: List[Frame]
+
+    def _allocate(self) -> Frame:
+        width, height = self.size
+        return Frame(np.empty((height, width), dtype=np.uint8), pool=self)
+
+    def acquire(self) -> Frame:
+        """Get an unused frame, held once by the caller."""
+        with self._lock:
+            frame = self._free.pop() if self._free else self._allocate()
+            frame._references = 1
+        return frame
+
+    def _retain(self, frame: Frame) -> None:
+        with self._lock:
+            if frame._references <= 0:
+                raise ValueError("Cannot retain a frame which has been released")
+            frame._references += 1
+
+    def _release(self, frame: Frame) -> None:
+        with self._lock:
+            if frame._references <= 0:
+                raise ValueError("Frame has already been released")
+            frame._references -= 1
+            if frame._references == 0 and len(self._free) < self._count:
+                self._free.append(frame)
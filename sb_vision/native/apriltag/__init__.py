@@ -1,5 +1,21 @@
 """AprilTag native utilities."""
 
-from .detector import AprilTagDetector
+from .detector import (
+    DEFAULT_BITS_CORRECTED,
+    DEFAULT_QUAD_SETTINGS,
+    DETECTION_DTYPE,
+    MAX_BITS_CORRECTED,
+    AprilTagDetector,
+    QuadSettings,
+    shared_detector,
+)
 
-__all__ = ('AprilTagDetector',)
+__all__ = (
+    'AprilTagDetector',
+    'QuadSettings',
+    'DEFAULT_QUAD_SETTINGS',
+    'DETECTION_DTYPE',
+    'DEFAULT_BITS_CORRECTED',
+    'MAX_BITS_CORRECTED',
+    'shared_detector',
+)
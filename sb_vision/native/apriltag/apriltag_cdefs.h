@@ -41,15 +41,33 @@ apriltag_detector_t* apriltag_detector_create(void);
 void apriltag_detector_destroy(apriltag_detector_t *td);
 
 
+// Detector object destruction, for detectors sharing their families
+void apriltag_detector_destroy_shared(apriltag_detector_t *td);
+
+// Tag family creation, which builds the tables for decoding tags
+apriltag_family_t *apriltag_family_create(int bits_corrected);
+
+// Tag family destruction
+void apriltag_family_destroy(apriltag_family_t *tf);
+
 // Detector object Initialisation
 
 void apriltag_init(
    apriltag_detector_t* td,
+   apriltag_family_t* tf,
    float decimate,
    float sigma,
    int refine_edges,
    int refine_decode,
-   int refine_pose
+   int refine_pose,
+   int nthreads
+  );
+
+void apriltag_set_quad_parameters(
+   apriltag_detector_t* td,
+   float decimate,
+   float sigma,
+   int refine_edges
   );
 
 //Run detection
@@ -117,7 +135,24 @@ struct apriltag_detection
     double p[4][2];
 };
 
-struct apriltag_detection *zarray_get_detection(const zarray_t *za, int idx);
+// A copy of a detection, with the homography (in row-major order) inline.
+typedef struct apriltag_detection_record apriltag_detection_record_t;
+struct apriltag_detection_record
+{
+    int32_t id;
+    int32_t hamming;
+    float goodness;
+    float decision_margin;
+    double c[2];
+    double p[4][2];
+    double H[9];
+};
 
-void destroy_detection(apriltag_detection_t* p);
+// Copy up to `capacity` detections into `records`, returning the total number
+// of detections
+int apriltag_detections_export(
+   const zarray_t *detections,
+   apriltag_detection_record_t *records,
+   int capacity
+  );
 
@@ -1,29 +1,84 @@
 #include "apriltag_interface.h"
+#include "common/timeprofile.h"
+#include "common/workerpool.h"
+
+// Defined in apriltag.c, though not exposed by its header
+void quick_decode_init(apriltag_family_t *family, int maxhamming);
+void quick_decode_uninit(apriltag_family_t *fam);
+
+apriltag_family_t *apriltag_family_create(int bits_corrected) {
+  apriltag_family_t *tf = tag36h11_create();
+  quick_decode_init(tf, bits_corrected);
+  return tf;
+}
+
+void apriltag_family_destroy(apriltag_family_t *tf) {
+  quick_decode_uninit(tf);
+  // Not tag36h11_destroy, which also frees the name: that comes from strdup,
+  // which isn't declared when compiling as C11, so the pointer to it may have
+  // been truncated.
+  free(tf->codes);
+  free(tf);
+}
 
 void apriltag_init(
   apriltag_detector_t* td,
+  apriltag_family_t* tf,
   float decimate,
   float sigma,
   int refine_edges,
   int refine_decode,
-  int refine_pose
+  int refine_pose,
+  int nthreads
 ) {
-  apriltag_family_t *tf = tag36h11_create();
+  // The family's decoding tables already exist, so are not rebuilt here
   apriltag_detector_add_family(td, tf);
   td->quad_decimate = decimate;
   td->quad_sigma = sigma;
   td->refine_edges = refine_edges;
   td->refine_decode = refine_decode;
   td->refine_pose = refine_pose;
+  td->nthreads = nthreads;
 }
 
+void apriltag_detector_destroy_shared(apriltag_detector_t *td) {
+  // As apriltag_detector_destroy, without uninitialising the families
+  timeprofile_destroy(td->tp);
+  workerpool_destroy(td->wp);
+  zarray_destroy(td->tag_families);
+  free(td);
+}
 
-struct apriltag_detection *zarray_get_detection(const zarray_t *za, int idx) {
-    struct apriltag_detection *detection = malloc(sizeof(apriltag_detection_t));
-    zarray_get(za, idx, &detection);
-    return detection;
+void apriltag_set_quad_parameters(
+  apriltag_detector_t* td,
+  float decimate,
+  float sigma,
+  int refine_edges
+) {
+  td->quad_decimate = decimate;
+  td->quad_sigma = sigma;
+  td->refine_edges = refine_edges;
 }
 
-void destroy_detection(struct apriltag_detection * p) {
-    free(p);
-}
\ No newline at end of file
+
+int apriltag_detections_export(
+  const zarray_t *detections,
+  apriltag_detection_record_t *records,
+  int capacity
+) {
+  int count = zarray_size(detections);
+  for (int i = 0; i < count && i < capacity; i++) {
+    apriltag_detection_t *det;
+    zarray_get(detections, i, &det);
+
+    apriltag_detection_record_t *record = &records[i];
+    record->id = det->id;
+    record->hamming = det->hamming;
+    record->goodness = det->goodness;
+    record->decision_margin = det->decision_margin;
+    memcpy(record->c, det->c, sizeof(record->c));
+    memcpy(record->p, det->p, sizeof(record->p));
+    memcpy(record->H, det->H->data, sizeof(record->H));
+  }
+  return count;
+}
@@ -1,16 +1,50 @@
 #include "apriltag.h"
 #include "tag36h11.h"
+#include <string.h>
+
+// Create the tag family, along with its tables for decoding tags with up to
+// `bits_corrected` bits in error. Any number of detectors can share a family.
+apriltag_family_t *apriltag_family_create(int bits_corrected);
+
+void apriltag_family_destroy(apriltag_family_t *tf);
 
 void apriltag_init(
    apriltag_detector_t* td,
+   apriltag_family_t* tf,
    float decimate,
    float sigma,
    int refine_edges,
    int refine_decode,
-   int refine_pose
+   int refine_pose,
+   int nthreads
   );
 
+// Destroy a detector, leaving its (shared) families intact.
+void apriltag_detector_destroy_shared(apriltag_detector_t *td);
+
+void apriltag_set_quad_parameters(
+   apriltag_detector_t* td,
+   float decimate,
+   float sigma,
+   int refine_edges
+  );
 
-struct apriltag_detection *zarray_get_detection(const zarray_t *za, int idx);
+// A copy of the interesting parts of a detection, laid out so that an array of
+// them can be shared with numpy as a structured array.
+typedef struct apriltag_detection_record apriltag_detection_record_t;
+struct apriltag_detection_record
+{
+    int32_t id;
+    int32_t hamming;
+    float goodness;
+    float decision_margin;
+    double c[2];
+    double p[4][2];
+    double H[9];
+};
 
-void destroy_detection(struct apriltag_detection *p);
+int apriltag_detections_export(
+   const zarray_t *detections,
+   apriltag_detection_record_t *records,
+   int capacity
+  );
@@ -1,7 +1,21 @@
 """AprilTag detector wrapper."""
 
-from typing import TYPE_CHECKING, Any, Iterator, Tuple
+import contextlib
+import threading
+from typing import (  # noqa: F401
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
+import numpy as np
 from PIL import Image
 
 from ._apriltag import ffi, lib
@@ -10,22 +24,232 @@ if TYPE_CHECKING:
     # Interface-only definitions
     from .types import ApriltagDetection  # noqa: F401
 
+# Settings for the quad detection stage, which can be changed between frames.
+QuadSettings = NamedTuple('QuadSettings', (
+    # Detect quads in an image decimated by this factor
+    ('quad_decimate', float),
+    # Apply a low-pass blur to the (decimated) image; negative sharpens
+    ('quad_sigma', float),
+    # Spend more time trying to align the edges of tags
+    ('refine_edges', bool),
+))
 
-class AprilTagDetector:
-    """Wrapper for the AprilTag tag detector."""
+DEFAULT_QUAD_SETTINGS = QuadSettings(
+    quad_decimate=1.0,
+    quad_sigma=0.0,
+    refine_edges=True,
+)
 
-    def __init__(self, image_size: Tuple[int, int]) -> None:
-        """
-        Initialise the AprilTag tag detector.
 
-        This means creating and configuring the detector, which populates a
-        number of tables in memory.
-        """
-        self._image_size = image_size
+def _record_dtype(fields: Sequence[Tuple[str, str, Any]]) -> np.dtype:
+    """
+    Describe `apriltag_detection_record_t` as a NumPy structured type.
+
+    ``fields`` are tuples of (name, member of the C struct, NumPy format); the
+    offsets of the fields are taken from the compiled struct.
+    """
+    return np.dtype({
+        'names': [name for name, _, _ in fields],
+        'formats': [format for _, _, format in fields],
+        'offsets': [
+            ffi.offsetof('apriltag_detection_record_t', member)
+            for _, member, _ in fields
+        ],
+        'itemsize': ffi.sizeof('apriltag_detection_record_t'),
+    }, align=True)
+
+
+# The detections from a frame, as a structured array
+DETECTION_DTYPE = _record_dtype((
+    ('id', 'id', np.int32),
+    ('hamming', 'hamming', np.int32),
+    ('goodness', 'goodness', np.float32),
+    ('decision_margin', 'decision_margin', np.float32),
+    # The centre of the marker, as (x, y) pixel coordinates
+    ('centre', 'c', (np.float64, (2,))),
+    # The corners of the marker (in the same order as `ApriltagDetection.p`)
+    ('corners', 'p', (np.float64, (4, 2))),
+    # The homography from AprilTag's marker coordinates to pixels
+    ('homography', 'H', (np.float64, (3, 3))),
+))
+
+
+def _as_image_array(
+    buffer: Any,
+    size: Optional[Tuple[int, int]],
+    stride: Optional[int],
+) -> np.ndarray:
+    """
+    Get a (height, width) NumPy view of a greyscale image in the given buffer.
+
+    No data is copied. Arrays (and two dimensional memoryviews) carry their own
+    shape and strides; flat buffers need the size (and stride, if the rows are
+    not tightly packed) to be given.
+    """
+    if isinstance(buffer, np.ndarray) or (
+        isinstance(buffer, memoryview) and buffer.ndim == 2
+    ):
+        if stride is not None:
+            raise ValueError("Cannot specify a stride for a two dimensional buffer")
+
+        array = np.asarray(buffer)
+        if array.ndim != 2 or array.dtype != np.uint8:
+            raise ValueError(
+                "Images must be 2D arrays of uint8 (got {}D array of {})".format(
+                    array.ndim,
+                    array.dtype,
+                ),
+            )
+
+        if size is not None and size != (array.shape[1], array.shape[0]):
+            raise ValueError(
+                "Image of shape {} does not have size {}".format(
+                    array.shape,
+                    size,
+                ),
+            )
+
+    else:
+        if size is None:
+            raise ValueError("Must specify the size of images in flat buffers")
+
+        width, height = size
+        if stride is None:
+            stride = width
+
+        flat = np.frombuffer(buffer, dtype=np.uint8)
+        required_length = stride * (height - 1) + width
+
+        if stride < width or len(flat) < required_length:
+            raise ValueError(
+                "Buffer of {} bytes is too small for an image of {} with a "
+                "stride of {}".format(len(flat), size, stride),
+            )
+
+        array = np.lib.stride_tricks.as_strided(
+            flat,
+            shape=(height, width),
+            strides=(stride, 1),
+        )
+
+    row_stride, column_stride = array.strides
+    if column_stride != 1 or row_stride < array.shape[1]:
+        raise ValueError(
+            "Images must be stored in row-major order with contiguous rows (got "
+            "strides of {}); consider numpy.ascontiguousarray".format(
+                array.strides,
+            ),
+        )
+
+    return array
+
+
+def _offset_detection(
+    detection: 'ApriltagDetection',
+    offset: Tuple[int, int],
+) -> None:
+    """Translate a detection (in place) by the given (x, y) offset."""
+    dx, dy = offset
+
+    detection.c[0] += dx
+    detection.c[1] += dy
+
+    for corner in detection.p:
+        corner[0] += dx
+        corner[1] += dy
+
+    # The homography maps to homogeneous pixel coordinates, so pre-multiply by
+    # the equivalent translation matrix.
+    data = detection.H.data
+    for column in range(3):
+        data[column] += dx * data[6 + column]
+        data[3 + column] += dy * data[6 + column]
 
-        self._detector = lib.apriltag_detector_create()
+
+def _offset_records(records: np.ndarray, offset: Tuple[int, int]) -> None:
+    """Translate detection records (in place) by the given (x, y) offset."""
+    records['centre'] += offset
+    records['corners'] += offset
+
+    # As in `_offset_detection`
+    homography = records['homography']
+    dx, dy = offset
+    homography[:, 0, :] += dx * homography[:, 2, :]
+    homography[:, 1, :] += dy * homography[:, 2, :]
+
+
+def _check_quad_settings(settings: QuadSettings) -> None:
+    if settings.quad_decimate < 1:
+        raise ValueError(
+            "Cannot decimate by a factor less than 1 (got {})".format(
+                settings.quad_decimate,
+            ),
+        )
+
+
+# The number of bits in error which tags can be decoded with. This is fixed
+# when the family's decoding tables are built: each extra bit makes the tables
+# much larger (and slower to build), while fewer bits reject more of the quads
+# which aren't markers without looking them up at all. For tag36h11 the tables
+# take about 1 MB for 1 bit and 35 MB for 2 bits; 3 bits would need over 1 GB,
+# and the native library exits the process if it can't allocate them, so isn't
+# allowed.
+DEFAULT_BITS_CORRECTED = 2
+MAX_BITS_CORRECTED = 2
+
+# Building the tag family's decoding tables is slow and they take a fair amount
+# of memory, so one family is shared by every detector which corrects the same
+# number of bits.
+_family_lock = threading.Lock()
+_families = {}  # type: Dict[int, Any]
+
+
+def _check_bits_corrected(bits_corrected: int) -> None:
+    if not 0 <= bits_corrected <= MAX_BITS_CORRECTED:
+        raise ValueError(
+            "Can only correct between 0 and {} bits (got {})".format(
+                MAX_BITS_CORRECTED,
+                bits_corrected,
+            ),
+        )
+
+
+def _shared_tag_family(bits_corrected: int) -> Any:
+    """
+    Get the shared tag family correcting the given number of bits.
+
+    The family is created the first time it's needed.
+    """
+    with _family_lock:
+        family = _families.get(bits_corrected)
+        if family is None:
+            family = _families[bits_corrected] = ffi.gc(
+                lib.apriltag_family_create(bits_corrected),
+                lib.apriltag_family_destroy,
+            )
+        return family
+
+
+class _NativeDetector:
+    """
+    A single native detector, which only one thread may use at a time.
+
+    Many of these can share the one tag family, since the family's tables are
+    only read while detecting.
+    """
+
+    __slots__ = ('detector', 'family', 'quad_settings', '_working_memory')
+
+    def __init__(self, family: Any, nthreads: int, settings: QuadSettings) -> None:
+        # Keeps the family alive for at least as long as the detector
+        self.family = family
+        self.quad_settings = settings
+        self._working_memory = np.empty(0, dtype=np.uint8)
+
+        self.detector = lib.apriltag_detector_create()
         """
         apriltag_detector_t* td,
+        apriltag_family_t* tf,
         float decimate,
           default: 1.0, "Decimate input image by this factor"
         float sigma,
@@ -36,21 +260,116 @@ class AprilTagDetector:
           default: 0, "Spend more time trying to decode tags"
         int refine_pose
           default: 0, "Spend more time trying to find the position of the tag"
+        int nthreads
+          default: 1, "Number of threads to use for detection"
         """
 
-        lib.apriltag_init(self._detector, 1.0, 0.0, 1, 0, 0)
-
-        # Note: keeping this around for the lifetime of the library feels like
-        # it's an optiisation rather than actually required. Given that it
-        # makes the instance non-thread-safe, work out whether it's desirable
-        # and/or there are other reasons the instance isn't thread-safe anyway.
-        # See also https://github.com/sourcebots/sb-vision/issues/17
-        self._working_image = lib.image_u8_create_stride(
-            image_size[0],
-            image_size[1],
-            image_size[0],
+        lib.apriltag_init(
+            self.detector,
+            family,
+            settings.quad_decimate,
+            settings.quad_sigma,
+            settings.refine_edges,
+            0,
+            0,
+            nthreads,
         )
 
+    def configure(self, settings: QuadSettings) -> None:
+        """Use the given settings for the quad detection stage."""
+        if settings != self.quad_settings:
+            lib.apriltag_set_quad_parameters(
+                self.detector,
+                settings.quad_decimate,
+                settings.quad_sigma,
+                settings.refine_edges,
+            )
+            self.quad_settings = settings
+
+    def working_image(self, size: Tuple[int, int]) -> np.ndarray:
+        """
+        Get a (height, width) array to copy images to be detected into.
+
+        The memory behind it only ever grows, so is reused for images of any
+        size no larger than the largest seen so far.
+        """
+        width, height = size
+        if len(self._working_memory) < width * height:
+            self._working_memory = np.empty(width * height, dtype=np.uint8)
+        return self._working_memory[:width * height].reshape(height, width)
+
+    def destroy(self) -> None:
+        """Free the detector (but not the family it shares)."""
+        lib.apriltag_detector_destroy_shared(self.detector)
+
+
+class AprilTagDetector:
+    """
+    Wrapper for the AprilTag tag detector.
+
+    Instances are safe to use from several threads at once: each detection
+    borrows a native detector (along with its working image) from a pool,
+    creating another if they're all in use. The native detectors share the
+    one tag family, so more of them are cheap to create.
+
+    The tag family (along with its decoding tables) is shared by every
+    detector which corrects the same number of bits.
+
+    Rather than creating detectors for each use, consider borrowing one from
+    the process-wide registry with `shared_detector`.
+    """
+
+    def __init__(
+        self,
+        image_size: Optional[Tuple[int, int]] = None,
+        *,
+        nthreads: int = 1,
+        bits_corrected: int = DEFAULT_BITS_CORRECTED
+    ) -> None:
+        """
+        Initialise the AprilTag tag detector.
+
+        This means creating and configuring the detector, which populates a
+        number of tables in memory (the first time any detector is created).
+
+        If an ``image_size`` is given, `detect_tags` only accepts images of
+        that size; otherwise images of any size are accepted.
+
+        ``nthreads`` is the number of threads the detector spreads the work of
+        fitting and decoding quads across. This is not in itself any quicker:
+        only some of the work is spread, and only across idle cores, so check
+        with ``utils/benchmark_detection_threads.py`` before using more than
+        one. The GIL is not held while detection runs.
+
+        ``bits_corrected`` is the most bits in error which markers are
+        decoded with, up to `MAX_BITS_CORRECTED`. Fewer bits make for much
+        smaller tables, which are quicker to build, and fewer false detections,
+        at the cost of missing markers which are only partly visible. The
+        tables take about 35 MB for 2 bits, 1 MB for 1 bit and 28 kB for none.
+        """
+        # The native detectors not currently in use. Appending to and popping
+        # from a list are atomic, so no lock is needed. Set up before checking
+        # the arguments, so that a detector which fails to initialise can
+        # still be closed.
+        self._idle = []  # type: List[_NativeDetector]
+        self._closed = False
+
+        if nthreads < 1:
+            raise ValueError(
+                "Detector needs at least one thread (got {})".format(nthreads),
+            )
+        _check_bits_corrected(bits_corrected)
+
+        self._image_size = image_size
+        self._nthreads = nthreads
+        self._bits_corrected = bits_corrected
+        self._quad_settings = DEFAULT_QUAD_SETTINGS
+        self._family = _shared_tag_family(bits_corrected)
+        self._idle.append(self._create_native())
+
+    def _create_native(self) -> _NativeDetector:
+        return _NativeDetector(self._family, self._nthreads, self._quad_settings)
+
     def __enter__(self) -> 'AprilTagDetector':
         """Start using the detector as a context manager."""
         return self
@@ -64,36 +383,112 @@ class AprilTagDetector:
         self.close()
 
     def close(self) -> None:
-        """Deinitialise the detector."""
-        if self._detector is not None:
-            lib.apriltag_detector_destroy(self._detector)
-            self._detector = None
+        """
+        Deinitialise the detector.
+
+        Any detections in progress on other threads are allowed to finish.
+        """
+        self._closed = True
+        self._destroy_idle()
 
-        if self._working_image is not None:
-            lib.image_u8_destroy(self._working_image)
-            self._working_image = None
+    def _destroy_idle(self) -> None:
+        while True:
+            try:
+                native = self._idle.pop()
+            except IndexError:
+                return
+            native.destroy()
+
+    @property
+    def closed(self) -> bool:
+        """Whether the detector has been closed."""
+        return self._closed
 
     def _raise_if_already_closed(self) -> None:
         """Check whether the detector is closed and raise if so."""
-        if self._detector is None or self._working_image is None:
+        if self._closed:
             raise ValueError("This detector has already been closed")
 
+    @contextlib.contextmanager
+    def _borrow(
+        self,
+        quad_settings: Optional[QuadSettings],
+    ) -> Iterator[_NativeDetector]:
+        """
+        Borrow a native detector, configured with the given settings.
+
+        If no settings are given, the detector's current settings are used.
+        """
+        self._raise_if_already_closed()
+
+        if quad_settings is None:
+            quad_settings = self._quad_settings
+        else:
+            _check_quad_settings(quad_settings)
+
+        try:
+            native = self._idle.pop()
+        except IndexError:
+            native = self._create_native()
+
+        try:
+            native.configure(quad_settings)
+            yield native
+        finally:
+            self._idle.append(native)
+            # The detector may have been closed while this one was in use
+            if self._closed:
+                self._destroy_idle()
+
     @property
-    def image_size(self) -> Tuple[int, int]:
-        """The configured image size, as a tuple of (width, height)."""
+    def image_size(self) -> Optional[Tuple[int, int]]:
+        """The configured image size, as a tuple of (width, height), if any."""
         return self._image_size
 
-    def detect_tags(self, img: Image) -> Iterator['ApriltagDetection']:
+    @property
+    def nthreads(self) -> int:
+        """The number of threads used for detection."""
+        return self._nthreads
+
+    @property
+    def bits_corrected(self) -> int:
+        """The most bits in error which markers are decoded with."""
+        return self._bits_corrected
+
+    @property
+    def quad_settings(self) -> QuadSettings:
+        """The current settings for the quad detection stage."""
+        return self._quad_settings
+
+    @quad_settings.setter
+    def quad_settings(self, settings: QuadSettings) -> None:
+        """
+        Change the settings for the quad detection stage of later frames.
+
+        Detections already in progress on other threads are unaffected.
+        """
+        self._raise_if_already_closed()
+        _check_quad_settings(settings)
+        self._quad_settings = settings
+
+    def detect_tags(
+        self,
+        img: Image,
+        *,
+        quad_settings: Optional[QuadSettings] = None
+    ) -> Generator['ApriltagDetection', None, None]:
         """
         Run the given image through the apriltags detection routines.
 
         :param img: PIL Luminosity image to be processed
+        :param quad_settings: settings for the quad detection stage of just
+                              this image, rather than the detector's own
         :yield: python iterable of apriltag detections; these must be processed
                 and discarded before continuing iteration
         """
         self._raise_if_already_closed()
 
-        if self.image_size != img.size:
+        if self.image_size is not None and self.image_size != img.size:
             raise ValueError(
                 "Cannot process images of an incompatible size. Detector is "
                 "configured for {}, given image at {}".format(
@@ -102,20 +497,170 @@ class AprilTagDetector:
                 ),
             )
 
-        total_length = img.size[0] * img.size[1]
+        with self._borrow(quad_settings) as native:
+            working_image = native.working_image(img.size)
+            working_image.ravel()[:] = np.frombuffer(img.tobytes(), dtype=np.uint8)
 
-        ffi.memmove(self._working_image.buf, img.tobytes(), total_length)
+            image, array = self._image_header(native, working_image, None, None)
+            yield from self._detect(native, image)
 
-        results = lib.apriltag_detector_detect(
-            self._detector,
-            self._working_image,
-        )
+    def detect_tags_in_buffer(
+        self,
+        buffer: Any,
+        size: Optional[Tuple[int, int]] = None,
+        *,
+        stride: Optional[int] = None,
+        offset: Tuple[int, int] = (0, 0),
+        quad_settings: Optional[QuadSettings] = None
+    ) -> Generator['ApriltagDetection', None, None]:
+        """
+        Run the given greyscale image buffer through the apriltags detection routines.
+
+        Unlike `detect_tags`, the image is not copied: the detector reads the
+        given memory directly, so it must not be modified until iteration is
+        complete. This means that, for example, a slice of a larger NumPy
+        array can be processed in place.
+
+        :param buffer: a two dimensional uint8 NumPy array or memoryview, whose
+                       rows may be strided, or any other object supporting the
+                       buffer protocol holding one byte per pixel in row-major
+                       order
+        :param size: the size of the image, as a tuple of (width, height);
+                     required for flat buffers
+        :param stride: the number of bytes between the starts of consecutive
+                       rows in a flat buffer, if not the width of the image
+        :param offset: the position of the image within a larger one, as a
+                       tuple of (x, y); detections are reported in the
+                       coordinates of the larger image
+        :param quad_settings: settings for the quad detection stage of just
+                              this image, rather than the detector's own
+        :yield: python iterable of apriltag detections; these must be processed
+                and discarded before continuing iteration
+        """
+        with self._borrow(quad_settings) as native:
+            image, array = self._image_header(native, buffer, size, stride)
+
+            # `array` (and so the memory the image points to) is kept alive for
+            # as long as this generator is.
+            if offset == (0, 0):
+                yield from self._detect(native, image)
+            else:
+                for detection in self._detect(native, image):
+                    _offset_detection(detection, offset)
+                    yield detection
+
+    def detect_records(
+        self,
+        buffer: Any,
+        size: Optional[Tuple[int, int]] = None,
+        *,
+        stride: Optional[int] = None,
+        offset: Tuple[int, int] = (0, 0),
+        quad_settings: Optional[QuadSettings] = None
+    ) -> np.ndarray:
+        """
+        Detect markers in the given greyscale image buffer, all at once.
+
+        This accepts the same arguments as `detect_tags_in_buffer`, but rather
+        than yielding each detection in turn all the detections are copied
+        into a single structured array of `DETECTION_DTYPE`, which remains
+        valid for as long as it is needed.
+        """
+        with self._borrow(quad_settings) as native:
+            image, array = self._image_header(native, buffer, size, stride)
+
+            results = lib.apriltag_detector_detect(native.detector, image)
+            try:
+                records = np.empty(results.size, dtype=DETECTION_DTYPE)
+                if len(records):
+                    lib.apriltag_detections_export(
+                        results,
+                        ffi.cast(
+                            'apriltag_detection_record_t *',
+                            ffi.from_buffer(records),
+                        ),
+                        len(records),
+                    )
+            finally:
+                lib.apriltag_detections_destroy(results)
+
+        if offset != (0, 0):
+            _offset_records(records, offset)
+
+        return records
+
+    def _image_header(
+        self,
+        native: _NativeDetector,
+        buffer: Any,
+        size: Optional[Tuple[int, int]],
+        stride: Optional[int],
+    ) -> Tuple[Any, np.ndarray]:
+        """
+        Describe the image in the given buffer to the native detector.
+
+        The image points to the memory of the returned array, which must be
+        kept alive for as long as the image is used.
+        """
+        array = _as_image_array(buffer, size, stride)
+        height, width = array.shape
+
+        # The detector only writes to the image it is given when blurring
+        # without decimation; avoid modifying memory we don't own in that case.
+        settings = native.quad_settings
+        if settings.quad_sigma != 0 and settings.quad_decimate <= 1:
+            array = np.array(array)
+
+        image = ffi.new('image_u8_t *', {
+            'width': width,
+            'height': height,
+            'stride': array.strides[0],
+            'buf': ffi.cast('uint8_t *', array.ctypes.data),
+        })
+        return image, array
+
+    def _detect(
+        self,
+        native: _NativeDetector,
+        image: Any,
+    ) -> Generator['ApriltagDetection', None, None]:
+        # cffi releases the GIL for the duration of this call, so other Python
+        # threads can run while detection (itself possibly spread across
+        # several native threads) is in progress.
+        results = lib.apriltag_detector_detect(native.detector, image)
         try:
+            detections = ffi.cast('apriltag_detection_t **', results.data)
             for i in range(results.size):
-                detection = lib.zarray_get_detection(results, i)
-                try:
-                    yield detection
-                finally:
-                    lib.destroy_detection(detection)
+                yield detections[i]
         finally:
-            lib.zarray_destroy(results)
+            lib.apriltag_detections_destroy(results)
+
+
+# Detectors shared across the process, by their configuration
+_registry_lock = threading.Lock()
+_registry = {}  # type: Dict[Tuple[int, int], AprilTagDetector]
+
+
+def shared_detector(
+    *,
+    nthreads: int = 1,
+    bits_corrected: int = DEFAULT_BITS_CORRECTED
+) -> AprilTagDetector:
+    """
+    Get the process-wide detector with the given configuration.
+
+    The detector is created on first use and then shared by every caller
+    asking for the same configuration, so its native detectors (and their
+    working memory) are reused rather than rebuilt. It accepts images of any
+    size, and since it's shared its settings shouldn't be changed: pass the
+    ``quad_settings`` for each detection instead. It mustn't be closed.
+    """
+    key = (nthreads, bits_corrected)
+    with _registry_lock:
+        detector = _registry.get(key)
+        if detector is None or detector.closed:
+            detector = _registry[key] = AprilTagDetector(
+                nthreads=nthreads,
+                bits_corrected=bits_corrected,
+            )
+        return detector
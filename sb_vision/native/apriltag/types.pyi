@@ -12,4 +12,5 @@ class ApriltagDetection:
     goodness: float
     decision_margin: float
     H: MatrixData
+    c: List[float]
     p: List[List[float]]
@@ -1,6 +1,7 @@
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
+#include <math.h>
 #include <stdbool.h>
 #include <string>
 #include <vector>
@@ -14,10 +15,39 @@ extern "C" {
         double rvec[],
         double tvec[]
     );
+
+    #define PNP_METHOD_ITERATIVE 0
+    #define PNP_METHOD_IPPE_SQUARE 1
+
+    int solve_pnp_batch(
+        const size_t count,
+        const double object_points[],
+        const double image_points[],
+        const double camera_matrix[],
+        const double dist_coeffs[],
+        const int method,
+        const unsigned char use_extrinsic_guess[],
+        double rvecs[],
+        double tvecs[]
+    );
+
+    int pnp_method_supported(const int method);
 }
 
 #include "opencv2/opencv.hpp"
 
+// SOLVEPNP_IPPE_SQUARE was added in OpenCV 3.4.6 and 4.1. Note that OpenCV 2.x
+// uses CV_VERSION_EPOCH for its major version, shifting the others along.
+#if defined(CV_VERSION_EPOCH)
+#define HAVE_IPPE_SQUARE 0
+#elif CV_VERSION_MAJOR > 4 || (CV_VERSION_MAJOR == 4 && CV_VERSION_MINOR >= 1)
+#define HAVE_IPPE_SQUARE 1
+#elif CV_VERSION_MAJOR == 3 && CV_VERSION_MINOR == 4 && CV_VERSION_REVISION >= 6
+#define HAVE_IPPE_SQUARE 1
+#else
+#define HAVE_IPPE_SQUARE 0
+#endif
+
 void print_array(const int rows, const int cols, const double values[]) {
     printf("[\n");
     for (int i=0; i<rows; i++) {
@@ -98,3 +128,148 @@ int solve_pnp(
 
     return (int) ret;
 }
+
+
+int pnp_method_supported(const int method) {
+    switch (method) {
+        case PNP_METHOD_ITERATIVE:
+            return 1;
+        case PNP_METHOD_IPPE_SQUARE:
+            return HAVE_IPPE_SQUARE;
+        default:
+            return 0;
+    }
+}
+
+
+#if HAVE_IPPE_SQUARE
+static bool is_square(const double object_points[]) {
+    // The first corner is at (width / 2, height / 2)
+    return fabs(object_points[0] - object_points[1]) < 1e-9;
+}
+#endif
+
+
+static bool solve_pnp_one(
+    const double object_points[],
+    const double image_points[],
+    const cv::Mat& camera_matrix_mat,
+    const cv::Mat& dist_coeffs_mat,
+    const int method,
+    const bool use_extrinsic_guess,
+    cv::Mat& rvec_mat,
+    cv::Mat& tvec_mat
+) {
+#if HAVE_IPPE_SQUARE
+    if (method == PNP_METHOD_IPPE_SQUARE && is_square(object_points)) {
+        // IPPE_SQUARE requires the corners in a particular order, starting
+        // from (-width / 2, height / 2), which is our last corner. Rotating
+        // both sets of points keeps them corresponding, so the pose is the
+        // same as that from the iterative solver.
+        double ippe_object_points[4 * 3];
+        double ippe_image_points[4 * 2];
+        for (int i=0; i<4; i++) {
+            int from = (i + 3) % 4;
+            memcpy(ippe_object_points + (i * 3), object_points + (from * 3), 3 * sizeof(double));
+            memcpy(ippe_image_points + (i * 2), image_points + (from * 2), 2 * sizeof(double));
+        }
+
+        return cv::solvePnP(
+            cv::Mat(4, 3, CV_64F, ippe_object_points),
+            cv::Mat(4, 2, CV_64F, ippe_image_points),
+            camera_matrix_mat,
+            dist_coeffs_mat,
+            rvec_mat,
+            tvec_mat,
+            false,
+            cv::SOLVEPNP_IPPE_SQUARE
+        );
+    }
+#endif
+
+    // Wrap (rather than copy) the input data in OpenCV's Mat. Only the
+    // iterative solver makes use of an initial guess.
+    return cv::solvePnP(
+        cv::Mat(4, 3, CV_64F, const_cast<double*>(object_points)),
+        cv::Mat(4, 2, CV_64F, const_cast<double*>(image_points)),
+        camera_matrix_mat,
+        dist_coeffs_mat,
+        rvec_mat,
+        tvec_mat,
+        use_extrinsic_guess
+    );
+}
+
+
+int solve_pnp_batch(
+    const size_t count,
+    const double object_points[],
+    const double image_points[],
+    const double camera_matrix[],
+    const double dist_coeffs[],
+    const int method,
+    const unsigned char use_extrinsic_guess[],
+    double rvecs[],
+    double tvecs[]
+) {
+    // Where use_extrinsic_guess is given (it may be NULL), markers for which
+    // it is set have an initial guess at their pose in rvecs and tvecs, which
+    // are overwritten with the solved pose.
+    if (!pnp_method_supported(method)) {
+        return 0;
+    }
+
+    // Wrap (rather than copy) the input data in OpenCV's Mat. The calibration
+    // is shared by all the markers, so only needs wrapping once.
+    const cv::Mat camera_matrix_mat(3, 3, CV_64F, const_cast<double*>(camera_matrix));
+    const cv::Mat dist_coeffs_mat(5, 1, CV_64F, const_cast<double*>(dist_coeffs));
+
+    cv::Mat rvec_mat, tvec_mat;
+
+    for (size_t i=0; i<count; i++) {
+        double* rvec = rvecs + (i * 3);
+        double* tvec = tvecs + (i * 3);
+
+        const bool guess = use_extrinsic_guess != NULL && use_extrinsic_guess[i];
+        if (guess) {
+            rvec_mat.create(3, 1, CV_64F);
+            tvec_mat.create(3, 1, CV_64F);
+            COPY_INTO(rvec_mat, rvec);
+            COPY_INTO(tvec_mat, tvec);
+
+            // Undo our flipping of the 'y' coordinate (see below)
+            double* guess_tvec = (double *)tvec_mat.ptr();
+            guess_tvec[1] = -guess_tvec[1];
+        }
+
+        bool ret;
+        try {
+            ret = solve_pnp_one(
+                object_points + (i * 4 * 3),
+                image_points + (i * 4 * 2),
+                camera_matrix_mat,
+                dist_coeffs_mat,
+                method,
+                guess,
+                rvec_mat,
+                tvec_mat
+            );
+        } catch (const cv::Exception&) {
+            // Don't let exceptions escape into C
+            ret = false;
+        }
+        if (!ret) {
+            return 0;
+        }
+
+        // Copy the output data out of OpenCV's wrappers
+        memcpy(rvec, rvec_mat.ptr(), 3 * sizeof(double));
+        memcpy(tvec, tvec_mat.ptr(), 3 * sizeof(double));
+
+        // OpenCV returns the 'y' coordinate positive downwards, yet we want
+        // positive meaning upwards
+        tvec[1] = -tvec[1];
+    }
+
+    return 1;
+}
@@ -22,6 +22,23 @@ CV3D_DECLS = """
         double rvec[],
         double tvec[]
     );
+
+    #define PNP_METHOD_ITERATIVE 0
+    #define PNP_METHOD_IPPE_SQUARE 1
+
+    int solve_pnp_batch(
+        const size_t count,
+        const double object_points[],
+        const double image_points[],
+        const double camera_matrix[],
+        const double dist_coeffs[],
+        const int method,
+        const unsigned char use_extrinsic_guess[],
+        double rvecs[],
+        double tvecs[]
+    );
+
+    int pnp_method_supported(const int method);
 """
 
 ffibuilder.set_source(
@@ -5,13 +5,49 @@
 #include <string>
 
 extern "C" {
-    void* cvopen(const int device_id);
+    void* cvopen(const int device_id, const int raw_frames, const int fourcc, const double fps);
     void cvclose(void* context);
+    int cvraw_frames(void* context);
+    int cvfourcc(void* context);
+    double cvfps(void* context);
     int cvcapture(void* context, void* buffer, size_t width, size_t height);
+    int cvcapture_latest(void* context, void* buffer, size_t width, size_t height);
 }
 
 #include "opencv2/opencv.hpp"
 
+struct capture_context {
+    cv::VideoCapture* cap;
+    // Whether raw frames were requested, and whether the backend accepted the
+    // request (when the format was last requested). Backends which don't
+    // support the property read it back as 0 too, so reading it can't tell.
+    bool raw_requested;
+    bool raw_frames;
+    // The requested pixel format and frame rate (or 0 to leave them to the
+    // camera), which are requested again whenever the resolution changes.
+    int fourcc;
+    double fps;
+};
+
+void request_format(capture_context* context) {
+    if (context->raw_requested) {
+        // Ask for frames in the camera's own format, rather than having
+        // OpenCV convert each one to BGR only for us to convert that to
+        // greyscale. Not all backends support this, in which case frames
+        // remain BGR.
+        context->raw_frames = context->cap->set(CV_CAP_PROP_CONVERT_RGB, 0);
+    }
+
+    // The format must be set before the frame rate, as the rates available
+    // depend on it.
+    if (context->fourcc != 0) {
+        context->cap->set(CV_CAP_PROP_FOURCC, context->fourcc);
+    }
+    if (context->fps > 0) {
+        context->cap->set(CV_CAP_PROP_FPS, context->fps);
+    }
+}
+
 void skipframes(cv::VideoCapture* context, int frames_to_skip) {
     for (int i=0; i < frames_to_skip; i++) {
         context->grab();
@@ -25,49 +61,166 @@ void warmup(cv::VideoCapture* context) {
     skipframes(context, 11);
 }
 
-void* cvopen(const int device_id) {
-    cv::VideoCapture* context = new cv::VideoCapture(device_id);
-    if (!context->isOpened()) {
-        delete context;
+void* cvopen(const int device_id, const int raw_frames, const int fourcc, const double fps) {
+    cv::VideoCapture* cap = new cv::VideoCapture(device_id);
+    if (!cap->isOpened()) {
+        delete cap;
         return NULL;
     }
-    warmup(context);
+
+    capture_context* context = new capture_context;
+    context->cap = cap;
+    context->raw_requested = raw_frames != 0;
+    context->raw_frames = false;
+    context->fourcc = fourcc;
+    context->fps = fps;
+    request_format(context);
+
+    warmup(cap);
     return reinterpret_cast<void*>(context);
 }
 
 void cvclose(void* context) {
-    cv::VideoCapture* cap = reinterpret_cast<cv::VideoCapture*>(context);
-    delete cap;
+    capture_context* ctx = reinterpret_cast<capture_context*>(context);
+    delete ctx->cap;
+    delete ctx;
 }
 
-int cvcapture(void* context, void* buffer, size_t width, size_t height) {
-    cv::VideoCapture* cap = reinterpret_cast<cv::VideoCapture*>(context);
+int cvraw_frames(void* context) {
+    // Whether frames are captured in the camera's own format.
+    return reinterpret_cast<capture_context*>(context)->raw_frames;
+}
+
+int cvfourcc(void* context) {
+    // The pixel format the camera is providing frames in.
+    cv::VideoCapture* cap = reinterpret_cast<capture_context*>(context)->cap;
+    return (int)cap->get(CV_CAP_PROP_FOURCC);
+}
+
+double cvfps(void* context) {
+    // The frame rate the camera is providing frames at.
+    cv::VideoCapture* cap = reinterpret_cast<capture_context*>(context)->cap;
+    return cap->get(CV_CAP_PROP_FPS);
+}
 
+int ensure_resolution(capture_context* context, size_t width, size_t height) {
+    cv::VideoCapture* cap = context->cap;
+
+    // Returns whether the resolution needed changing (in which case the camera
+    // has also been warmed up again).
     double current_width = cap->get(CV_CAP_PROP_FRAME_WIDTH);
     double current_height = cap->get(CV_CAP_PROP_FRAME_HEIGHT);
 
-    if (current_width != (double)width || current_height != (double)height) {
-        fprintf( stderr, "Changing resolution from %dx%d to %dx%d\n", current_width, current_height, width, height);
-        cap->set(CV_CAP_PROP_FRAME_WIDTH, width);
-        if (cap->get(CV_CAP_PROP_FRAME_HEIGHT) != (double)height) {
-            cap->set(CV_CAP_PROP_FRAME_HEIGHT, height);
+    if (current_width == (double)width && current_height == (double)height) {
+        return 0;
+    }
+
+    fprintf( stderr, "Changing resolution from %dx%d to %dx%d\n", current_width, current_height, width, height);
+    cap->set(CV_CAP_PROP_FRAME_WIDTH, width);
+    if (cap->get(CV_CAP_PROP_FRAME_HEIGHT) != (double)height) {
+        cap->set(CV_CAP_PROP_FRAME_HEIGHT, height);
+    }
+    // The driver may have chosen another format and frame rate to suit the
+    // new resolution, and the backend may have gone back to converting frames
+    request_format(context);
+
+    // Get the camera warmed up for the new resolution
+    warmup(cap);
+    return 1;
+}
+
+bool is_jpeg(const cv::Mat& frame) {
+    // Starts with the start of image marker, followed by another marker
+    return (
+        frame.isContinuous() &&
+        frame.total() * frame.elemSize() > 3 &&
+        frame.data[0] == 0xFF &&
+        frame.data[1] == 0xD8 &&
+        frame.data[2] == 0xFF
+    );
+}
+
+void decode_jpeg_luminance(const cv::Mat& frame, cv::Mat& greyscale_image) {
+    // Decoding just the luminance of compressed (MJPEG) frames skips
+    // upsampling the chroma and converting to colour.
+    cv::imdecode(frame, cv::IMREAD_GRAYSCALE, &greyscale_image);
+}
+
+void extract_luminance(const cv::Mat& frame, int luminance_channel, cv::Mat& greyscale_image) {
+    // Packed 4:2:2 YUV, two bytes per pixel with the luminance in the first
+    // byte of each pair for YUYV, or the second for UYVY. Pull it out with a
+    // single strided copy.
+    int width = greyscale_image.size().width;
+    int height = greyscale_image.size().height;
+    cv::Mat packed(height, width, CV_8UC2, frame.data);
+    cv::extractChannel(packed, greyscale_image, luminance_channel);
+}
+
+int frame_to_greyscale(cv::VideoCapture* cap, const cv::Mat& frame, cv::Mat& greyscale_image) {
+    // Fill `greyscale_image` (already sized for the frame) from a frame in
+    // whichever format the capture gave it to us in. Returns 0 on failure.
+    int width = greyscale_image.size().width;
+    int height = greyscale_image.size().height;
+    size_t frame_bytes = frame.total() * frame.elemSize();
+
+    if (frame.channels() == 3) {
+        // Converted to BGR by OpenCV
+        cv::cvtColor(frame, greyscale_image, cv::COLOR_BGR2GRAY);
+        return 1;
+    }
+
+    if (frame.channels() == 1 && frame.size().width == width && frame.size().height == height) {
+        // Already greyscale
+        frame.copyTo(greyscale_image);
+        return 1;
+    }
+
+    bool packed_size = frame.isContinuous() && frame_bytes == (size_t)width * height * 2;
+
+    // Raw frames are in the format negotiated with the camera, so go by that
+    int fourcc = (int)cap->get(CV_CAP_PROP_FOURCC);
+
+    if (fourcc == CV_FOURCC('M', 'J', 'P', 'G') || fourcc == CV_FOURCC('J', 'P', 'E', 'G')) {
+        decode_jpeg_luminance(frame, greyscale_image);
+        return 1;
+    }
+
+    if (packed_size) {
+        if (fourcc == CV_FOURCC('Y', 'U', 'Y', 'V') || fourcc == CV_FOURCC('Y', 'U', 'Y', '2')) {
+            extract_luminance(frame, 0, greyscale_image);
+            return 1;
+        }
+        if (fourcc == CV_FOURCC('U', 'Y', 'V', 'Y')) {
+            extract_luminance(frame, 1, greyscale_image);
+            return 1;
         }
+    }
 
-        // Get the camera warmed up for the new resolution
-        warmup(cap);
+    // Some backends don't report the format, so fall back to guessing it from
+    // the frame itself
+    if (frame.channels() != 2 && is_jpeg(frame)) {
+        decode_jpeg_luminance(frame, greyscale_image);
+        return 1;
     }
-    else {
-        // To be sure that we get an image which accurately describes what is in
-        // front of the camera _right now_ (rather than whenever the last frames
-        // were grabbed) we ditch the last few frames.
-        // This is needed with the TeckNet cameras we're using, though may not
-        // be needed for others. Note: manual testing suggests that skipping 4
-        // frames works for this purpose, though we deliberatly skip one more
-        // than that to reduce the chances that we'll get a bad frame (in case
-        // this is timing related).
-        skipframes(cap, 5);
+
+    if (packed_size) {
+        extract_luminance(frame, 0, greyscale_image);
+        return 1;
     }
 
+    fprintf(
+        stderr,
+        "Unrecognised frame format: %dx%d, %d channel(s), %d bytes, FOURCC %08x\n",
+        frame.size().width,
+        frame.size().height,
+        frame.channels(),
+        (int)frame_bytes,
+        fourcc
+    );
+    return 0;
+}
+
+int read_greyscale(cv::VideoCapture* cap, void* buffer, size_t width, size_t height) {
     if (cap->get(CV_CAP_PROP_FRAME_WIDTH) != (double)width) {
         fprintf(stderr, "Incorrect width set on cap: %f\n", cap->get(CV_CAP_PROP_FRAME_WIDTH));
         return 0;
@@ -78,19 +231,23 @@ int cvcapture(void* context, void* buffer, size_t width, size_t height) {
         return 0;
     }
 
-    cv::Mat colour_image, greyscale_image;
+    cv::Mat frame;
 
-    (*cap) >> colour_image;
-    if (colour_image.empty()) {
+    (*cap) >> frame;
+    if (frame.empty()) {
         fprintf(stderr, "Failed to capture image (result was empty)\n");
         return 0;
     }
 
-    cv::cvtColor(colour_image, greyscale_image, cv::COLOR_BGR2GRAY);
+    // Convert directly into the caller's buffer. OpenCV only reallocates the
+    // output if it isn't already the right size and type, which is checked
+    // for below.
+    cv::Mat greyscale_image(height, width, CV_8UC1, buffer);
 
-    if (!greyscale_image.isContinuous()) {
+    if (!frame_to_greyscale(cap, frame, greyscale_image)) {
         return 0;
     }
+
     int died_horribly = 0;
     if (greyscale_image.size().width != width) {
         fprintf(
@@ -114,10 +271,46 @@ int cvcapture(void* context, void* buffer, size_t width, size_t height) {
         return 0;
     }
 
-    memcpy(
-        buffer,
-        greyscale_image.ptr(),
-        width * height
-    );
+    if (greyscale_image.data != buffer) {
+        if (!greyscale_image.isContinuous()) {
+            return 0;
+        }
+        memcpy(
+            buffer,
+            greyscale_image.ptr(),
+            width * height
+        );
+    }
     return 1;
 }
+
+int cvcapture(void* context, void* buffer, size_t width, size_t height) {
+    capture_context* ctx = reinterpret_cast<capture_context*>(context);
+    cv::VideoCapture* cap = ctx->cap;
+
+    if (!ensure_resolution(ctx, width, height)) {
+        // To be sure that we get an image which accurately describes what is in
+        // front of the camera _right now_ (rather than whenever the last frames
+        // were grabbed) we ditch the last few frames.
+        // This is needed with the TeckNet cameras we're using, though may not
+        // be needed for others. Note: manual testing suggests that skipping 4
+        // frames works for this purpose, though we deliberatly skip one more
+        // than that to reduce the chances that we'll get a bad frame (in case
+        // this is timing related).
+        skipframes(cap, 5);
+    }
+
+    return read_greyscale(cap, buffer, width, height);
+}
+
+int cvcapture_latest(void* context, void* buffer, size_t width, size_t height) {
+    // Unlike `cvcapture`, this doesn't skip any frames. It is intended to be
+    // called continuously (from a background thread) such that the driver's
+    // queue of frames never gets the chance to go stale.
+    capture_context* ctx = reinterpret_cast<capture_context*>(context);
+    cv::VideoCapture* cap = ctx->cap;
+
+    ensure_resolution(ctx, width, height);
+
+    return read_greyscale(cap, buffer, width, height);
+}
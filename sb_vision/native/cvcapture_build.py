@@ -15,8 +15,13 @@ ffibuilder = cffi.FFI()
 
 CVCAPTURE_DECLS = """
     int cvcapture(void* context, void* buffer, size_t width, size_t height);
-    void* cvopen(const int path);
+    int cvcapture_latest(void* context, void* buffer, size_t width, size_t height);
+    void* cvopen(
+        const int path, const int raw_frames, const int fourcc, const double fps);
     void cvclose(void* context);
+    int cvraw_frames(void* context);
+    int cvfourcc(void* context);
+    double cvfps(void* context);
 """
 
 ffibuilder.set_source(
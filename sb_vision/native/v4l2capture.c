@@ -0,0 +1,339 @@
+#include <errno.h>
+#include <fcntl.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/ioctl.h>
+#include <sys/mman.h>
+#include <sys/select.h>
+#include <time.h>
+#include <unistd.h>
+
+#include <linux/videodev2.h>
+
+#include "v4l2capture_cdefs.h"
+
+struct mapped_buffer {
+    void* start;
+    size_t length;
+};
+
+struct capture_context {
+    int fd;
+    int streaming;
+    uint32_t buffer_count;
+    struct mapped_buffer buffers[V4L2CAPTURE_MAX_BUFFERS];
+};
+
+static int xioctl(int fd, unsigned long request, void* arg) {
+    int result;
+    do {
+        result = ioctl(fd, request, arg);
+    } while (result == -1 && errno == EINTR);
+    return result;
+}
+
+static double monotonic_now(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec + now.tv_nsec / 1e9;
+}
+
+static int fail(const char* operation) {
+    fprintf(stderr, "%s failed: %s\n", operation, strerror(errno));
+    return 0;
+}
+
+static void release_buffers(struct capture_context* context) {
+    if (context->streaming) {
+        enum v4l2_buf_type type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+        xioctl(context->fd, VIDIOC_STREAMOFF, &type);
+        context->streaming = 0;
+    }
+
+    for (uint32_t index = 0; index < context->buffer_count; ++index) {
+        munmap(context->buffers[index].start, context->buffers[index].length);
+    }
+    context->buffer_count = 0;
+
+    // Hand the buffers back, so that the format can be changed. Done even
+    // when none were mapped, as the kernel may have allocated them anyway
+    // (such as when it offered more than we can use).
+    struct v4l2_requestbuffers request;
+    memset(&request, 0, sizeof(request));
+    request.count = 0;
+    request.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    request.memory = V4L2_MEMORY_MMAP;
+    xioctl(context->fd, VIDIOC_REQBUFS, &request);
+}
+
+static int map_buffers(struct capture_context* context, uint32_t buffer_count) {
+    struct v4l2_requestbuffers request;
+    memset(&request, 0, sizeof(request));
+    request.count = buffer_count;
+    request.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    request.memory = V4L2_MEMORY_MMAP;
+    if (xioctl(context->fd, VIDIOC_REQBUFS, &request) == -1) {
+        return fail("VIDIOC_REQBUFS");
+    }
+    if (request.count < 2 || request.count > V4L2CAPTURE_MAX_BUFFERS) {
+        fprintf(stderr, "Device offered %u buffers\n", request.count);
+        return 0;
+    }
+
+    for (uint32_t index = 0; index < request.count; ++index) {
+        struct v4l2_buffer buffer;
+        memset(&buffer, 0, sizeof(buffer));
+        buffer.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+        buffer.memory = V4L2_MEMORY_MMAP;
+        buffer.index = index;
+        if (xioctl(context->fd, VIDIOC_QUERYBUF, &buffer) == -1) {
+            return fail("VIDIOC_QUERYBUF");
+        }
+
+        void* start = mmap(
+            NULL,
+            buffer.length,
+            PROT_READ | PROT_WRITE,
+            MAP_SHARED,
+            context->fd,
+            buffer.m.offset
+        );
+        if (start == MAP_FAILED) {
+            return fail("mmap");
+        }
+        context->buffers[index].start = start;
+        context->buffers[index].length = buffer.length;
+        // Counted as they're mapped, so that a partial mapping is undone
+        context->buffer_count = index + 1;
+    }
+
+    for (uint32_t index = 0; index < context->buffer_count; ++index) {
+        if (!v4l2capture_requeue(context, index)) {
+            return 0;
+        }
+    }
+
+    return 1;
+}
+
+void* v4l2capture_open(const int device_id) {
+    char path[32];
+    snprintf(path, sizeof(path), "/dev/video%d", device_id);
+
+    // Non-blocking, so that dequeueing waits only as long as we choose
+    int fd = open(path, O_RDWR | O_NONBLOCK);
+    if (fd == -1) {
+        return NULL;
+    }
+
+    struct v4l2_capability capability;
+    memset(&capability, 0, sizeof(capability));
+    if (xioctl(fd, VIDIOC_QUERYCAP, &capability) == -1) {
+        close(fd);
+        return NULL;
+    }
+    uint32_t capabilities = capability.capabilities;
+    if (capabilities & V4L2_CAP_DEVICE_CAPS) {
+        capabilities = capability.device_caps;
+    }
+    if (!(capabilities & V4L2_CAP_VIDEO_CAPTURE) || !(capabilities & V4L2_CAP_STREAMING)) {
+        fprintf(stderr, "%s cannot stream video\n", path);
+        close(fd);
+        return NULL;
+    }
+
+    struct capture_context* context = calloc(1, sizeof(struct capture_context));
+    if (context == NULL) {
+        close(fd);
+        return NULL;
+    }
+    context->fd = fd;
+    return context;
+}
+
+void v4l2capture_close(void* context) {
+    struct capture_context* ctx = context;
+    release_buffers(ctx);
+    close(ctx->fd);
+    free(ctx);
+}
+
+int v4l2capture_configure(
+    void* context,
+    const uint32_t width,
+    const uint32_t height,
+    const uint32_t fourcc,
+    const double fps,
+    const uint32_t buffer_count
+) {
+    struct capture_context* ctx = context;
+
+    // The format can't be changed while buffers are allocated
+    release_buffers(ctx);
+
+    struct v4l2_format format;
+    memset(&format, 0, sizeof(format));
+    format.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    if (xioctl(ctx->fd, VIDIOC_G_FMT, &format) == -1) {
+        return fail("VIDIOC_G_FMT");
+    }
+    format.fmt.pix.width = width;
+    format.fmt.pix.height = height;
+    if (fourcc != 0) {
+        format.fmt.pix.pixelformat = fourcc;
+    }
+    format.fmt.pix.field = V4L2_FIELD_NONE;
+    if (xioctl(ctx->fd, VIDIOC_S_FMT, &format) == -1) {
+        return fail("VIDIOC_S_FMT");
+    }
+    // The driver picks the nearest size it supports
+    if (format.fmt.pix.width != width || format.fmt.pix.height != height) {
+        fprintf(
+            stderr,
+            "Device cannot capture at %ux%u (nearest is %ux%u)\n",
+            width,
+            height,
+            format.fmt.pix.width,
+            format.fmt.pix.height
+        );
+        return 0;
+    }
+
+    // Must follow the format, as the frame rates available depend on it. Not
+    // all drivers support choosing the frame rate, so failure is ignored.
+    if (fps > 0) {
+        struct v4l2_streamparm parameters;
+        memset(&parameters, 0, sizeof(parameters));
+        parameters.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+        parameters.parm.capture.timeperframe.numerator = 1000;
+        parameters.parm.capture.timeperframe.denominator = (uint32_t)(fps * 1000 + 0.5);
+        xioctl(ctx->fd, VIDIOC_S_PARM, &parameters);
+    }
+
+    if (!map_buffers(ctx, buffer_count)) {
+        release_buffers(ctx);
+        return 0;
+    }
+
+    enum v4l2_buf_type type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    if (xioctl(ctx->fd, VIDIOC_STREAMON, &type) == -1) {
+        fail("VIDIOC_STREAMON");
+        release_buffers(ctx);
+        return 0;
+    }
+    ctx->streaming = 1;
+
+    return 1;
+}
+
+int v4l2capture_get_format(void* context, struct v4l2capture_format* format) {
+    struct capture_context* ctx = context;
+
+    struct v4l2_format current;
+    memset(&current, 0, sizeof(current));
+    current.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    if (xioctl(ctx->fd, VIDIOC_G_FMT, &current) == -1) {
+        return fail("VIDIOC_G_FMT");
+    }
+    format->width = current.fmt.pix.width;
+    format->height = current.fmt.pix.height;
+    format->fourcc = current.fmt.pix.pixelformat;
+    format->bytes_per_line = current.fmt.pix.bytesperline;
+    format->buffer_count = ctx->buffer_count;
+
+    format->fps = 0;
+    struct v4l2_streamparm parameters;
+    memset(&parameters, 0, sizeof(parameters));
+    parameters.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    if (xioctl(ctx->fd, VIDIOC_G_PARM, &parameters) == 0) {
+        struct v4l2_fract period = parameters.parm.capture.timeperframe;
+        if ((parameters.parm.capture.capability & V4L2_CAP_TIMEPERFRAME) && period.numerator != 0) {
+            format->fps = (double)period.denominator / period.numerator;
+        }
+    }
+
+    return 1;
+}
+
+int v4l2capture_dequeue(
+    void* context,
+    const double timeout,
+    struct v4l2capture_frame* frame
+) {
+    // Returns 1 with a frame, 0 if none arrived within the timeout, or -1 on
+    // failure.
+    struct capture_context* ctx = context;
+
+    if (!ctx->streaming) {
+        fprintf(stderr, "Device is not configured\n");
+        return -1;
+    }
+
+    double deadline = monotonic_now() + timeout;
+    int ready;
+    do {
+        fd_set fds;
+        FD_ZERO(&fds);
+        FD_SET(ctx->fd, &fds);
+
+        double remaining = deadline - monotonic_now();
+        if (remaining < 0) {
+            remaining = 0;
+        }
+        struct timeval wait;
+        wait.tv_sec = (time_t)remaining;
+        wait.tv_usec = (suseconds_t)((remaining - wait.tv_sec) * 1000000);
+
+        // Interrupted by a signal, which isn't a timeout: wait out the rest
+        ready = select(ctx->fd + 1, &fds, NULL, NULL, &wait);
+    } while (ready == -1 && errno == EINTR);
+
+    if (ready == -1) {
+        fail("select");
+        return -1;
+    }
+    if (ready == 0) {
+        return 0;
+    }
+
+    struct v4l2_buffer buffer;
+    memset(&buffer, 0, sizeof(buffer));
+    buffer.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    buffer.memory = V4L2_MEMORY_MMAP;
+    if (xioctl(ctx->fd, VIDIOC_DQBUF, &buffer) == -1) {
+        if (errno == EAGAIN) {
+            return 0;
+        }
+        fail("VIDIOC_DQBUF");
+        return -1;
+    }
+
+    frame->index = buffer.index;
+    frame->data = ctx->buffers[buffer.index].start;
+    frame->length = buffer.bytesused;
+    frame->sequence = buffer.sequence;
+
+    frame->timestamp = -1;
+    uint32_t clock = buffer.flags & V4L2_BUF_FLAG_TIMESTAMP_MASK;
+    if (clock == V4L2_BUF_FLAG_TIMESTAMP_MONOTONIC) {
+        frame->timestamp = buffer.timestamp.tv_sec + buffer.timestamp.tv_usec / 1e6;
+    }
+
+    return 1;
+}
+
+int v4l2capture_requeue(void* context, const uint32_t index) {
+    struct capture_context* ctx = context;
+
+    struct v4l2_buffer buffer;
+    memset(&buffer, 0, sizeof(buffer));
+    buffer.type = V4L2_BUF_TYPE_VIDEO_CAPTURE;
+    buffer.memory = V4L2_MEMORY_MMAP;
+    buffer.index = index;
+    if (xioctl(ctx->fd, VIDIOC_QBUF, &buffer) == -1) {
+        return fail("VIDIOC_QBUF");
+    }
+    return 1;
+}
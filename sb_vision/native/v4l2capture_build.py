@@ -0,0 +1,30 @@
+"""
+CFFI build script for the v4l2capture native module.
+
+This captures from webcams by talking to Video4Linux directly, into buffers
+mapped from the kernel, without needing OpenCV.
+"""
+
+from pathlib import Path
+
+import cffi
+
+base = Path(__file__).parent
+
+ffibuilder = cffi.FFI()
+
+with (base / 'v4l2capture.c').open('r') as v4l2capture:
+    ffibuilder.set_source(
+        "sb_vision.native._v4l2capture",
+        v4l2capture.read(),
+        include_dirs=[
+            str(base),
+        ],
+        extra_compile_args=['-std=gnu99'],
+    )
+
+with (base / 'v4l2capture_cdefs.h').open('r') as v4l2capture_h:
+    ffibuilder.cdef(v4l2capture_h.read())
+
+if __name__ == '__main__':
+    ffibuilder.compile(verbose=True)
@@ -0,0 +1,45 @@
+// The most kernel buffers a device may be given
+#define V4L2CAPTURE_MAX_BUFFERS 32
+
+// The format frames are being captured in
+struct v4l2capture_format {
+    uint32_t width;
+    uint32_t height;
+    uint32_t fourcc;
+    uint32_t bytes_per_line;
+    // Zero where the driver doesn't report its frame rate
+    double fps;
+    // The number of kernel buffers frames are captured into
+    uint32_t buffer_count;
+};
+
+// A frame dequeued from the kernel, which must be requeued once read
+struct v4l2capture_frame {
+    uint32_t index;
+    const void* data;
+    size_t length;
+    // In seconds on the CLOCK_MONOTONIC clock (as Python's `time.monotonic`),
+    // or negative where the driver uses another clock
+    double timestamp;
+    uint32_t sequence;
+};
+
+void* v4l2capture_open(const int device_id);
+void v4l2capture_close(void* context);
+
+int v4l2capture_configure(
+    void* context,
+    const uint32_t width,
+    const uint32_t height,
+    const uint32_t fourcc,
+    const double fps,
+    const uint32_t buffer_count
+);
+int v4l2capture_get_format(void* context, struct v4l2capture_format* format);
+
+int v4l2capture_dequeue(
+    void* context,
+    const double timeout,
+    struct v4l2capture_frame* frame
+);
+int v4l2capture_requeue(void* context, const uint32_t index);
@@ -0,0 +1,296 @@
+"""
+Pipelined processing of frames from a camera.
+
+Capturing a frame, detecting the markers in it and calculating their positions
+each take a while, yet needn't happen in lockstep: the camera can be grabbing
+the next frame while the markers in this one are found. `VisionStream` runs
+each of these as a stage on its own thread, connected by bounded queues, so
+that frames are processed at close to the rate of the slowest stage rather
+than the total of them all.
+"""
+
+import collections
+import threading
+import time
+from typing import (  # noqa: F401
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from .tokens import TokenSet
+
+if TYPE_CHECKING:
+    from .vision import Vision  # noqa: F401
+
+# The number of items each queue between stages holds
+DEFAULT_DEPTH = 2
+
+FrameMetadata = NamedTuple('FrameMetadata', (
+    # The position of the frame in the sequence captured, from zero. Gaps are
+    # frames which were dropped.
+    ('index', int),
+    # When the frame was captured, as given by `time.monotonic`
+    ('timestamp', float),
+    # The size of the frame, as (width, height)
+    ('size', Tuple[int, int]),
+))
+
+
+class _Failure:
+    """An error raised by a stage, to be raised again by the consumer."""
+
+    __slots__ = ('error',)
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+
+# Returned by a closed queue once it's empty
+_CLOSED = object()
+
+
+class _StageQueue:
+    """
+    A bounded queue between two stages of a pipeline.
+
+    When full, putting an item either drops the oldest item in the queue (if
+    ``drop_oldest``) or waits for there to be space. Failures are never
+    dropped.
+    """
+
+    def __init__(
+        self,
+        depth: int,
+        *,
+        drop_oldest: bool,
+        on_drop: Callable[[Any], None]
+    ) -> None:
+        self.depth = depth
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+
+        self._on_drop = on_drop
+        self._items = collections.deque()  # type: collections.deque[Any]
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def _discard(self, item: Any) -> None:
+        if not isinstance(item, _Failure):
+            self._on_drop(item)
+
+    def _drop(self, item: Any) -> None:
+        if not isinstance(item, _Failure):
+            self.dropped += 1
+        self._discard(item)
+
+    def put(self, item: Any) -> None:
+        """Add an item to the queue. Items put once it's closed are discarded."""
+        with self._condition:
+            if not self.drop_oldest:
+                while len(self._items) >= self.depth and not self._closed:
+                    self._condition.wait()
+
+            if self._closed:
+                self._discard(item)
+                return
+
+            if len(self._items) >= self.depth:
+                self._drop(self._items.popleft())
+
+            self._items.append(item)
+            self._condition.notify_all()
+
+    def get(self) -> Any:
+        """Remove the oldest item, waiting for one; `_CLOSED` once closed."""
+        with self._condition:
+            while not self._items and not self._closed:
+                self._condition.wait()
+
+            if self._closed:
+                return _CLOSED
+
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def close(self) -> None:
+        """Close the queue, discarding anything in it."""
+        with self._condition:
+            self._closed = True
+            while self._items:
+                self._discard(self._items.popleft())
+            self._condition.notify_all()
+
+
+class VisionStream:
+    """
+    Iterator over the tokens seen in successive frames from a camera.
+
+    Each frame is captured, has its markers detected and then their positions
+    calculated in separate stages, each on its own thread. The stages are
+    connected by queues holding up to ``depth`` items. With ``drop_oldest``,
+    a stage which falls behind has the oldest of its pending items dropped,
+    so that the most recent frames are always the ones processed; otherwise
+    the earlier stages wait for it to catch up.
+
+    Iterating gives ``(metadata, tokens)`` for each frame, in the order the
+    frames were captured, where ``metadata`` is a `FrameMetadata` and
+    ``tokens`` a `TokenSet`. Errors in any stage are raised by the iteration.
+
+    The stream must be closed once finished with (for example by using it as
+    a context manager). The `Vision` must not otherwise be used until then.
+    """
+
+    def __init__(
+        self,
+        vision: 'Vision',
+        *,
+        depth: int = DEFAULT_DEPTH,
+        drop_oldest: bool = True,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> None:
+        """Start streaming from the given `Vision` instance's camera."""
+        if depth < 1:
+            raise ValueError("Depth must be at least one (got {})".format(depth))
+
+        self._vision = vision
+        self._marker_ids = None if marker_ids is None else frozenset(marker_ids)
+        self._closed = threading.Event()
+        self._next_index = 0
+
+        # Initialise the camera and detector before any stage needs them, so
+        # that the stages don't race to do so.
+        camera = vision.camera
+        vision.apriltag_detector
+
+        def queue(
+            on_drop: Callable[[Any], None] = lambda item: None,
+            *,
+            drop_oldest: bool = drop_oldest
+        ) -> _StageQueue:
+            return _StageQueue(depth, drop_oldest=drop_oldest, on_drop=on_drop)
+
+        # Cameras whose frames are always available (such as files) would
+        # otherwise be captured from continuously only for the frames to be
+        # dropped, so capturing waits for there to be space instead.
+        self._frames = queue(
+            on_drop=lambda item: item[1].release(),
+            drop_oldest=drop_oldest and camera.live,
+        )
+        self._detections = queue()
+        self._results = queue()
+        self._queues = (self._frames, self._detections, self._results)
+
+        self._threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(work, source, sink),
+                name='vision-{}'.format(name),
+                daemon=True,
+            )
+            for name, work, source, sink in (
+                ('capture', self._capture, None, self._frames),
+                ('detect', self._detect, self._frames, self._detections),
+                ('pose', self._pose, self._detections, self._results),
+            )
+        ]  # type: List[threading.Thread]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def dropped(self) -> int:
+        """The number of frames dropped so far, for being behind."""
+        return sum(x.dropped for x in self._queues)
+
+    def _run_stage(
+        self,
+        work: Callable[[Any], Any],
+        source: Optional[_StageQueue],
+        sink: _StageQueue,
+    ) -> None:
+        try:
+            while not self._closed.is_set():
+                item = None if source is None else source.get()
+                if item is _CLOSED:
+                    return
+                if isinstance(item, _Failure):
+                    sink.put(item)
+                    return
+                sink.put(work(item))
+        except Exception as e:
+            sink.put(_Failure(e))
+
+    def _capture(self, _: None) -> Tuple[FrameMetadata, Any]:
+        frame = self._vision.camera.capture_frame()
+        metadata = FrameMetadata(
+            index=self._next_index,
+            timestamp=frame.timestamp or time.monotonic(),
+            size=frame.size,
+        )
+        self._next_index += 1
+        return metadata, frame
+
+    def _detect(self, item: Tuple[FrameMetadata, Any]) -> Tuple[FrameMetadata, Any]:
+        metadata, frame = item
+        start = time.perf_counter()
+        with frame:
+            records, regions = self._vision.detect_records(
+                frame,
+                marker_ids=self._marker_ids,
+            )
+        # Only the detector's own time matters here, as it's in a stage of its
+        # own rather than sharing the frame's time with the other stages.
+        self._vision.update_detector(
+            records,
+            image_size=metadata.size,
+            full_search=regions is None,
+            duration=time.perf_counter() - start,
+        )
+        return metadata, records
+
+    def _pose(self, item: Tuple[FrameMetadata, Any]) -> Tuple[FrameMetadata, TokenSet]:
+        metadata, records = item
+        # Always calculate the positions here, as this is the stage for it
+        token_set = self._vision.token_set_from_records(
+            records,
+            metadata.size,
+            lazy=False,
+        )
+        return metadata, token_set
+
+    def __iter__(self) -> 'VisionStream':
+        """Iterator protocol."""
+        return self
+
+    def __next__(self) -> Tuple[FrameMetadata, TokenSet]:
+        """Get the tokens seen in the next frame, waiting for it if needed."""
+        item = self._results.get()
+        if item is _CLOSED:
+            raise StopIteration
+        if isinstance(item, _Failure):
+            self.close()
+            raise item.error
+        return item
+
+    def close(self) -> None:
+        """Stop streaming, waiting for the stages to finish."""
+        self._closed.set()
+        for queue in self._queues:
+            queue.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def __enter__(self) -> 'VisionStream':
+        """Context manager protocol. Closes the stream on exit."""
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        """Context manager protocol. Closes the stream on exit."""
+        self.close()
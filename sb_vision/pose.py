@@ -0,0 +1,212 @@
+"""
+Ways of calculating the pose of a marker from its detection.
+
+The iterative solver is the most accurate, though also the most expensive. For
+the square markers we use OpenCV also provides a (much cheaper) closed form
+solver, and the homography found by AprilTag can be decomposed into a pose
+without involving OpenCV at all.
+"""
+
+import enum
+import time
+from typing import Callable, Dict, Iterable, Sequence, Tuple  # noqa: F401
+
+import numpy as np
+
+from . import cv3d
+
+# How long, in seconds, a marker's pose remains a useful guess at its next pose
+DEFAULT_WARM_START_MAX_AGE = 0.5
+
+
+class PoseEngine(enum.Enum):
+    """A method of calculating the poses of markers."""
+
+    # OpenCV's iterative (Levenberg-Marquardt) solver
+    ITERATIVE = 'iterative'
+
+    # OpenCV's closed form solver for square markers, needing OpenCV 3.4.6+
+    IPPE_SQUARE = 'ippe_square'
+
+    # Decomposition of AprilTag's homography. This ignores lens distortion, so
+    # is less accurate towards the edges of the image.
+    HOMOGRAPHY = 'homography'
+
+    def is_supported(self) -> bool:
+        """Whether this engine can be used with the version of OpenCV in use."""
+        if self is PoseEngine.IPPE_SQUARE:
+            return cv3d.pnp_method_supported(cv3d.PNP_METHOD_IPPE_SQUARE)
+        return True
+
+
+def _rotation_matrices_to_vectors(rotations: np.ndarray) -> np.ndarray:
+    """
+    Convert (N, 3, 3) rotation matrices into (N, 3) Rodrigues vectors.
+
+    This matches OpenCV's Rodrigues function.
+    """
+    trace = np.trace(rotations, axis1=1, axis2=2)
+    angles = np.arccos(np.clip((trace - 1) / 2, -1, 1))
+
+    # Twice the sine of the angle times the axis of rotation
+    skew = np.stack([
+        rotations[:, 2, 1] - rotations[:, 1, 2],
+        rotations[:, 0, 2] - rotations[:, 2, 0],
+        rotations[:, 1, 0] - rotations[:, 0, 1],
+    ], axis=1)
+    sines = np.linalg.norm(skew, axis=1) / 2
+
+    vectors = np.empty_like(skew)
+    for index, (angle, sine) in enumerate(zip(angles, sines)):
+        if sine > 1e-5:
+            vectors[index] = skew[index] * (angle / (2 * sine))
+        elif angle < np.pi / 2:
+            # No rotation, to within rounding
+            vectors[index] = skew[index] / 2
+        else:
+            # A half turn, about the axis given by the symmetric part
+            rotation = rotations[index]
+            axis = np.sqrt(np.maximum((np.diag(rotation) + 1) / 2, 0))
+            largest = np.argmax(axis)
+            for other in range(3):
+                if other != largest and rotation[largest, other] < 0:
+                    axis[other] = -axis[other]
+            vectors[index] = axis * angle
+
+    return vectors
+
+
+def homography_poses(
+    homographies: np.ndarray,
+    marker_sizes: Sequence[Tuple[float, float]],
+    calibration: cv3d.CameraCalibration,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the poses of markers from their AprilTag homographies.
+
+    The homography maps AprilTag's marker coordinates, which span -1 to 1 in
+    each direction, to pixels. Once the camera matrix is removed what remains
+    is (up to scale) the first two columns of the marker's rotation and its
+    translation.
+
+    :param homographies: (N, 3, 3) array of the homography of each marker
+    :param marker_sizes: size of each marker
+    :param calibration: calibration of the camera
+    :return: (N, 3) arrays of the translation and orientation of each marker,
+             as `cv3d.solve_pnp_batch` returns them
+    """
+    homographies = np.asarray(homographies, dtype=np.float64).reshape(-1, 3, 3)
+    count = len(homographies)
+
+    # Map from the marker's corners as we describe them to `cv3d` (where the
+    # first corner, AprilTag's (-1, 1), is at (width / 2, height / 2)) to
+    # AprilTag's marker coordinates.
+    sizes = np.asarray(marker_sizes, dtype=np.float64).reshape(count, 2)
+    to_tag_coordinates = np.zeros((count, 3, 3))
+    to_tag_coordinates[:, 0, 1] = -2 / sizes[:, 1]
+    to_tag_coordinates[:, 1, 0] = 2 / sizes[:, 0]
+    to_tag_coordinates[:, 2, 2] = 1
+
+    camera_matrix_inverse = np.linalg.inv(calibration.camera_matrix)
+    transforms = np.matmul(
+        camera_matrix_inverse,
+        np.matmul(homographies, to_tag_coordinates),
+    )
+
+    # The homography is only known up to scale, which is fixed by the columns
+    # of the rotation being unit vectors and the marker being in front of the
+    # camera.
+    first_column_scales = np.linalg.norm(transforms[:, :, 0], axis=1)
+    second_column_scales = np.linalg.norm(transforms[:, :, 1], axis=1)
+    scales = (first_column_scales + second_column_scales) / 2
+    scales *= np.sign(transforms[:, 2, 2])
+    transforms /= scales[:, np.newaxis, np.newaxis]
+
+    translations = transforms[:, :, 2].copy()
+
+    # Complete the rotation, then find the nearest true rotation to it since
+    # the columns won't quite be orthogonal.
+    rotations = np.stack([
+        transforms[:, :, 0],
+        transforms[:, :, 1],
+        np.cross(transforms[:, :, 0], transforms[:, :, 1]),
+    ], axis=2)
+    u, _, vt = np.linalg.svd(rotations)
+    rotations = np.matmul(u, vt)
+
+    orientations = _rotation_matrices_to_vectors(rotations)
+
+    # OpenCV returns the 'y' coordinate positive downwards, yet we want
+    # positive meaning upwards
+    translations[:, 1] = -translations[:, 1]
+
+    return translations, orientations
+
+
+class PoseCache:
+    """
+    The most recent pose of each marker, for use as a guess at its next pose.
+
+    Poses are forgotten once their marker hasn't been seen for ``max_age``
+    seconds (as measured by ``clock``).
+    """
+
+    def __init__(
+        self,
+        max_age: float = DEFAULT_WARM_START_MAX_AGE,
+        *,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """Create an empty cache."""
+        if max_age <= 0:
+            raise ValueError("Maximum age must be positive (got {})".format(max_age))
+
+        self.max_age = max_age
+        self._clock = clock
+        # Marker id -> (time seen, translation, orientation)
+        self._poses = {}  # type: Dict[int, Tuple[float, np.ndarray, np.ndarray]]
+
+    def __len__(self) -> int:
+        """The number of markers with a cached pose."""
+        return len(self._poses)
+
+    def evict(self) -> None:
+        """Forget the poses of markers which haven't been seen recently."""
+        oldest = self._clock() - self.max_age
+        self._poses = {
+            marker_id: pose
+            for marker_id, pose in self._poses.items()
+            if pose[0] >= oldest
+        }
+
+    def guesses(self, marker_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the guesses at the poses of the given markers.
+
+        :return: (N, 3) arrays of the translation and orientation of each
+                 marker, with rows of NaN for markers without a guess
+        """
+        self.evict()
+
+        translations = np.full((len(marker_ids), 3), np.nan)
+        orientations = np.full((len(marker_ids), 3), np.nan)
+        for index, marker_id in enumerate(marker_ids):
+            pose = self._poses.get(marker_id)
+            if pose is not None:
+                _, translations[index], orientations[index] = pose
+        return translations, orientations
+
+    def update(
+        self,
+        marker_ids: Iterable[int],
+        translations: np.ndarray,
+        orientations: np.ndarray,
+    ) -> None:
+        """Record the latest poses of the given markers."""
+        now = self._clock()
+        for marker_id, translation, orientation in zip(
+            marker_ids,
+            translations,
+            orientations,
+        ):
+            self._poses[marker_id] = (now, translation.copy(), orientation.copy())
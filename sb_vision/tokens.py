@@ -1,29 +1,78 @@
 """Tokens detections, and the utilities to manipulate them."""
 
-from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+import functools
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import numpy as np
 
 from .coordinates import (
     Cartesian,
+    LegacyPolar,
+    Spherical,
     cartesian_to_legacy_polar,
     cartesian_to_spherical,
+    cartesians_to_legacy_polars,
+    cartesians_to_sphericals,
 )
+from .cv3d import CameraCalibration
 from .find_3D_coords import (
     PixelCoordinate,
-    calculate_transforms,
+    ResolutionFit,
+    calculate_transforms_batch,
     load_camera_calibrations,
 )
 from .game_specific import MARKER_SIZE_DEFAULT, MARKER_SIZES
+from .native.apriltag import DETECTION_DTYPE
+from .pose import PoseCache, PoseEngine
 
 if TYPE_CHECKING:
     # Interface-only definitions
     from .native.apriltag.types import ApriltagDetection  # noqa: F401
 
 
+def _detection_records(
+    apriltag_detections: Iterable['ApriltagDetection'],
+) -> np.ndarray:
+    """Copy April Tag detections into an array of detection records."""
+    return np.array([
+        (
+            x.id,
+            x.hamming,
+            x.goodness,
+            x.decision_margin,
+            tuple(x.c),
+            [tuple(corner) for corner in x.p],
+            [[x.H.data[row * 3 + column] for column in range(3)] for row in range(3)],
+        )
+        for x in apriltag_detections
+    ], dtype=DETECTION_DTYPE)
+
+
 class Token:
     """Representation of the detection of one token."""
 
+    __slots__ = (
+        'id',
+        'certainty',
+        'homography_matrix',
+        'pixel_corners',
+        'pixel_centre',
+        '_cartesian',
+        '_legacy_polar',
+        '_spherical',
+        '_pose_source',
+    )
+
     def __init__(self, id: int, certainty: float=0) -> None:
         """
         General initialiser.
@@ -34,49 +83,97 @@ class Token:
         self.id = id
         self.certainty = certainty
 
+        # The coordinates are only calculated when first used
+        self._cartesian = None  # type: Optional[Cartesian]
+        self._legacy_polar = None  # type: Optional[LegacyPolar]
+        self._spherical = None  # type: Optional[Spherical]
+        self._pose_source = None  # type: Optional[Callable[[], Cartesian]]
+
     @classmethod
     def from_apriltag_detection(
         cls,
         apriltag_detection: 'ApriltagDetection',
         image_size: Tuple[int, int],
         camera_model: Optional[str],
+        *,
+        pose_engine: PoseEngine = PoseEngine.ITERATIVE,
+        lazy: bool = False
     ) -> 'Token':
-        """Construct a Token from an April Tag detection."""
+        """
+        Construct a Token from an April Tag detection.
 
-        pixel_corners = [PixelCoordinate(*l) for l in apriltag_detection.p]
+        If ``lazy``, the position of the token is only calculated when first
+        used.
+        """
+        tokens = cls.from_apriltag_detections(
+            [apriltag_detection],
+            image_size,
+            camera_model,
+            pose_engine=pose_engine,
+            lazy=lazy,
+        )
+        return tokens[0]
 
-        marker_id = apriltag_detection.id
+    @classmethod
+    def from_apriltag_detections(
+        cls,
+        apriltag_detections: Iterable['ApriltagDetection'],
+        image_size: Tuple[int, int],
+        camera_model: Optional[str],
+        *,
+        pose_engine: PoseEngine = PoseEngine.ITERATIVE,
+        pose_cache: Optional[PoseCache] = None,
+        lazy: bool = False
+    ) -> List['Token']:
+        """
+        Construct Tokens from all the April Tag detections in an image.
 
-        instance = cls(
-            id=marker_id,
-            certainty=apriltag_detection.goodness,
-        )
-        arr = [apriltag_detection.H.data[x] for x in range(9)]
-        homography = np.reshape(arr, (3, 3))
+        The positions of the markers are calculated together, which is much
+        cheaper than doing so for each marker in turn, using the given
+        ``pose_engine``.
 
-        instance.update_pixel_coords(
-            pixel_corners=pixel_corners,
-            homography_matrix=homography,
-        )
+        If a ``pose_cache`` is given, the iterative solver starts from the
+        previous poses of the markers held there, and it is updated with
+        their new poses.
 
-        # We don't set coordinates in the absence of a camera model.
-        if camera_model:
-            camera_matrix, distance_coefficients = load_camera_calibrations(
-                camera_model,
-                image_size,
-            )
+        If ``lazy``, the position of each token is only calculated when first
+        used.
+        """
+        return cls.from_detection_records(
+            _detection_records(apriltag_detections),
+            image_size,
+            camera_model,
+            pose_engine=pose_engine,
+            pose_cache=pose_cache,
+            lazy=lazy,
+        )
 
-            translation, orientation = calculate_transforms(
-                MARKER_SIZES.get(marker_id, MARKER_SIZE_DEFAULT),
-                pixel_corners,
-                camera_matrix,
-                distance_coefficients,
-            )
+    @classmethod
+    def from_detection_records(
+        cls,
+        records: np.ndarray,
+        image_size: Tuple[int, int],
+        camera_model: Optional[str],
+        *,
+        pose_engine: PoseEngine = PoseEngine.ITERATIVE,
+        pose_cache: Optional[PoseCache] = None,
+        lazy: bool = False
+    ) -> List['Token']:
+        """
+        Construct Tokens from an array of April Tag detection records.
 
-            instance.update_3D_transforms(
-                translation=translation,
-            )
-        return instance
+        This is as `from_apriltag_detections`, for the records returned by
+        `AprilTagDetector.detect_records`.
+        """
+        token_set = TokenSet.from_detection_records(
+            records,
+            image_size,
+            camera_model,
+            pose_engine=pose_engine,
+            pose_cache=pose_cache,
+            lazy=lazy,
+        )
+        return list(token_set)
 
     # noinspection PyAttributeOutsideInit
     def update_pixel_coords(
@@ -98,22 +195,67 @@ class Token:
         # centre of marker: average the corners
         self.pixel_centre = PixelCoordinate(*np.average(pixel_corners, axis=0))
 
-    # noinspection PyAttributeOutsideInit
     def update_3D_transforms(
         self,
         *,
-        translation: Cartesian
+        translation: Cartesian,
+        spherical: Optional[Spherical] = None,
+        legacy_polar: Optional[LegacyPolar] = None
     ):
-        """Calculate 3D coordinate information from the given transformations."""
-        # Cartesian Co-ordinates in the 3D World, relative to the camera
-        # (as opposed to somehow being compass-aligned)
-        self.cartesian = translation
+        """
+        Set 3D coordinate information from the given transformations.
+
+        The ``spherical`` and ``legacy_polar`` coordinates, if not given, are
+        converted from the ``translation`` when first used.
+        """
+        self._cartesian = translation
+        self._legacy_polar = legacy_polar
+        self._spherical = spherical
+        self._pose_source = None
 
-        # Polar co-ordinates in the 3D world, relative to the camera
-        self.polar = cartesian_to_legacy_polar(self.cartesian)
-        self.legacy_polar = cartesian_to_legacy_polar(self.cartesian)
+    def defer_3D_transforms(self, pose_source: Callable[[], Cartesian]) -> None:
+        """
+        Set 3D coordinate information to be calculated when it's first used.
 
-        self.spherical = cartesian_to_spherical(self.cartesian)
+        ``pose_source`` is called (at most once) to get the translation.
+        """
+        self._cartesian = None
+        self._legacy_polar = None
+        self._spherical = None
+        self._pose_source = pose_source
+
+    @property
+    def cartesian(self) -> Cartesian:
+        """
+        Cartesian co-ordinates in the 3D world, relative to the camera.
+
+        (As opposed to somehow being compass-aligned.)
+        """
+        if self._cartesian is None:
+            if self._pose_source is None:
+                raise AttributeError("Token has no 3D coordinate information")
+            self._cartesian = self._pose_source()
+            self._pose_source = None
+        return self._cartesian
+
+    @property
+    def legacy_polar(self) -> LegacyPolar:
+        """Polar co-ordinates in the 3D world, relative to the camera."""
+        if self._legacy_polar is None:
+            self._legacy_polar = cartesian_to_legacy_polar(self.cartesian)
+        return self._legacy_polar
+
+    @property
+    def polar(self) -> LegacyPolar:
+        """Polar co-ordinates in the 3D world; an alias of `legacy_polar`."""
+        return self.legacy_polar
+
+    @property
+    def spherical(self) -> Spherical:
+        """Spherical co-ordinates in the 3D world, relative to the camera."""
+        if self._spherical is None:
+            self._spherical = cartesian_to_spherical(self.cartesian)
+        return self._spherical
 
     def __repr__(self) -> str:
         """General debug representation."""
@@ -127,3 +269,274 @@ class Token:
             return False
 
         return self.id == other.id
+
+
+# What's needed to calculate the poses of the markers in a `TokenSet`
+_PoseRequest = NamedTuple('_PoseRequest', (
+    ('calibration', CameraCalibration),
+    ('marker_sizes', List[Tuple[float, float]]),
+    # In the order AprilTag gives them
+    ('corners', np.ndarray),
+    ('homographies', np.ndarray),
+    ('pose_engine', PoseEngine),
+    ('pose_cache', Optional[PoseCache]),
+))
+
+
+class TokenSet(Sequence[Token]):
+    """
+    The detections of all the tokens in one image.
+
+    The properties of the tokens are held as columns of arrays, indexed by the
+    position of the token in the set. Indexing the set gives `Token` instances
+    built from those columns, which are only created as they are needed.
+
+    The poses of the tokens may also be calculated lazily, as each token's
+    position is first used (or for all the tokens at once, when the
+    `translations` or `orientations` are used).
+    """
+
+    __slots__ = (
+        'ids',
+        'certainties',
+        'corners',
+        'centres',
+        'homographies',
+        '_translations',
+        '_orientations',
+        '_sphericals',
+        '_legacy_polars',
+        '_solved',
+        '_pose_request',
+        '_tokens',
+    )
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        certainties: np.ndarray,
+        corners: np.ndarray,
+        homographies: np.ndarray,
+        translations: Optional[np.ndarray] = None,
+        orientations: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Create a set of tokens from the given columns.
+
+        :param ids: (N,) array of the ids of the markers
+        :param certainties: (N,) array of the certainties of the detections
+        :param corners: (N, 4, 2) array of the pixel corners of each marker,
+                        in the order of `Token.pixel_corners`
+        :param homographies: (N, 3, 3) array of the homography of each marker
+        :param translations: (N, 3) array of the cartesian position of each
+                             marker, if known
+        :param orientations: (N, 3) array of the orientation (as a rotation
+                             vector) of each marker, if known
+        """
+        self.ids = ids
+        self.certainties = certainties
+        self.corners = corners
+        self.centres = corners.mean(axis=1)
+        self.homographies = homographies
+
+        self._translations = translations
+        self._orientations = orientations
+        self._sphericals = None  # type: Optional[np.ndarray]
+        self._legacy_polars = None  # type: Optional[np.ndarray]
+        self._solved = np.full(len(ids), translations is not None)
+        self._pose_request = None  # type: Optional[_PoseRequest]
+
+        self._tokens = [None] * len(ids)  # type: List[Optional[Token]]
+
+    @classmethod
+    def from_detection_records(
+        cls,
+        records: np.ndarray,
+        image_size: Tuple[int, int],
+        camera_model: Optional[str],
+        *,
+        resolution_fit: ResolutionFit = ResolutionFit.SCALE,
+        pose_engine: PoseEngine = PoseEngine.ITERATIVE,
+        pose_cache: Optional[PoseCache] = None,
+        lazy: bool = False
+    ) -> 'TokenSet':
+        """
+        Construct the set of tokens from an array of April Tag detection records.
+
+        The positions of the markers are calculated using the given
+        ``pose_engine``, but only if there's a ``camera_model``. If ``lazy``,
+        this is deferred until the positions are used. The model's calibration
+        is fitted to the ``image_size`` as described by ``resolution_fit``.
+
+        If a ``pose_cache`` is given, the iterative solver starts from the
+        previous poses of the markers held there, and it is updated with their
+        new poses.
+        """
+        # The pixel corners we expose are in clockwise order starting with the
+        # bottom left corner of the marker (if it weren't rotated). AprilTags
+        # gives the top left first, so shift the ordering along by one.
+        corners = records['corners'][:, [3, 0, 1, 2]]
+
+        token_set = cls(
+            ids=records['id'],
+            certainties=records['goodness'],
+            corners=corners,
+            homographies=records['homography'],
+        )
+
+        # We don't set coordinates in the absence of a camera model.
+        if camera_model:
+            token_set._pose_request = _PoseRequest(
+                calibration=load_camera_calibrations(
+                    camera_model,
+                    image_size,
+                    resolution_fit,
+                ),
+                marker_sizes=[
+                    MARKER_SIZES.get(x, MARKER_SIZE_DEFAULT)
+                    for x in records['id'].tolist()
+                ],
+                corners=records['corners'],
+                homographies=records['homography'],
+                pose_engine=pose_engine,
+                pose_cache=pose_cache,
+            )
+
+            count = len(records)
+            token_set._translations = np.full((count, 3), np.nan)
+            token_set._orientations = np.full((count, 3), np.nan)
+
+            if not lazy:
+                token_set._solve(np.arange(count))
+
+        return token_set
+
+    def _solve(self, indices: np.ndarray) -> None:
+        """Calculate the poses of the given tokens, if not already known."""
+        request = self._pose_request
+        if request is None or self._translations is None or self._orientations is None:
+            return
+
+        indices = indices[~self._solved[indices]]
+        if not len(indices):
+            return
+
+        marker_ids = self.ids[indices].tolist()
+
+        initial_poses = None
+        if request.pose_cache is not None:
+            initial_poses = request.pose_cache.guesses(marker_ids)
+
+        translations, orientations = calculate_transforms_batch(
+            [request.marker_sizes[x] for x in indices.tolist()],
+            request.corners[indices],
+            request.calibration,
+            pose_engine=request.pose_engine,
+            homographies=request.homographies[indices],
+            initial_poses=initial_poses,
+        )
+
+        if request.pose_cache is not None:
+            request.pose_cache.update(marker_ids, translations, orientations)
+
+        self._translations[indices] = translations
+        self._orientations[indices] = orientations
+        self._solved[indices] = True
+
+        self._sphericals = None
+        self._legacy_polars = None
+
+    @property
+    def translations(self) -> Optional[np.ndarray]:
+        """(N, 3) array of the cartesian position of each marker, if known."""
+        self._solve(np.arange(len(self)))
+        return self._translations
+
+    @property
+    def orientations(self) -> Optional[np.ndarray]:
+        """(N, 3) array of the orientation of each marker, if known."""
+        self._solve(np.arange(len(self)))
+        return self._orientations
+
+    def _conversions(self, translations: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the spherical and legacy polar forms of the solved translations."""
+        if self._sphericals is None or self._legacy_polars is None:
+            self._sphericals = cartesians_to_sphericals(translations)
+            self._legacy_polars = cartesians_to_legacy_polars(translations)
+        return self._sphericals, self._legacy_polars
+
+    @property
+    def sphericals(self) -> Optional[np.ndarray]:
+        """(N, 3) array of the spherical position of each marker, if known."""
+        translations = self.translations
+        if translations is None:
+            return None
+        sphericals, _ = self._conversions(translations)
+        return sphericals
+
+    @property
+    def legacy_polars(self) -> Optional[np.ndarray]:
+        """(N, 3) array of the legacy polar position of each marker, if known."""
+        translations = self.translations
+        if translations is None:
+            return None
+        _, legacy_polars = self._conversions(translations)
+        return legacy_polars
+
+    def __len__(self) -> int:
+        """The number of tokens in the set."""
+        return len(self._tokens)
+
+    def __getitem__(self, index: Any) -> Any:
+        """Get the `Token` (or, for a slice, list of tokens) at the index."""
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self)))]
+
+        token = self._tokens[index]
+        if token is None:
+            token = self._tokens[index] = self._token(index)
+        return token
+
+    def _token(self, index: int) -> Token:
+        token = Token(
+            id=int(self.ids[index]),
+            certainty=float(self.certainties[index]),
+        )
+
+        token.homography_matrix = self.homographies[index]
+        token.pixel_corners = [
+            PixelCoordinate(*x) for x in self.corners[index].tolist()
+        ]
+        token.pixel_centre = PixelCoordinate(*self.centres[index].tolist())
+
+        translations = self._translations
+        if translations is not None:
+            if self._solved.all():
+                # Convert the coordinates of the whole set at once, rather
+                # than each token converting its own.
+                sphericals, legacy_polars = self._conversions(translations)
+                token.update_3D_transforms(
+                    translation=Cartesian(*translations[index].tolist()),
+                    spherical=Spherical(*sphericals[index].tolist()),
+                    legacy_polar=LegacyPolar(*legacy_polars[index].tolist()),
+                )
+            else:
+                token.defer_3D_transforms(
+                    functools.partial(self._token_translation, index),
+                )
+
+        return token
+
+    def _token_translation(self, index: int) -> Cartesian:
+        self._solve(np.array([index]))
+        translations = self._translations
+        if translations is None:
+            # Tokens only defer their positions when there are some to solve
+            raise RuntimeError("Token set has no translations")
+        return Cartesian(*translations[index].tolist())
+
+    def __repr__(self) -> str:
+        """General debug representation."""
+        return "TokenSet: ids {}".format(self.ids.tolist())
+
+    __str__ = __repr__
@@ -0,0 +1,175 @@
+"""
+Tracking of markers between frames, to limit where we search for them.
+
+When the same markers are in view for many frames, searching the whole of every
+frame is wasteful. Instead we can search only the regions around where markers
+were last seen, with a periodic search of the whole frame to pick up markers
+which have come into view.
+"""
+
+import collections
+from typing import (  # noqa: F401
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .coordinates import PixelCoordinate
+
+# A rectangular region of an image, as (left, top, right, bottom) pixels; the
+# right and bottom edges are exclusive.
+Region = Tuple[int, int, int, int]
+
+# How many frames to search using only the tracked regions before searching
+# the whole frame again.
+DEFAULT_FULL_SEARCH_INTERVAL = 10
+
+# How much to grow the region around a marker by, as a fraction of the
+# marker's size, to allow for movement between frames.
+DEFAULT_PADDING = 0.5
+
+# The smallest amount to grow the region around a marker by, in pixels.
+MIN_PADDING = 16
+
+
+def _bounding_box(corners: Sequence[PixelCoordinate]) -> Tuple[float, ...]:
+    xs = [x for x, _ in corners]
+    ys = [y for _, y in corners]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _overlaps(a: Region, b: Region) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _merge_overlapping(regions: Iterable[Region]) -> List[Region]:
+    """
+    Combine overlapping regions into their bounding boxes.
+
+    This ensures that no part of the image is searched twice, which would
+    otherwise result in duplicate detections.
+    """
+    merged = []  # type: List[Region]
+    for region in regions:
+        # Merging two regions can make the result overlap a region which
+        # neither part did, so keep going until nothing overlaps.
+        while True:
+            overlapping = [x for x in merged if _overlaps(x, region)]
+            if not overlapping:
+                break
+            for other in overlapping:
+                merged.remove(other)
+                region = (
+                    min(region[0], other[0]),
+                    min(region[1], other[1]),
+                    max(region[2], other[2]),
+                    max(region[3], other[3]),
+                )
+        merged.append(region)
+    return merged
+
+
+class RegionTracker:
+    """
+    Decide which regions of each frame to search for markers.
+
+    After each frame, `update` is told the markers seen. The next frame then
+    searches only padded regions around those markers, unless a full search is
+    due: every ``full_search_interval`` frames, when nothing is being tracked,
+    or when a tracked marker was not found.
+    """
+
+    def __init__(
+        self,
+        *,
+        full_search_interval: int = DEFAULT_FULL_SEARCH_INTERVAL,
+        padding: float = DEFAULT_PADDING
+    ) -> None:
+        """Create a tracker which is not yet tracking anything."""
+        if full_search_interval < 1:
+            raise ValueError(
+                "Full search interval must be at least 1 (got {})".format(
+                    full_search_interval,
+                ),
+            )
+
+        self.full_search_interval = full_search_interval
+        self.padding = padding
+
+        # The id and bounding box of each marker seen; the same marker may be
+        # in view more than once
+        self._boxes = []  # type: List[Tuple[int, Tuple[float, ...]]]
+        # The size of the frame the boxes were found in, if known
+        self._image_size = None  # type: Optional[Tuple[int, int]]
+        self._frames_since_full_search = 0
+        self._lost_marker = False
+
+    def regions(self, image_size: Tuple[int, int]) -> Optional[List[Region]]:
+        """
+        Get the regions of the next frame to search.
+
+        :return: list of regions, or ``None`` if the whole frame should be
+                 searched
+        """
+        if not self._boxes or self._lost_marker:
+            return None
+
+        if self._image_size is not None and image_size != self._image_size:
+            # The markers won't be in the same place in a frame of another size
+            return None
+
+        if self._frames_since_full_search + 1 >= self.full_search_interval:
+            return None
+
+        width, height = image_size
+        regions = []
+        for _, (left, top, right, bottom) in self._boxes:
+            padding = max(
+                MIN_PADDING,
+                self.padding * max(right - left, bottom - top),
+            )
+            regions.append((
+                max(0, int(left - padding)),
+                max(0, int(top - padding)),
+                min(width, int(right + padding) + 1),
+                min(height, int(bottom + padding) + 1),
+            ))
+
+        return _merge_overlapping(regions)
+
+    def update(
+        self,
+        markers: Iterable[Tuple[int, Sequence[PixelCoordinate]]],
+        *,
+        full_search: bool,
+        image_size: Optional[Tuple[int, int]] = None
+    ) -> None:
+        """
+        Record the markers seen in a frame.
+
+        :param markers: (id, pixel corners) pairs for the markers seen
+        :param full_search: whether the whole frame was searched
+        :param image_size: the size of the frame, if the frames searched may
+                           change size
+        """
+        boxes = [
+            (marker_id, _bounding_box(corners))
+            for marker_id, corners in markers
+        ]
+
+        if full_search:
+            self._frames_since_full_search = 0
+            self._lost_marker = False
+        else:
+            self._frames_since_full_search += 1
+            # Counted, so that losing one of several copies of a marker is
+            # noticed
+            tracked = collections.Counter(x for x, _ in self._boxes)
+            seen = collections.Counter(x for x, _ in boxes)
+            self._lost_marker = bool(tracked - seen)
+
+        self._boxes = boxes
+        self._image_size = image_size
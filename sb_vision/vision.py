@@ -1,23 +1,105 @@
 """Main vision driver."""
 
-from typing import List, Optional  # noqa: F401
+import time
+from typing import Dict, Iterable, List, Optional, Tuple  # noqa: F401
 
+import numpy as np
 from PIL import Image
 
+from .adaptive import AdaptiveDetectorController, marker_pixel_size
 from .camera_base import CameraBase
-from .native.apriltag import AprilTagDetector
-from .tokens import Token
+from .frames import Frame
+from .native.apriltag import (
+    DEFAULT_BITS_CORRECTED,
+    DEFAULT_QUAD_SETTINGS,
+    AprilTagDetector,
+    QuadSettings,
+    shared_detector,
+)
+from .pipeline import DEFAULT_DEPTH, VisionStream
+from .pose import DEFAULT_WARM_START_MAX_AGE, PoseCache, PoseEngine
+from .tokens import Token, TokenSet
+from .tracking import DEFAULT_FULL_SEARCH_INTERVAL, Region, RegionTracker
 
 
 class Vision:
     """Class that handles the vision library and the camera."""
 
-    def __init__(self, camera: CameraBase) -> None:
-        """General initialiser."""
+    def __init__(
+        self,
+        camera: CameraBase,
+        *,
+        nthreads: int = 1,
+        bits_corrected: int = DEFAULT_BITS_CORRECTED,
+        latency_budget: Optional[float] = None,
+        tracking: bool = False,
+        full_search_interval: int = DEFAULT_FULL_SEARCH_INTERVAL,
+        pose_engine: PoseEngine = PoseEngine.ITERATIVE,
+        warm_start: bool = False,
+        warm_start_max_age: float = DEFAULT_WARM_START_MAX_AGE,
+        lazy_pose: bool = False
+    ) -> None:
+        """
+        General initialiser.
+
+        ``nthreads`` is the number of threads to use for marker detection.
+        ``bits_corrected`` is the most bits in error which markers are decoded
+        with; fewer bits start up faster and use less memory (see
+        `AprilTagDetector`).
+
+        If a ``latency_budget`` (in seconds) is given, the detector is tuned
+        between frames to try to process each frame within that time, by
+        detecting large markers in a reduced resolution image. Frames of each
+        size the camera captures are tuned for separately.
+
+        With ``tracking`` enabled, frames are only searched around the markers
+        seen in the previous frame. The whole frame is still searched every
+        ``full_search_interval`` frames, and whenever a tracked marker is lost.
+
+        ``pose_engine`` chooses how the positions of markers are calculated.
+        With ``warm_start`` enabled, the iterative engine starts from each
+        marker's previous pose, provided it was seen in the last
+        ``warm_start_max_age`` seconds.
+
+        With ``lazy_pose`` enabled, the position of each token is only
+        calculated when it is first used.
+        """
+        if not pose_engine.is_supported():
+            raise ValueError(
+                "Pose engine {} is not supported by this version of "
+                "OpenCV".format(pose_engine.value),
+            )
+
         self._camera = camera
         self._camera_ready = False
+        self._nthreads = nthreads
+        self._bits_corrected = bits_corrected
+        self._pose_engine = pose_engine
+        self._lazy_pose = lazy_pose
 
-        self._detector = None  # type: Optional[AprilTagDetector]
+        self._pose_cache = None  # type: Optional[PoseCache]
+        if warm_start and pose_engine is PoseEngine.ITERATIVE:
+            self._pose_cache = PoseCache(warm_start_max_age)
+
+        if latency_budget is not None and latency_budget <= 0:
+            raise ValueError(
+                "Latency budget must be positive (got {})".format(latency_budget),
+            )
+        self._latency_budget = latency_budget
+        # Detector controllers by image size, since cameras which adapt their
+        # resolution produce frames which take different times to process and
+        # show markers at other sizes
+        self._controllers = {}  # type: Dict[Tuple[int, int], AdaptiveDetectorController]
+
+        self._region_tracker = None  # type: Optional[RegionTracker]
+        if tracking:
+            self._region_tracker = RegionTracker(
+                full_search_interval=full_search_interval,
+            )
+
+        # Our own settings for the (shared) detector, as tuned by the
+        # controller for the latest frame
+        self._quad_settings = DEFAULT_QUAD_SETTINGS
 
     @property
     def camera(self) -> CameraBase:
@@ -35,12 +117,41 @@ class Vision:
 
     @property
     def apriltag_detector(self) -> AprilTagDetector:
-        """Lazy property wrapping our instance of the apriltag detector."""
-        if self._detector is None:
-            size = self.camera.get_image_size()
-            self._detector = AprilTagDetector(size)
+        """
+        The apriltag detector in use.
+
+        This is borrowed from the process-wide registry, so is shared with
+        other `Vision` instances (and must not be closed or reconfigured).
+        """
+        return shared_detector(
+            nthreads=self._nthreads,
+            bits_corrected=self._bits_corrected,
+        )
+
+    @property
+    def quad_settings(self) -> QuadSettings:
+        """The settings for the quad detection stage of the next frame."""
+        return self._quad_settings
 
-        return self._detector
+    def _detector_controller(
+        self,
+        image_size: Tuple[int, int],
+    ) -> Optional[AdaptiveDetectorController]:
+        """Get the controller for frames of the given size, if there's a budget."""
+        if self._latency_budget is None:
+            return None
+
+        controller = self._controllers.get(image_size)
+        if controller is None:
+            controller = AdaptiveDetectorController(self._latency_budget)
+            self._controllers[image_size] = controller
+        return controller
+
+    def _quad_settings_for(self, image_size: Tuple[int, int]) -> QuadSettings:
+        controller = self._detector_controller(image_size)
+        if controller is None:
+            return DEFAULT_QUAD_SETTINGS
+        return controller.settings
 
     def capture_image(self) -> Image.Image:
         """
@@ -51,27 +162,239 @@ class Vision:
         # get the PIL image from the camera
         return self.camera.capture_image()
 
-    def process_image(self, img: Image.Image) -> List[Token]:
+    def process_image(
+        self,
+        img: Image.Image,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> List[Token]:
         """
         Run the given image through the apriltags detection library.
 
         :param img: PIL Luminosity image to be processed
+        :param marker_ids: if given, only markers with these ids (for example
+                           `game_specific.TOKEN`) are reported; others are
+                           dropped before their positions are calculated
         :return: python list of Token objects.
         """
+        return self.process_frame(Frame.from_image(img), marker_ids=marker_ids)
+
+    def process_frame(
+        self,
+        frame: Frame,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> List[Token]:
+        """
+        Run the given frame through the apriltags detection library.
 
-        camera_model = self.camera.camera_model
+        The frame's memory is read directly, without being copied.
 
-        tokens = [
-            Token.from_apriltag_detection(x, img.size, camera_model)
-            for x in self.apriltag_detector.detect_tags(img)
-        ]
+        :param frame: Frame to be processed
+        :param marker_ids: if given, only markers with these ids are reported
+        :return: python list of Token objects.
+        """
+        return list(self.process_frame_to_token_set(frame, marker_ids=marker_ids))
+
+    def process_frame_to_token_set(
+        self,
+        frame: Frame,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> TokenSet:
+        """
+        Run the given frame through the apriltags detection library.
 
-        return tokens
+        As `process_frame`, though the tokens are returned as a `TokenSet`, so
+        individual `Token` instances are only created if they're used.
 
-    def snapshot(self) -> List[Token]:
+        :param frame: Frame to be processed
+        :param marker_ids: if given, only markers with these ids are reported
+        :return: the set of tokens seen
+        """
+
+        start = time.perf_counter()
+
+        records, regions = self.detect_records(frame, marker_ids=marker_ids)
+        token_set = self.token_set_from_records(records, frame.size)
+
+        self.update_detector(
+            records,
+            image_size=frame.size,
+            full_search=regions is None,
+            duration=time.perf_counter() - start,
+        )
+
+        return token_set
+
+    def detect_records(
+        self,
+        frame: Frame,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> Tuple[np.ndarray, Optional[List[Region]]]:
+        """
+        Detect the markers in the given frame.
+
+        This is the first part of `process_frame_to_token_set`, for callers
+        (such as `VisionStream`) which detect markers separately from
+        calculating their positions. Once done, the detections should be
+        passed to `update_detector`.
+
+        :param frame: Frame to be processed
+        :param marker_ids: if given, only markers with these ids are reported
+        :return: the detection records of the markers, and the regions of the
+                 frame searched (or None if the whole frame was)
+        """
+        detector = self.apriltag_detector
+        quad_settings = self._quad_settings_for(frame.size)
+
+        regions = None
+        if self._region_tracker is not None:
+            regions = self._region_tracker.regions(frame.size)
+
+        if regions is None:
+            records = detector.detect_records(
+                frame.array,
+                frame.size,
+                quad_settings=quad_settings,
+            )
+        else:
+            # Search views of just the regions, reporting what's found in the
+            # coordinates of the whole frame.
+            records = np.concatenate([
+                detector.detect_records(
+                    frame.array[top:bottom, left:right],
+                    offset=(left, top),
+                    quad_settings=quad_settings,
+                )
+                for left, top, right, bottom in regions
+            ])
+
+        if marker_ids is not None:
+            wanted = frozenset(marker_ids)
+            records = records[np.array(
+                [x in wanted for x in records['id'].tolist()],
+                dtype=bool,
+            )]
+
+        return records, regions
+
+    def token_set_from_records(
+        self,
+        records: np.ndarray,
+        image_size: Tuple[int, int],
+        *,
+        lazy: Optional[bool] = None
+    ) -> TokenSet:
+        """
+        Build the set of tokens from the records of a frame's detections.
+
+        :param records: detection records, as from `detect_records`
+        :param image_size: the size of the frame the markers were found in
+        :param lazy: whether to defer calculating the positions of the markers
+                     until they're used, default: as this instance was created
+        """
+        if lazy is None:
+            lazy = self._lazy_pose
+        return TokenSet.from_detection_records(
+            records,
+            image_size,
+            self.camera.camera_model,
+            resolution_fit=self.camera.resolution_fit,
+            pose_engine=self._pose_engine,
+            pose_cache=self._pose_cache,
+            lazy=lazy,
+        )
+
+    def update_detector(
+        self,
+        records: np.ndarray,
+        *,
+        image_size: Tuple[int, int],
+        full_search: bool,
+        duration: float
+    ) -> None:
+        """
+        Tell the tracker, detector controller and camera about a processed frame.
+
+        :param records: detection records, as from `detect_records`
+        :param image_size: the size of the frame the markers were found in
+        :param full_search: whether the whole frame was searched, rather than
+                            only the regions `detect_records` gave
+        :param duration: how long, in seconds, processing the frame took
+        """
+        # In the order of `Token.pixel_corners`
+        corners = records['corners'][:, [3, 0, 1, 2]].tolist()
+        marker_sizes = [marker_pixel_size(x) for x in corners]
+
+        if self._region_tracker is not None:
+            self._region_tracker.update(
+                zip(records['id'].tolist(), corners),
+                full_search=full_search,
+                image_size=image_size,
+            )
+
+        controller = self._detector_controller(image_size)
+        if controller is not None:
+            self._quad_settings = controller.update(duration, marker_sizes)
+
+        self.camera.update_resolution(image_size, (x ** 2 for x in marker_sizes))
+
+    def snapshot(
+        self,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> List[Token]:
         """
         Get a single list of tokens from one camera snapshot.
 
-        Equivalent to calling `process_image` on the result of `capture_image`.
+        Equivalent to calling `process_image` on the result of `capture_image`,
+        though the captured image is processed without being copied.
+
+        :param marker_ids: if given, only markers with these ids are reported
+        """
+        return list(self.snapshot_token_set(marker_ids=marker_ids))
+
+    def snapshot_token_set(
+        self,
+        *,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> TokenSet:
+        """
+        Get the set of tokens seen in one camera snapshot.
+
+        :param marker_ids: if given, only markers with these ids are reported
+        """
+        with self.camera.capture_frame() as frame:
+            return self.process_frame_to_token_set(frame, marker_ids=marker_ids)
+
+    def stream(
+        self,
+        *,
+        depth: int = DEFAULT_DEPTH,
+        drop_oldest: bool = True,
+        marker_ids: Optional[Iterable[int]] = None
+    ) -> VisionStream:
+        """
+        Stream the tokens seen in successive camera snapshots.
+
+        Capture, detection and the calculation of positions run concurrently,
+        on successive frames, as described by `VisionStream`. The stream should
+        be used as a context manager::
+
+            with vision.stream() as stream:
+                for metadata, tokens in stream:
+                    ...
+
+        :param depth: how many items to queue between each stage
+        :param drop_oldest: whether to drop the oldest queued frames when a
+                            stage falls behind, rather than waiting for it
+        :param marker_ids: if given, only markers with these ids are reported
         """
-        return self.process_image(self.capture_image())
+        return VisionStream(
+            self,
+            depth=depth,
+            drop_oldest=drop_oldest,
+            marker_ids=marker_ids,
+        )
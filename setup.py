@@ -22,6 +22,7 @@ setup(
     cffi_modules=[
         'sb_vision/native/cvcapture_build.py:ffibuilder',
         'sb_vision/native/cv3d_build.py:ffibuilder',
+        'sb_vision/native/v4l2capture_build.py:ffibuilder',
         'sb_vision/native/apriltag/apriltag_build.py:ffi',
     ],
     install_requires=[
@@ -0,0 +1,261 @@
+"""Tests for adaptive configuration of the detector."""
+
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from sb_vision import Camera, FileCamera, ResolutionFit, Token, Vision
+from sb_vision.adaptive import (
+    DEFAULT_LEVELS,
+    FRAMES_BEFORE_FULL_RESOLUTION,
+    FRAMES_BEFORE_REDUCTION,
+    MIN_MARKER_AREA,
+    AdaptiveDetectorController,
+    AdaptiveResolutionController,
+    marker_pixel_size,
+)
+from sb_vision.camera_base import CameraBase
+from sb_vision.find_3D_coords import ResolutionMismatchError
+from sb_vision.frames import Frame
+from sb_vision.native.apriltag import DEFAULT_QUAD_SETTINGS
+
+TEST_DATA = Path(__file__).parent / 'test_data'
+
+BUDGET = 0.05
+OVER_BUDGET = BUDGET * 2
+UNDER_BUDGET = BUDGET / 2
+
+LARGE_MARKER = 500
+SMALL_MARKER = 30
+
+FULL_RESOLUTION = (1280, 720)
+HALF_RESOLUTION = (640, 360)
+RESOLUTIONS = (FULL_RESOLUTION, HALF_RESOLUTION)
+
+# Areas at full resolution, which at half resolution are a quarter the size
+LARGE_AREA = MIN_MARKER_AREA * 20
+MARGINAL_AREA = MIN_MARKER_AREA * 6
+
+
+class ScalingFileCamera(CameraBase):
+    """Camera which captures an image from a file at adaptive resolutions."""
+
+    def __init__(self, image_file):
+        """Capture the image in ``image_file``, which is at the full resolution."""
+        super().__init__(camera_model=None)
+        self.image = Image.open(str(image_file)).convert('L')
+        width, height = self.image.size
+        self.resolution_controller = AdaptiveResolutionController(
+            [(width, height), (width // 2, height // 2)],
+            frames_before_reduction=2,
+        )
+
+    def get_image_size(self):
+        """Get the size of images captured by the camera."""
+        return self.resolution_controller.resolution
+
+    def capture_image(self):
+        """Capture the image, at the current resolution."""
+        return self.image.resize(self.get_image_size(), Image.BILINEAR)  # type: ignore
+
+    def capture_frame(self):
+        """Capture the image into a frame, at the current resolution."""
+        return Frame.from_image(self.capture_image())
+
+    def update_resolution(self, image_size, marker_areas):
+        """Choose the resolution of later frames, given the markers seen."""
+        self.resolution_controller.update(image_size, marker_areas)
+
+
+def test_marker_pixel_size():
+    """Ensure that marker sizes are the side length of an equivalent square."""
+    corners = [(10, 10), (10, 30), (30, 30), (30, 10)]
+    assert marker_pixel_size(corners) == pytest.approx(20)
+
+
+def test_starts_at_full_resolution():
+    """Ensure that we don't start out by missing anything."""
+    controller = AdaptiveDetectorController(BUDGET)
+    assert controller.settings == DEFAULT_LEVELS[0]
+
+
+def test_stays_put_within_budget():
+    """Ensure that settings don't change while within budget."""
+    controller = AdaptiveDetectorController(BUDGET)
+
+    for _ in range(5):
+        settings = controller.update(UNDER_BUDGET, [LARGE_MARKER])
+
+    assert settings == DEFAULT_LEVELS[0]
+
+
+def test_decimates_large_markers_when_over_budget():
+    """Ensure that large markers are detected more cheaply when needed."""
+    controller = AdaptiveDetectorController(BUDGET)
+
+    for _ in range(10):
+        controller.update(OVER_BUDGET, [LARGE_MARKER])
+
+    assert controller.settings == DEFAULT_LEVELS[-1]
+
+
+def test_does_not_decimate_small_markers():
+    """Ensure that we don't lose small markers to meet the budget."""
+    controller = AdaptiveDetectorController(BUDGET)
+
+    for _ in range(10):
+        settings = controller.update(OVER_BUDGET, [LARGE_MARKER, SMALL_MARKER])
+
+    assert settings.quad_decimate == 1
+
+
+def test_returns_to_full_resolution_when_markers_shrink():
+    """Ensure that markers becoming small means a move to higher resolution."""
+    controller = AdaptiveDetectorController(BUDGET)
+
+    for _ in range(10):
+        controller.update(OVER_BUDGET, [LARGE_MARKER])
+
+    settings = controller.update(OVER_BUDGET, [SMALL_MARKER])
+
+    assert settings.quad_decimate == 1
+
+
+def test_returns_to_full_resolution_when_markers_lost():
+    """Ensure that not seeing anything means searching at full resolution."""
+    controller = AdaptiveDetectorController(BUDGET)
+
+    for _ in range(10):
+        controller.update(OVER_BUDGET, [LARGE_MARKER])
+
+    for _ in range(5):
+        settings = controller.update(UNDER_BUDGET, [])
+
+    assert settings == DEFAULT_LEVELS[0]
+
+
+def test_vision_detects_within_tiny_budget():
+    """Ensure that markers are still found when the detector is decimating."""
+    camera = FileCamera(TEST_DATA / 'Photo 1.jpg', camera_model=None)
+    vision = Vision(camera, latency_budget=1e-6)
+
+    for _ in range(5):
+        assert vision.snapshot() == [Token(id=9)]
+
+    assert vision.quad_settings.quad_decimate > 1
+    # The shared detector itself is left alone
+    assert vision.apriltag_detector.quad_settings == DEFAULT_QUAD_SETTINGS
+
+
+def test_resolution_starts_at_full():
+    """Ensure that capture starts out not missing anything."""
+    controller = AdaptiveResolutionController(RESOLUTIONS)
+    assert controller.resolution == FULL_RESOLUTION
+
+
+def test_resolution_reduced_once_stable():
+    """Ensure that large markers only mean a lower resolution after a while."""
+    controller = AdaptiveResolutionController(RESOLUTIONS)
+
+    for _ in range(FRAMES_BEFORE_REDUCTION - 1):
+        assert controller.update(FULL_RESOLUTION, [LARGE_AREA]) == FULL_RESOLUTION
+
+    assert controller.update(FULL_RESOLUTION, [LARGE_AREA]) == HALF_RESOLUTION
+
+
+def test_resolution_not_reduced_without_margin():
+    """Ensure that markers close to the threshold don't reduce the resolution."""
+    controller = AdaptiveResolutionController(RESOLUTIONS)
+
+    for _ in range(FRAMES_BEFORE_REDUCTION * 2):
+        resolution = controller.update(FULL_RESOLUTION, [LARGE_AREA, MARGINAL_AREA])
+
+    assert resolution == FULL_RESOLUTION
+
+
+def test_resolution_does_not_flap():
+    """Ensure that markers near the threshold keep the reduced resolution."""
+    controller = AdaptiveResolutionController(RESOLUTIONS)
+
+    for _ in range(FRAMES_BEFORE_REDUCTION):
+        controller.update(FULL_RESOLUTION, [LARGE_AREA])
+
+    for _ in range(FRAMES_BEFORE_REDUCTION * 2):
+        resolution = controller.update(HALF_RESOLUTION, [MARGINAL_AREA / 4])
+
+    assert resolution == HALF_RESOLUTION
+
+
+def test_resolution_restored_when_markers_shrink():
+    """Ensure that small markers mean returning to full resolution at once."""
+    controller = AdaptiveResolutionController(RESOLUTIONS)
+
+    for _ in range(FRAMES_BEFORE_REDUCTION):
+        controller.update(FULL_RESOLUTION, [LARGE_AREA])
+
+    small_area = MIN_MARKER_AREA / 2
+    assert controller.update(HALF_RESOLUTION, [small_area]) == FULL_RESOLUTION
+
+
+def test_resolution_restored_when_markers_lost():
+    """Ensure that not seeing anything for a while means full resolution."""
+    controller = AdaptiveResolutionController(RESOLUTIONS)
+
+    for _ in range(FRAMES_BEFORE_REDUCTION):
+        controller.update(FULL_RESOLUTION, [LARGE_AREA])
+
+    for _ in range(FRAMES_BEFORE_FULL_RESOLUTION - 1):
+        assert controller.update(HALF_RESOLUTION, []) == HALF_RESOLUTION
+
+    assert controller.update(HALF_RESOLUTION, []) == FULL_RESOLUTION
+
+
+def test_resolutions_must_be_ordered():
+    """Ensure that the full resolution comes first."""
+    with pytest.raises(ValueError):
+        AdaptiveResolutionController(tuple(reversed(RESOLUTIONS)))
+
+
+def test_camera_accepts_calibrated_resolutions():
+    """Ensure that reduced resolutions the calibration fits are accepted."""
+    camera = Camera(
+        0,
+        FULL_RESOLUTION,
+        'C016',
+        reduced_image_sizes=[HALF_RESOLUTION],
+    )
+    assert camera.resolution_controller is not None
+
+
+@pytest.mark.parametrize('resolution_fit, reduced_size', (
+    (ResolutionFit.SCALE, (640, 480)),
+    (ResolutionFit.EXACT, HALF_RESOLUTION),
+))
+def test_camera_rejects_uncalibrated_resolutions(resolution_fit, reduced_size):
+    """Ensure that reduced resolutions are checked before they're needed."""
+    with pytest.raises(ResolutionMismatchError):
+        Camera(
+            0,
+            FULL_RESOLUTION,
+            'C016',
+            resolution_fit=resolution_fit,
+            reduced_image_sizes=[reduced_size],
+        )
+
+
+def test_vision_follows_camera_resolution():
+    """Ensure that markers are still found after the resolution is reduced."""
+    camera = ScalingFileCamera(TEST_DATA / 'Photo 1.jpg')
+    vision = Vision(camera, latency_budget=1, tracking=True)
+
+    sizes = []
+    for _ in range(5):
+        sizes.append(camera.get_image_size())
+        assert vision.snapshot() == [Token(id=9)]
+
+    full_size = camera.image.size
+    half_size = tuple(x // 2 for x in full_size)
+    assert sizes == [full_size] * 2 + [half_size] * 3
+    # The detector is tuned separately for each resolution
+    assert set(vision._controllers) == {full_size, half_size}
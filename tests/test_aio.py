@@ -0,0 +1,202 @@
+"""Tests for the asyncio interfaces."""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from sb_vision import FileCamera, Vision
+from sb_vision.aio import AsyncCaptureDevice, AsyncVision
+from sb_vision.frames import FramePool
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+IMAGE_FILE = CALIBRATIONS / '1.5z-0.2x.jpg'
+
+
+class SlowFileCamera(FileCamera):
+    """File camera which takes a while to capture each frame."""
+
+    def __init__(self, delay):
+        """Capture ``IMAGE_FILE``, taking ``delay`` seconds for each capture."""
+        super().__init__(IMAGE_FILE, camera_model='C016')
+        self.delay = delay
+
+    def capture_frame(self):
+        """Capture a single frame, slowly."""
+        time.sleep(self.delay)
+        return super().capture_frame()
+
+
+class FakeCaptureDevice:
+    """Capture device whose captures wait to be allowed to finish."""
+
+    def __init__(self):
+        """Create a device which captures into a pool."""
+        self.pool = FramePool((4, 3), count=1)
+        self.allow_capture = threading.Event()
+        self.frames = []
+        self.closes = 0
+
+    def acquire_frame(self, width, height, *, max_age=None):
+        """Capture a frame, once allowed to."""
+        self.allow_capture.wait()
+        frame = self.pool.acquire()
+        self.frames.append(frame)
+        return frame
+
+    def close(self):
+        """Close the device."""
+        self.closes += 1
+
+
+def run(coroutine):
+    """Run the coroutine to completion on a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_snapshot():
+    """Make sure that snapshots give the same tokens as synchronously."""
+    vision = Vision(FileCamera(IMAGE_FILE, camera_model='C016'))
+    expected = vision.snapshot()
+
+    async def snapshot():
+        async with AsyncVision(vision) as async_vision:
+            return await async_vision.snapshot()
+
+    assert run(snapshot()) == expected
+
+
+def test_snapshot_does_not_block_loop():
+    """Make sure that the event loop keeps running during a snapshot."""
+    async_vision = AsyncVision(Vision(SlowFileCamera(delay=0.2)))
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def snapshot():
+        ticker = asyncio.ensure_future(tick())
+        try:
+            return await async_vision.snapshot()
+        finally:
+            ticker.cancel()
+
+    tokens = run(snapshot())
+    async_vision.close()
+
+    assert len(tokens) == 1
+    assert len(ticks) > 5
+
+
+def test_cancelled_snapshot():
+    """Make sure that cancelling a snapshot leaves the vision usable."""
+    async_vision = AsyncVision(Vision(SlowFileCamera(delay=0.1)))
+
+    async def snapshots():
+        task = asyncio.ensure_future(async_vision.snapshot())
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        return await async_vision.snapshot()
+
+    assert len(run(snapshots())) == 1
+    async_vision.close()
+
+
+def test_frames():
+    """Make sure that frames are streamed in order."""
+    vision = Vision(FileCamera(IMAGE_FILE, camera_model='C016'))
+
+    async def frames():
+        indices = []
+        async with AsyncVision(vision) as async_vision:
+            async with async_vision.frames(drop_oldest=False) as stream:
+                async for metadata, tokens in stream:
+                    assert len(tokens) == 1
+                    indices.append(metadata.index)
+                    if len(indices) == 3:
+                        break
+        return indices
+
+    assert run(frames()) == [0, 1, 2]
+
+
+def test_unused_frames_can_be_closed():
+    """Make sure that frames which were never iterated can be closed."""
+    vision = Vision(FileCamera(IMAGE_FILE, camera_model='C016'))
+
+    async def frames():
+        async with AsyncVision(vision) as async_vision:
+            async with async_vision.frames():
+                pass
+
+    run(frames())
+
+
+def test_cancelled_capture_releases_frame():
+    """Make sure that frames captured for a cancelled request are released."""
+    device = FakeCaptureDevice()
+    async_device = AsyncCaptureDevice(device)  # type: ignore
+
+    async def capture():
+        task = asyncio.ensure_future(async_device.acquire_frame(4, 3))
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        device.allow_capture.set()
+        # Let the abandoned capture finish
+        while not device.frames:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+
+    run(capture())
+    async_device.close()
+
+    frame, = device.frames
+    assert frame._references == 0
+
+
+def test_close_twice():
+    """Make sure that closing an already closed device does nothing."""
+    device = FakeCaptureDevice()
+    async_device = AsyncCaptureDevice(device)  # type: ignore
+
+    async def use():
+        async with async_device:
+            async_device.close()
+
+    run(use())
+
+    # Wait for the close on the dedicated thread
+    async_device._executor.executor.shutdown(wait=True)
+    assert device.closes == 1
+
+
+def test_close_with_given_executor():
+    """Make sure that an executor we were given is closed on, not shut down."""
+    device = FakeCaptureDevice()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        async_device = AsyncCaptureDevice(
+            device,  # type: ignore
+            executor=executor,
+        )
+        async_device.close()
+        async_device.close()
+
+        # Runs after the close, so the executor is still usable
+        assert executor.submit(lambda: device.closes).result() == 1
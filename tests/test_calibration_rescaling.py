@@ -0,0 +1,71 @@
+"""Accuracy of positions found using calibrations rescaled to other resolutions."""
+
+import re
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from pytest import approx
+
+from sb_vision import FileCamera, ResolutionFit, Vision
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+
+# Labelled with their position, as "<z>z<x>x.jpg"
+TEST_IMAGES = ('1.0z-0.1x.jpg', '1.5z-0.2x.jpg', '2.0z0.5x.jpg')
+
+# How far the position may be from the label, and from the position found in
+# the original image, as a proportion of the distance to the marker
+LABEL_TOLERANCE = 0.15
+ORIGINAL_TOLERANCE = 0.01
+
+
+def scale(image):
+    """Scale to half size."""
+    return image.resize((640, 360), Image.BILINEAR)  # type: ignore
+
+
+def crop(image):
+    """Crop the sides to 4:3, then scale to 640x480."""
+    cropped = image.crop((160, 0, 1120, 720))
+    return cropped.resize((640, 480), Image.BILINEAR)  # type: ignore
+
+
+def letterbox(image):
+    """Scale to half size, then pad above and below to 640x480."""
+    padded = Image.new('L', (640, 480))
+    padded.paste(scale(image), (0, 60))
+    return padded
+
+
+def position(image_file, resolution_fit=ResolutionFit.SCALE):
+    """The position of the single marker in the image."""
+    camera = FileCamera(image_file, 'C016', resolution_fit=resolution_fit)
+    token, = Vision(camera).snapshot()
+    return token.cartesian
+
+
+@pytest.mark.parametrize('photo', TEST_IMAGES)
+@pytest.mark.parametrize('transform, resolution_fit', (
+    (scale, ResolutionFit.SCALE),
+    (crop, ResolutionFit.CROP),
+    (letterbox, ResolutionFit.LETTERBOX),
+))
+def test_rescaled_position(photo, transform, resolution_fit, tmp_path):
+    """Make sure that markers are found in the same place at other resolutions."""
+    match = re.match(r'(.+)z(.+)x\.jpg', photo)
+    assert match is not None
+    z, x = (float(value) for value in match.groups())
+    distance = (x ** 2 + z ** 2) ** 0.5
+
+    image_file = tmp_path / 'image.png'
+    transform(Image.open(str(CALIBRATIONS / photo)).convert('L')).save(str(image_file))
+
+    original = position(CALIBRATIONS / photo)
+    rescaled = position(image_file, resolution_fit)
+
+    assert tuple(rescaled) == approx(
+        tuple(original),
+        abs=distance * ORIGINAL_TOLERANCE,
+    )
+    assert (rescaled.x, rescaled.z) == approx((x, z), abs=distance * LABEL_TOLERANCE)
@@ -0,0 +1,165 @@
+"""Tests for capturing frames through the pluggable capture backends."""
+
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sb_vision import Camera, FileCamera, Vision
+from sb_vision.capture_backends import (
+    _CONVERTERS,
+    SyntheticBackend,
+    still_frames,
+)
+from sb_vision.cvcapture import CaptureDevice, DeviceClosedError
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+IMAGE_FILE = CALIBRATIONS / '1.5z-0.2x.jpg'
+
+FPS = 100.0
+
+
+def frame_indices(index, array):
+    """Generate frames filled with their index."""
+    array[...] = index % 256
+
+
+def synthetic_device():
+    """A capture device generating frames filled with their index."""
+    return CaptureDevice.from_backend(
+        SyntheticBackend(FPS, generate=frame_indices),
+    )
+
+
+def test_synthetic_frames_at_rate():
+    """Make sure that synthetic frames are timestamped as they're due."""
+    with synthetic_device() as device:
+        frames = [device.capture_frame(64, 48) for _ in range(5)]
+
+    indices = [x.image_bytes[0] for x in frames]
+    timestamps = np.array([x.timestamp for x in frames])
+
+    assert indices == sorted(set(indices))
+    assert np.diff(timestamps) == pytest.approx(np.diff(indices) / FPS)
+    assert all(len(x.image_bytes) == 64 * 48 for x in frames)
+
+
+def test_synthetic_streaming():
+    """Make sure that streamed frames arrive in order, at the set rate."""
+    with synthetic_device() as device:
+        device.start_streaming(64, 48)
+        indices = []
+        for _ in range(5):
+            with device.acquire_frame(64, 48, max_age=0) as frame:
+                indices.append(frame.array[0, 0])
+
+        assert device.fps == FPS
+        assert device.pixel_format == 'GREY'
+
+    assert indices == sorted(set(indices))
+
+
+def test_closed_device():
+    """Make sure that a closed device can't be queried."""
+    device = synthetic_device()
+    device.close()
+
+    with pytest.raises(DeviceClosedError):
+        device.fps
+    with pytest.raises(DeviceClosedError):
+        device.acquire_frame(64, 48)
+
+
+@pytest.mark.parametrize('streaming', (False, True))
+def test_camera_with_synthetic_backend(streaming):
+    """Make sure that markers are found in frames captured through a backend."""
+    image = Image.open(str(IMAGE_FILE))
+    camera = Camera(
+        0,
+        image.size,
+        'C016',
+        streaming=streaming,
+        capture_backend=lambda: SyntheticBackend(generate=still_frames(image)),
+    )
+
+    token, = Vision(camera).snapshot()
+    expected, = Vision(FileCamera(IMAGE_FILE, 'C016')).snapshot()
+
+    assert token.cartesian == expected.cartesian
+    assert camera.get_pixel_format() == 'GREY'
+
+
+def test_capture_options_go_to_backend():
+    """Make sure that capture options aren't silently dropped."""
+    with pytest.raises(ValueError):
+        Camera(0, (640, 480), None, fps=30, capture_backend=SyntheticBackend)
+
+
+def test_invalid_synthetic_fps():
+    """Make sure that frames must be emitted at a positive rate."""
+    with pytest.raises(ValueError):
+        SyntheticBackend(0)
+
+
+@pytest.fixture
+def luminance():
+    """A small greyscale image with plenty of detail."""
+    return np.random.RandomState(0).randint(0, 256, (6, 8)).astype(np.uint8)
+
+
+def padded(rows, bytes_per_line):
+    """The rows of a frame, each padded to the stride."""
+    height, width = rows.shape
+    frame = np.zeros((height, bytes_per_line), dtype=np.uint8)
+    frame[:, :width] = rows
+    return frame
+
+
+@pytest.mark.parametrize('pixel_format, offset', (
+    ('YUYV', 0),
+    ('UYVY', 1),
+))
+def test_packed_luminance(pixel_format, offset, luminance):
+    """Make sure that luminance is taken from the right bytes of 4:2:2 frames."""
+    height, width = luminance.shape
+    packed = np.full((height, width * 2), 128, dtype=np.uint8)
+    packed[:, offset::2] = luminance
+    bytes_per_line = width * 2 + 4
+
+    array = np.empty_like(luminance)
+    _CONVERTERS[pixel_format](
+        memoryview(padded(packed, bytes_per_line).tobytes()),
+        array,
+        bytes_per_line,
+    )
+
+    assert array.tolist() == luminance.tolist()
+
+
+def test_greyscale(luminance):
+    """Make sure that greyscale frames are copied, without their padding."""
+    height, width = luminance.shape
+
+    array = np.empty_like(luminance)
+    _CONVERTERS['GREY'](
+        memoryview(padded(luminance, width + 8).tobytes()),
+        array,
+        width + 8,
+    )
+
+    assert array.tolist() == luminance.tolist()
+
+
+def test_jpeg_luminance():
+    """Make sure that the luminance is decoded from JPEG frames."""
+    image = Image.open(str(IMAGE_FILE))
+    jpeg = io.BytesIO()
+    image.save(jpeg, format='JPEG', quality=95)
+
+    array = np.empty((image.height, image.width), dtype=np.uint8)
+    _CONVERTERS['MJPG'](memoryview(jpeg.getvalue()), array, 0)
+
+    expected = np.asarray(image.convert('L'), dtype=np.int16)
+    assert np.abs(array - expected).mean() < 2
@@ -2,9 +2,15 @@
 
 import math
 
+import numpy as np
 import pytest
 
 from sb_vision import Cartesian, Spherical, cartesian_to_spherical
+from sb_vision.coordinates import (
+    cartesian_to_legacy_polar,
+    cartesians_to_legacy_polars,
+    cartesians_to_sphericals,
+)
 
 TEST_DATA = [
     (
@@ -90,3 +96,35 @@ def test_cartesian_to_spherical(cartesian, spherical):
     assert round(spherical.rot_x, 3) == round(actual.rot_x, 3), "Wrong x rotation"
     assert round(spherical.rot_y, 3) == round(actual.rot_y, 3), "Wrong y rotation"
     assert round(spherical.dist, 3) == round(actual.dist, 3), "Wrong distance"
+
+
+@pytest.mark.parametrize("scalar, vectorised", (
+    (cartesian_to_spherical, cartesians_to_sphericals),
+    (cartesian_to_legacy_polar, cartesians_to_legacy_polars),
+))
+def test_array_conversions_match_scalar(scalar, vectorised):
+    """Make sure that converting arrays matches converting each row."""
+    cartesians = np.array([cartesian for cartesian, _ in TEST_DATA], dtype=float)
+    cartesians = np.concatenate([
+        cartesians,
+        np.random.RandomState(0).uniform(-5, 5, size=(50, 3)),
+    ])
+
+    actual = vectorised(cartesians)
+
+    assert actual.shape == cartesians.shape
+    for row, cartesian in zip(actual, cartesians):
+        expected = scalar(Cartesian(*cartesian))
+        assert row.tolist() == pytest.approx(list(expected), abs=1e-12)
+
+
+def test_array_conversions_of_nothing():
+    """Make sure that an empty array can be converted."""
+    assert cartesians_to_sphericals(np.empty((0, 3))).shape == (0, 3)
+    assert cartesians_to_legacy_polars(np.empty((0, 3))).shape == (0, 3)
+
+
+def test_array_conversions_reject_wrong_shape():
+    """Make sure that arrays of other than 3D coordinates are rejected."""
+    with pytest.raises(ValueError):
+        cartesians_to_sphericals(np.zeros(3))
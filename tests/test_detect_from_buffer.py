@@ -0,0 +1,122 @@
+"""Tests for running detection directly on image buffers."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+from pytest import approx
+
+from sb_vision.native.apriltag import DETECTION_DTYPE, AprilTagDetector
+
+TEST_DATA = Path(__file__).parent / 'test_data'
+
+EXPECTED_ID = 9
+
+
+@pytest.fixture
+def image():
+    """A greyscale image containing a single marker."""
+    return Image.open(str(TEST_DATA / 'Photo 1.jpg')).convert('L')
+
+
+def detected_ids(detector, *args, **kwargs):
+    """Detect markers in the given buffer, returning the ids seen."""
+    return [x.id for x in detector.detect_tags_in_buffer(*args, **kwargs)]
+
+
+def test_array(image):
+    """Ensure that contiguous NumPy arrays are accepted."""
+    array = np.asarray(image)
+
+    with AprilTagDetector(image.size) as detector:
+        assert detected_ids(detector, array) == [EXPECTED_ID]
+
+
+def test_strided_array(image):
+    """Ensure that a view into a larger array is accepted, without a copy."""
+    width, height = image.size
+    padded = np.zeros((height, width + 13), dtype=np.uint8)
+    padded[:, :width] = np.asarray(image)
+
+    view = padded[:, :width]
+    assert not view.flags['C_CONTIGUOUS']
+
+    with AprilTagDetector(image.size) as detector:
+        assert detected_ids(detector, view) == [EXPECTED_ID]
+
+
+def test_flat_buffer_with_stride(image):
+    """Ensure that a flat buffer with padded rows is accepted."""
+    width, height = image.size
+    stride = width + 7
+    padded = np.zeros((height, stride), dtype=np.uint8)
+    padded[:, :width] = np.asarray(image)
+
+    with AprilTagDetector(image.size) as detector:
+        ids = detected_ids(
+            detector,
+            memoryview(padded.tobytes()),
+            image.size,
+            stride=stride,
+        )
+        assert ids == [EXPECTED_ID]
+
+
+def test_rejects_short_buffer(image):
+    """Ensure that buffers too small for the given size are rejected."""
+    with AprilTagDetector(image.size) as detector:
+        with pytest.raises(ValueError):
+            detected_ids(detector, bytes(10), image.size)
+
+
+def test_rejects_column_major_array(image):
+    """Ensure that arrays without contiguous rows are rejected."""
+    array = np.asfortranarray(np.asarray(image))
+
+    with AprilTagDetector(image.size) as detector:
+        with pytest.raises(ValueError):
+            detected_ids(detector, array)
+
+
+def test_records_match_detections(image):
+    """Ensure that detection records hold the same values as the detections."""
+    array = np.asarray(image)
+
+    with AprilTagDetector(image.size) as detector:
+        records = detector.detect_records(array)
+        detection, = detector.detect_tags_in_buffer(array)
+
+        assert records.dtype == DETECTION_DTYPE
+        record, = records
+
+        assert record['id'] == detection.id == EXPECTED_ID
+        assert record['hamming'] == detection.hamming
+        assert record['goodness'] == np.float32(detection.goodness)
+        assert record['decision_margin'] == np.float32(detection.decision_margin)
+        assert record['centre'].tolist() == list(detection.c)
+        assert record['corners'].tolist() == [list(x) for x in detection.p]
+        assert record['homography'].flatten().tolist() == [
+            detection.H.data[x] for x in range(9)
+        ]
+
+
+def test_records_with_offset(image):
+    """Ensure that records from part of an image are offset to match."""
+    left, top = 100, 50
+    view = np.asarray(image)[top:, left:]
+
+    with AprilTagDetector(image.size) as detector:
+        expected, = detector.detect_records(view)
+        actual, = detector.detect_records(view, offset=(left, top))
+
+    assert actual['centre'].tolist() == approx(
+        (expected['centre'] + (left, top)).tolist(),
+    )
+    assert actual['corners'].flatten().tolist() == approx(
+        (expected['corners'] + (left, top)).flatten().tolist(),
+    )
+
+    # The homography still maps the marker's centre onto its centre
+    centre = actual['homography'].dot([0, 0, 1])
+    assert (centre[:2] / centre[2]).tolist() == approx(actual['centre'].tolist())
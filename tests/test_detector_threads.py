@@ -0,0 +1,199 @@
+"""Tests for using detectors from several threads, and sharing them."""
+
+import concurrent.futures
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sb_vision import FileCamera, Vision
+from sb_vision.native.apriltag import (
+    DEFAULT_BITS_CORRECTED,
+    DEFAULT_QUAD_SETTINGS,
+    AprilTagDetector,
+    QuadSettings,
+    shared_detector,
+)
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+
+
+@pytest.fixture
+def images():
+    """Greyscale images of the same size, each containing a single marker."""
+    return [
+        np.asarray(Image.open(str(x)).convert('L'))
+        for x in sorted(CALIBRATIONS.glob('*.jpg'))[:4]
+    ]
+
+
+def image_size(array):
+    """The size of the image in the array, as (width, height)."""
+    height, width = array.shape
+    return width, height
+
+
+def test_concurrent_detections_match_sequential(images):
+    """Ensure that detecting from several threads gives the same results."""
+    with AprilTagDetector(image_size(images[0])) as detector:
+        def detect(image):
+            records = detector.detect_records(image)
+            return records['id'].tolist(), records['corners'].tolist()
+
+        expected = [detect(x) for x in images]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            actual = list(executor.map(detect, images * 2))
+
+    assert actual == expected * 2
+
+
+def test_concurrent_pil_detections(images):
+    """Ensure that copying images to detect doesn't share a buffer."""
+    pil_images = [Image.fromarray(x) for x in images]
+
+    with AprilTagDetector(pil_images[0].size) as detector:
+        def detect(image):
+            return [x.id for x in detector.detect_tags(image)]
+
+        expected = [detect(x) for x in pil_images]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            actual = list(executor.map(detect, pil_images * 2))
+
+    assert actual == expected * 2
+
+
+def test_detectors_share_family(images):
+    """Ensure that the tag family's tables are only built once."""
+    with AprilTagDetector((640, 480)) as first:
+        with AprilTagDetector((1280, 720)) as second:
+            assert first._family is second._family
+
+
+def test_families_per_bits_corrected():
+    """Ensure that detectors correcting different numbers of bits don't share."""
+    with AprilTagDetector(bits_corrected=0) as first:
+        with AprilTagDetector(bits_corrected=DEFAULT_BITS_CORRECTED) as second:
+            assert first._family is not second._family
+            assert first.bits_corrected == 0
+
+
+def test_detect_without_correction(images):
+    """Ensure that markers seen clearly are still detected without correction."""
+    with AprilTagDetector(bits_corrected=0) as detector:
+        for image in images:
+            records = detector.detect_records(image)
+            assert len(records) == 1
+            assert records['hamming'].tolist() == [0]
+
+
+@pytest.mark.parametrize('bits_corrected', (-1, 3))
+def test_invalid_bits_corrected(bits_corrected):
+    """Ensure that only the numbers of bits the tables support are accepted."""
+    with pytest.raises(ValueError):
+        AprilTagDetector(bits_corrected=bits_corrected)
+
+
+def test_pool_grows_when_busy(images):
+    """Ensure that simultaneous detections use separate native detectors."""
+    with AprilTagDetector(image_size(images[0])) as detector:
+        first = detector.detect_tags_in_buffer(images[0])
+        second = detector.detect_tags_in_buffer(images[1])
+
+        # Both in progress at once
+        next(first)
+        next(second)
+        assert detector._idle == []
+
+        first.close()
+        second.close()
+        assert len(detector._idle) == 2
+
+
+def test_settings_apply_to_pooled_detectors(images):
+    """Ensure that changes to the settings reach every native detector."""
+    settings = QuadSettings(quad_decimate=2.0, quad_sigma=0.0, refine_edges=True)
+
+    with AprilTagDetector(image_size(images[0])) as detector:
+        first = detector.detect_tags_in_buffer(images[0])
+        next(first)
+        detector.detect_records(images[1])
+        first.close()
+
+        detector.quad_settings = settings
+        detector.detect_records(images[0])
+
+        assert detector._idle[-1].quad_settings == settings
+
+
+def test_close_while_detecting(images):
+    """Ensure that closing a detector in use lets the detection finish."""
+    detector = AprilTagDetector(image_size(images[0]))
+    detections = detector.detect_tags_in_buffer(images[0])
+    detection = next(detections)
+
+    detector.close()
+
+    assert detection.id >= 0
+    detections.close()
+    assert detector._idle == []
+
+    with pytest.raises(ValueError):
+        detector.detect_records(images[0])
+
+
+def test_shared_detector_per_configuration():
+    """Ensure that the registry gives one detector per configuration."""
+    assert shared_detector() is shared_detector(nthreads=1)
+    assert shared_detector(nthreads=2) is not shared_detector(nthreads=1)
+    assert shared_detector(bits_corrected=0) is not shared_detector()
+    assert shared_detector(bits_corrected=0).bits_corrected == 0
+
+
+def test_closed_shared_detector_replaced():
+    """Ensure that closing a shared detector doesn't break later users."""
+    shared_detector(nthreads=3).close()
+    assert not shared_detector(nthreads=3).closed
+
+
+def test_visions_share_detector():
+    """Ensure that separate visions borrow the same detector."""
+    first = Vision(FileCamera(CALIBRATIONS / '1.0z0.0x.jpg', camera_model=None))
+    second = Vision(FileCamera(CALIBRATIONS / '2.0z0.0x.jpg', camera_model=None))
+
+    assert first.apriltag_detector is second.apriltag_detector
+
+
+def test_unsized_detector_accepts_any_size(images):
+    """Ensure that the working image grows (and shrinks) to fit each image."""
+    full = Image.fromarray(images[0])
+    width, height = full.size
+    half = full.resize((width // 2, height // 2))
+
+    with AprilTagDetector() as detector:
+        for image in (half, full, half):
+            expected = [x.id for x in detector.detect_tags_in_buffer(np.asarray(image))]
+            assert [x.id for x in detector.detect_tags(image)] == expected
+
+
+def test_per_call_settings(images):
+    """Ensure that settings for one detection don't change the detector's."""
+    settings = QuadSettings(quad_decimate=2.0, quad_sigma=0.0, refine_edges=True)
+
+    with AprilTagDetector() as detector:
+        records = detector.detect_records(images[0], quad_settings=settings)
+
+        assert len(records) == 1
+        assert detector.quad_settings == DEFAULT_QUAD_SETTINGS
+        assert detector._idle[-1].quad_settings == settings
+
+        detector.detect_records(images[0])
+        assert detector._idle[-1].quad_settings == DEFAULT_QUAD_SETTINGS
+
+        with pytest.raises(ValueError):
+            detector.detect_records(
+                images[0],
+                quad_settings=settings._replace(quad_decimate=0.5),
+            )
@@ -0,0 +1,55 @@
+"""Tests for reusable frame buffers."""
+
+import numpy as np
+import pytest
+
+from sb_vision.frames import Frame, FramePool
+
+
+def test_pool_reuses_released_frames():
+    """Ensure that the memory of released frames is handed out again."""
+    pool = FramePool((4, 3), count=1)
+
+    frame = pool.acquire()
+    frame.release()
+
+    assert pool.acquire() is frame
+
+
+def test_pool_does_not_reuse_held_frames():
+    """Ensure that frames are not reused while anything holds them."""
+    pool = FramePool((4, 3), count=1)
+
+    frame = pool.acquire()
+    frame.retain()
+    frame.release()
+
+    assert pool.acquire() is not frame
+
+
+def test_pool_frame_size():
+    """Ensure that the pool's frames have the right shape."""
+    frame = FramePool((4, 3)).acquire()
+
+    assert frame.size == (4, 3)
+    assert frame.array.shape == (3, 4)
+    assert frame.array.dtype == np.uint8
+
+
+def test_double_release_errors():
+    """Ensure that releasing a frame too many times is an error."""
+    frame = FramePool((4, 3)).acquire()
+    frame.release()
+
+    with pytest.raises(ValueError):
+        frame.release()
+
+
+def test_image_shares_memory():
+    """Ensure that images created from frames aren't copies."""
+    frame = Frame(np.zeros((3, 4), dtype=np.uint8))
+    image = frame.to_image()
+
+    frame.array[1, 2] = 42
+
+    assert image.getpixel((2, 1)) == 42
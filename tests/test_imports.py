@@ -7,6 +7,14 @@ def test_can_import_cvcapture():
 
     This in turns makes sure it can do its own imports—which basically means
     that we can import the cvcapture native library without incurring the wrath
-    of the system linker for OpenCV.
+    of the system linker for OpenCV. The native library is only imported when
+    capturing through OpenCV, so is imported explicitly.
     """
     import sb_vision.cvcapture  # noqa
+    import sb_vision.native._cvcapture  # noqa
+
+
+def test_can_import_v4l2capture():
+    """Make sure we can get the native module for capturing through V4L2."""
+    import sb_vision.capture_backends  # noqa
+    import sb_vision.native._v4l2capture  # noqa
@@ -4,10 +4,13 @@ from pathlib import Path
 from unittest import mock
 
 import pytest
+from pytest import approx
 
 from sb_vision.find_3D_coords import (
+    ResolutionFit,
     ResolutionMismatchError,
     load_camera_calibrations,
+    rescale_camera_matrix,
 )
 
 TEST_DATA = Path(__file__).parent / 'test_data'
@@ -49,3 +52,62 @@ def test_loading_config():
             -9.2571589159495127e-01,
         ]]
         assert distance_coefficients == expected_distance_coefficients
+
+
+def test_calibration_is_prepared_once():
+    """Ensure that the loaded calibration is shared, as read-only arrays."""
+    first = load_camera_calibrations('C016', (1280, 720))
+    second = load_camera_calibrations('C016', (1280, 720))
+
+    assert first is second
+
+    assert first.camera_matrix.shape == (3, 3)
+    assert first.distance_coefficients.size == 5
+
+    with pytest.raises(ValueError):
+        first.camera_matrix[0, 0] = 0
+
+
+def test_rescales_same_aspect_ratio():
+    """Ensure that calibrations are scaled to smaller images of the same shape."""
+    full = load_camera_calibrations('C016', (1280, 720))
+    half = load_camera_calibrations('C016', (640, 360))
+
+    assert half.camera_matrix[0, 0] == approx(full.camera_matrix[0, 0] / 2)
+    assert half.camera_matrix[1, 1] == approx(full.camera_matrix[1, 1] / 2)
+    assert half.camera_matrix[0, 2] == approx((full.camera_matrix[0, 2] - 0.5) / 2)
+    assert half.camera_matrix[1, 2] == approx((full.camera_matrix[1, 2] - 0.5) / 2)
+    assert half.distance_coefficients.tolist() == full.distance_coefficients.tolist()
+
+
+def test_exact_fit_rejects_other_resolutions():
+    """Ensure that calibrations can still be restricted to their resolution."""
+    with pytest.raises(ResolutionMismatchError):
+        load_camera_calibrations('C016', (640, 360), ResolutionFit.EXACT)
+
+
+def test_rejects_other_aspect_ratios_without_model():
+    """Ensure that a change in aspect ratio needs to be described."""
+    with pytest.raises(ResolutionMismatchError):
+        load_camera_calibrations('C016', (640, 480))
+
+
+@pytest.mark.parametrize('fit, focal_length, principal_point', (
+    # Scaled by 2/3 to 853.3x480, cropped by 106.7 either side
+    (ResolutionFit.CROP, 400 / 3, (2 / 3 * 640.5 - 0.5 - 320 / 3, 2 / 3 * 360.5 - 0.5)),
+    # Scaled by 1/2 to 640x360, padded by 60 above and below
+    (ResolutionFit.LETTERBOX, 100, (319.75, 179.75 + 60)),
+))
+def test_changed_aspect_ratio(fit, focal_length, principal_point):
+    """Ensure that the principal point follows the crop or the padding."""
+    camera_matrix = rescale_camera_matrix(
+        [[200, 0, 640], [0, 200, 360], [0, 0, 1]],
+        (1280, 720),
+        (640, 480),
+        fit,
+    )
+
+    assert camera_matrix[0, 0] == approx(focal_length)
+    assert camera_matrix[1, 1] == approx(focal_length)
+    assert tuple(camera_matrix[:2, 2]) == approx(principal_point)
+    assert camera_matrix[2].tolist() == [0, 0, 1]
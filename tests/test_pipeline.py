@@ -0,0 +1,148 @@
+"""Tests for streaming tokens through the vision pipeline."""
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sb_vision import FileCamera, FrameMetadata, TokenSet, Vision
+from sb_vision.camera_base import CameraBase
+from sb_vision.frames import FramePool
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+IMAGE_FILE = CALIBRATIONS / '1.5z-0.2x.jpg'
+
+
+class PooledCamera(CameraBase):
+    """Camera capturing copies of an image into pooled frames."""
+
+    def __init__(self, *, delay=0.0, failures_after=None, live=True):
+        """Capture ``IMAGE_FILE``, taking ``delay`` seconds for each capture."""
+        super().__init__('C016')
+        self.live = live
+        self.array = np.asarray(Image.open(str(IMAGE_FILE)).convert('L'))
+        self.pool = FramePool(self.get_image_size(), count=3)
+        self.delay = delay
+        self.failures_after = failures_after
+        self.captures = 0
+        self.frames = []
+
+    def get_image_size(self):
+        """Get the size of images captured by the camera."""
+        height, width = self.array.shape
+        return width, height
+
+    def capture_image(self):
+        """Capture a single image."""
+        return Image.fromarray(self.array)
+
+    def capture_frame(self):
+        """Capture a single frame, into the pool."""
+        if self.captures == self.failures_after:
+            raise RuntimeError("Camera unplugged")
+        self.captures += 1
+
+        time.sleep(self.delay)
+        frame = self.pool.acquire()
+        frame.array[...] = self.array
+        frame.timestamp = time.monotonic()
+        self.frames.append(frame)
+        return frame
+
+
+def test_stream_matches_snapshot():
+    """Make sure that the tokens streamed are those from a snapshot."""
+    vision = Vision(FileCamera(IMAGE_FILE, camera_model='C016'))
+    expected, = vision.snapshot()
+
+    with vision.stream(drop_oldest=False) as stream:
+        metadata, tokens = next(stream)
+
+    assert isinstance(metadata, FrameMetadata)
+    assert metadata.index == 0
+    assert metadata.size == (1280, 720)
+    assert isinstance(tokens, TokenSet)
+
+    token, = tokens
+    assert token == expected
+    assert tuple(token.cartesian) == pytest.approx(tuple(expected.cartesian))
+
+
+def test_stream_without_dropping_is_in_order():
+    """Make sure that every frame is given, in order, when not dropping."""
+    camera = PooledCamera()
+
+    with Vision(camera).stream(drop_oldest=False) as stream:
+        results = [next(stream) for _ in range(6)]
+        assert stream.dropped == 0
+
+    assert [x.index for x, _ in results] == list(range(6))
+    timestamps = [x.timestamp for x, _ in results]
+    assert timestamps == sorted(timestamps)
+    assert all(len(x) == 1 for _, x in results)
+
+
+def test_stream_drops_oldest_frames():
+    """Make sure that a slow consumer gets the latest frames, in order."""
+    camera = PooledCamera(delay=0.001)
+
+    with Vision(camera).stream(depth=1) as stream:
+        indices = []
+        for metadata, _ in stream:
+            indices.append(metadata.index)
+            if len(indices) == 3:
+                break
+            time.sleep(0.2)
+
+        assert stream.dropped > 0
+
+    assert indices == sorted(indices)
+    assert indices[-1] > 2
+
+
+def test_stream_paces_capture_from_files():
+    """Make sure that frames always available aren't captured only to be dropped."""
+    camera = PooledCamera(live=False)
+
+    with Vision(camera).stream(depth=1) as stream:
+        next(stream)
+        time.sleep(0.2)
+        captures = camera.captures
+
+    # Capturing waits on detection, rather than running as fast as it can
+    assert captures < 20
+
+
+def test_stream_releases_frames():
+    """Make sure that every frame captured is returned to the pool."""
+    camera = PooledCamera(delay=0.001)
+
+    with Vision(camera).stream(depth=1) as stream:
+        next(stream)
+        time.sleep(0.1)
+
+    assert len(camera.frames) > 1
+    assert all(x._references == 0 for x in camera.frames)
+
+
+def test_stream_raises_stage_errors():
+    """Make sure that errors in the stages are raised to the consumer."""
+    camera = PooledCamera(failures_after=2)
+
+    with Vision(camera).stream(drop_oldest=False) as stream:
+        assert next(stream)[0].index == 0
+        assert next(stream)[0].index == 1
+
+        with pytest.raises(RuntimeError):
+            next(stream)
+
+        with pytest.raises(StopIteration):
+            next(stream)
+
+
+def test_invalid_depth():
+    """Make sure that queues must hold something."""
+    with pytest.raises(ValueError):
+        Vision(PooledCamera()).stream(depth=0)
@@ -0,0 +1,77 @@
+"""Tests for calculating the positions of several markers at once."""
+
+import pytest
+from pytest import approx
+
+from sb_vision.coordinates import PixelCoordinate
+from sb_vision.find_3D_coords import (
+    calculate_transforms,
+    calculate_transforms_batch,
+    load_camera_calibrations,
+    marker_object_points,
+)
+
+# Corners of markers of various sizes, as seen in a 1280x720 image
+MARKERS = [
+    (size, [PixelCoordinate(x, y) for x, y in corners])
+    for size, corners in (
+        ((0.25, 0.25), [(593, 320), (593, 398), (671, 398), (671, 320)]),
+        ((0.1, 0.1), [(100, 100), (102, 140), (142, 138), (140, 98)]),
+        ((0.25, 0.25), [(900, 500), (903, 600), (1001, 597), (998, 498)]),
+    )
+]
+
+
+@pytest.fixture
+def calibration():
+    """The calibration of the camera the markers were seen by."""
+    return load_camera_calibrations('C016', (1280, 720))
+
+
+def test_batch_matches_individual(calibration):
+    """Batched positions must match those calculated one marker at a time."""
+    camera_matrix, distance_coefficients = calibration
+
+    translations, orientations = calculate_transforms_batch(
+        [size for size, _ in MARKERS],
+        [corners for _, corners in MARKERS],
+        calibration,
+    )
+
+    assert translations.shape == (len(MARKERS), 3)
+    assert orientations.shape == (len(MARKERS), 3)
+
+    for (size, corners), translation, orientation in zip(
+        MARKERS,
+        translations,
+        orientations,
+    ):
+        expected_translation, expected_orientation = calculate_transforms(
+            size,
+            corners,
+            camera_matrix,
+            distance_coefficients,
+        )
+        assert tuple(translation) == approx(tuple(expected_translation))
+        assert tuple(orientation) == approx(tuple(expected_orientation))
+
+
+def test_batch_of_no_markers(calibration):
+    """An image with no markers has no positions."""
+    translations, orientations = calculate_transforms_batch([], [], calibration)
+
+    assert translations.shape == (0, 3)
+    assert orientations.shape == (0, 3)
+
+
+def test_object_points_are_cached():
+    """Each marker size's corners must only be calculated once."""
+    points = marker_object_points((0.25, 0.25))
+
+    assert marker_object_points((0.25, 0.25)) is points
+    assert points.tolist() == [
+        [0.125, 0.125, 0],
+        [0.125, -0.125, 0],
+        [-0.125, -0.125, 0],
+        [-0.125, 0.125, 0],
+    ]
@@ -0,0 +1,135 @@
+"""Tests for the different ways of calculating the poses of markers."""
+
+import math
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pytest import approx
+
+from sb_vision import FileCamera, PoseEngine, Vision
+from sb_vision.pose import PoseCache, _rotation_matrices_to_vectors
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+
+TEST_IMAGES = [
+    '1.0z-0.1x.jpg',
+    '2.0z-0.5x.jpg',
+    '3.0z1.0x.jpg',
+]
+
+# Allowed difference from the iterative solver, as a fraction of the distance
+RELATIVE_TOLERANCE = 0.05
+
+
+def marker_position(photo, pose_engine):
+    """The position of the single marker in the given photo."""
+    camera = FileCamera(CALIBRATIONS / photo, camera_model='C016')
+    vision = Vision(camera, pose_engine=pose_engine)
+    token, = vision.snapshot()
+    return np.array(token.cartesian)
+
+
+@pytest.mark.parametrize('photo', TEST_IMAGES)
+@pytest.mark.parametrize(
+    'pose_engine',
+    [x for x in PoseEngine if x is not PoseEngine.ITERATIVE],
+)
+def test_engine_agrees_with_iterative(photo, pose_engine):
+    """Make sure that each engine finds much the same position."""
+    if not pose_engine.is_supported():
+        pytest.skip("{} is not supported by this OpenCV".format(pose_engine))
+
+    expected = marker_position(photo, PoseEngine.ITERATIVE)
+    actual = marker_position(photo, pose_engine)
+
+    distance = np.linalg.norm(expected)
+    assert np.linalg.norm(actual - expected) < RELATIVE_TOLERANCE * distance
+
+
+def rotation_matrix(vector):
+    """Convert a rotation vector to a matrix, by Rodrigues' formula."""
+    angle = np.linalg.norm(vector)
+    axis = vector / angle if angle else vector
+    cross = np.array([
+        [0, -axis[2], axis[1]],
+        [axis[2], 0, -axis[0]],
+        [-axis[1], axis[0], 0],
+    ])
+    return np.eye(3) + math.sin(angle) * cross + (1 - math.cos(angle)) * cross.dot(cross)
+
+
+@pytest.mark.parametrize('vector', [
+    (0, 0, 0),
+    (0, 0, math.pi / 2),
+    (0.1, -0.2, 0.3),
+    (math.pi, 0, 0),
+    (0, -math.pi / math.sqrt(2), math.pi / math.sqrt(2)),
+])
+def test_rotation_matrix_to_vector(vector):
+    """Make sure that rotations survive a round trip via rotation vectors."""
+    vector = np.array(vector, dtype=np.float64)
+    rotation = rotation_matrix(vector)
+
+    actual, = _rotation_matrices_to_vectors(rotation[np.newaxis])
+
+    # Half turns can be described by a vector in either direction
+    assert np.linalg.norm(actual) == approx(np.linalg.norm(vector))
+    assert rotation_matrix(actual).flatten().tolist() == approx(
+        rotation.flatten().tolist(),
+        abs=1e-6,
+    )
+
+
+class FakeClock:
+    """A clock which only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        """Get the current time."""
+        return self.now
+
+
+def test_pose_cache_guesses():
+    """Make sure that the cache guesses the last pose of each marker."""
+    cache = PoseCache(1.0, clock=FakeClock())
+    cache.update([3, 5], np.array([[1, 2, 3], [4, 5, 6]]), np.zeros((2, 3)))
+
+    translations, orientations = cache.guesses([5, 7])
+
+    assert translations[0].tolist() == [4, 5, 6]
+    assert orientations[0].tolist() == [0, 0, 0]
+    assert np.isnan(translations[1]).all()
+    assert np.isnan(orientations[1]).all()
+
+
+def test_pose_cache_evicts_stale_poses():
+    """Make sure that poses are forgotten once too old."""
+    clock = FakeClock()
+    cache = PoseCache(1.0, clock=clock)
+    cache.update([3], np.ones((1, 3)), np.ones((1, 3)))
+
+    clock.now = 0.5
+    cache.update([5], np.ones((1, 3)), np.ones((1, 3)))
+
+    clock.now = 1.25
+    cache.evict()
+    assert len(cache) == 1
+
+    translations, _ = cache.guesses([3, 5])
+    assert np.isnan(translations[0]).all()
+    assert translations[1].tolist() == [1, 1, 1]
+
+
+@pytest.mark.parametrize('photo', TEST_IMAGES)
+def test_warm_start_agrees_with_cold_start(photo):
+    """Make sure that starting from the previous pose gives the same pose."""
+    expected = marker_position(photo, PoseEngine.ITERATIVE)
+
+    camera = FileCamera(CALIBRATIONS / photo, camera_model='C016')
+    vision = Vision(camera, warm_start=True)
+    for _ in range(3):
+        token, = vision.snapshot()
+        assert tuple(token.cartesian) == approx(tuple(expected), rel=1e-3)
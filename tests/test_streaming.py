@@ -0,0 +1,130 @@
+"""Tests for grabbing frames continuously in the background."""
+
+import threading
+import time
+
+import pytest
+
+from sb_vision.capture_backends import CaptureBackend
+from sb_vision.cvcapture import CaptureDevice, StreamingError
+
+SIZE = (4, 3)
+
+
+class GatedBackend(CaptureBackend):
+    """Backend which grabs a frame only when allowed to, numbering each."""
+
+    def __init__(self):
+        """Create a backend which is not yet allowed to grab any frames."""
+        self.allowed = threading.Semaphore(0)
+        self.free_running = False
+        self.error = None
+        self.count = 0
+
+    def allow(self):
+        """Allow one more frame to be grabbed."""
+        self.allowed.release()
+
+    def run_freely(self):
+        """Allow any number of frames to be grabbed."""
+        self.free_running = True
+        self.allowed.release()
+
+    def capture(self, array):
+        """Grab a frame, once allowed to."""
+        return self.capture_latest(array)
+
+    def capture_latest(self, array):
+        """Grab a frame, once allowed to."""
+        if not self.free_running:
+            self.allowed.acquire()
+        if self.error is not None:
+            raise self.error
+
+        self.count += 1
+        array[...] = self.count
+        return time.monotonic()
+
+
+@pytest.fixture
+def backend():
+    """A gated backend, left running freely so that streaming can stop."""
+    backend = GatedBackend()
+    yield backend
+    backend.run_freely()
+
+
+def streaming_device(backend):
+    """A device streaming from the backend."""
+    device = CaptureDevice.from_backend(backend)
+    device.start_streaming(*SIZE)
+    return device
+
+
+def test_latest_waits_for_fresh_frame(backend):
+    """Make sure that a frame too old for ``max_age`` isn't handed out."""
+    device = streaming_device(backend)
+    backend.allow()
+
+    with device.acquire_frame(*SIZE) as first:
+        assert first.array[0, 0] == 1
+
+    # Any age will do, so the same frame is handed out again
+    with device.acquire_frame(*SIZE, max_age=60) as again:
+        assert again is first
+
+    fresh = []
+    waiter = threading.Thread(
+        target=lambda: fresh.append(device.acquire_frame(*SIZE, max_age=0)),
+    )
+    waiter.start()
+
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    backend.allow()
+    waiter.join(1)
+    assert not waiter.is_alive()
+
+    frame, = fresh
+    assert frame.array[0, 0] == 2
+    frame.release()
+
+    backend.run_freely()
+    device.close()
+
+
+def test_background_error_surfaces(backend):
+    """Make sure that failing to grab a frame is raised to readers."""
+    device = streaming_device(backend)
+    backend.error = OSError("unplugged")
+    backend.allow()
+
+    with pytest.raises(StreamingError) as error:
+        device.acquire_frame(*SIZE)
+    assert error.value.__cause__ is backend.error
+
+    # The background thread has stopped, so this doesn't wait for it
+    device.close()
+
+
+def test_stop_releases_latest_frame(backend):
+    """Make sure that stopping hands back every frame but those still held."""
+    device = streaming_device(backend)
+    backend.allow()
+
+    held = device.acquire_frame(*SIZE)
+    streamer = device._streamer
+    assert streamer._latest is held
+    assert held._references == 2
+
+    backend.run_freely()
+    device.stop_streaming()
+
+    assert streamer._latest is None
+    assert held._references == 1
+    assert len(streamer._pool._free) == 2
+
+    held.release()
+    assert len(streamer._pool._free) == 3
+    device.close()
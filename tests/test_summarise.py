@@ -0,0 +1,39 @@
+"""Tests for the summarise command."""
+
+import io
+import json
+from pathlib import Path
+
+from sb_vision.cli import summarise
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+IMAGE_FILES = sorted(CALIBRATIONS.glob('*.jpg'))[:4]
+
+
+def run(**kwargs):
+    """Run the command over ``IMAGE_FILES``, giving its output."""
+    output = io.StringIO()
+    summarise.main(
+        list(reversed(IMAGE_FILES)),
+        camera_model='C016',
+        output=output,
+        **kwargs,
+    )
+    return output.getvalue()
+
+
+def test_parallel_matches_sequential():
+    """Make sure that the output is the same, in order, from several processes."""
+    expected = run()
+
+    assert run(jobs=2) == expected
+    assert expected.splitlines()[:2] == ['version: 1', 'files:']
+
+
+def test_json_lines():
+    """Make sure that each line of JSON output describes one image, in order."""
+    lines = run(output_format='json-lines', jobs=2).splitlines()
+
+    summaries = [json.loads(x) for x in lines]
+    assert [x['image'] for x in summaries] == [str(x) for x in IMAGE_FILES]
+    assert all(set(x) == {'image', 'x', 'y', 'z'} for x in summaries)
@@ -0,0 +1,138 @@
+"""Tests for the array-backed set of tokens."""
+
+from pathlib import Path
+
+import pytest
+from pytest import approx
+
+from sb_vision import FileCamera, Token, TokenSet, Vision
+from sb_vision.game_specific import TOKEN, WALL
+
+CALIBRATIONS = Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+TEST_DATA = Path(__file__).parent / 'test_data'
+
+
+@pytest.fixture
+def vision():
+    """Vision for an image containing a single marker."""
+    camera = FileCamera(CALIBRATIONS / '1.5z-0.2x.jpg', camera_model='C016')
+    return Vision(camera)
+
+
+def test_token_set_columns(vision):
+    """Make sure that the columns of the set describe the tokens."""
+    token_set = vision.snapshot_token_set()
+
+    assert isinstance(token_set, TokenSet)
+    assert len(token_set) == 1
+
+    token, = token_set
+    assert token_set.ids.tolist() == [token.id]
+    assert token_set.certainties.tolist() == [token.certainty]
+    assert token_set.corners.tolist() == [[list(x) for x in token.pixel_corners]]
+    assert token_set.centres.tolist() == [list(token.pixel_centre)]
+    translations = token_set.translations
+    orientations = token_set.orientations
+    assert translations is not None and orientations is not None
+    assert translations.tolist() == [list(token.cartesian)]
+    assert orientations.shape == (1, 3)
+
+
+def test_tokens_match_list(vision):
+    """Make sure that the set gives the same tokens as the list."""
+    expected, = vision.snapshot()
+    actual, = vision.snapshot_token_set()
+
+    assert actual == expected
+    assert actual.certainty == expected.certainty
+    assert actual.pixel_corners == expected.pixel_corners
+    assert tuple(actual.pixel_centre) == approx(tuple(expected.pixel_centre))
+    assert tuple(actual.cartesian) == approx(tuple(expected.cartesian))
+    assert tuple(actual.spherical) == approx(tuple(expected.spherical))
+    assert actual.homography_matrix.tolist() == expected.homography_matrix.tolist()
+
+
+def test_converted_columns(vision):
+    """Make sure that the converted columns match each token's coordinates."""
+    token_set = vision.snapshot_token_set()
+    token, = token_set
+
+    assert token_set.sphericals.tolist() == [approx(list(token.spherical))]
+    assert token_set.legacy_polars.tolist() == [approx(list(token.legacy_polar))]
+
+
+def test_tokens_are_created_once(vision):
+    """Make sure that the tokens are only created on first use."""
+    token_set = vision.snapshot_token_set()
+
+    assert token_set[0] is token_set[0]
+    assert token_set[-1] is token_set[0]
+    assert token_set[:] == [token_set[0]]
+
+
+def test_token_without_camera_model():
+    """Make sure that tokens have no position without a camera model."""
+    camera = FileCamera(CALIBRATIONS / '1.5z-0.2x.jpg', camera_model=None)
+    token_set = Vision(camera).snapshot_token_set()
+
+    assert token_set.translations is None
+    with pytest.raises(AttributeError):
+        token_set[0].cartesian
+
+
+def test_token_has_no_dict():
+    """Make sure that tokens are compact."""
+    token = Token(id=3)
+
+    assert not hasattr(token, '__dict__')
+    with pytest.raises(AttributeError):
+        setattr(token, 'colour', 'red')
+
+
+def test_polar_is_legacy_polar(vision):
+    """Make sure that `polar` is an alias of `legacy_polar`."""
+    token, = vision.snapshot()
+    assert token.polar is token.legacy_polar
+
+
+def test_lazy_pose(vision):
+    """Make sure that lazy poses are only calculated when used."""
+    expected, = vision.snapshot()
+
+    camera = FileCamera(CALIBRATIONS / '1.5z-0.2x.jpg', camera_model='C016')
+    token_set = Vision(camera, lazy_pose=True).snapshot_token_set()
+    token, = token_set
+
+    assert not token_set._solved.any()
+
+    assert tuple(token.cartesian) == approx(tuple(expected.cartesian))
+    assert tuple(token.spherical) == approx(tuple(expected.spherical))
+    assert token_set._solved.all()
+    translations = token_set.translations
+    assert translations is not None
+    assert translations.tolist() == [list(token.cartesian)]
+
+
+def test_lazy_pose_of_whole_set():
+    """Make sure that the positions of a lazy set can be used together."""
+    camera = FileCamera(CALIBRATIONS / '1.5z-0.2x.jpg', camera_model='C016')
+    token_set = Vision(camera, lazy_pose=True).snapshot_token_set()
+
+    translations = token_set.translations
+    assert token_set._solved.all()
+    assert translations is not None
+    assert translations.tolist() == [list(token_set[0].cartesian)]
+
+
+@pytest.mark.parametrize('marker_ids, expected_ids', [
+    (None, [9]),
+    (WALL, [9]),
+    (TOKEN, []),
+    ([], []),
+])
+def test_marker_id_filter(marker_ids, expected_ids):
+    """Make sure that only the requested markers are reported."""
+    camera = FileCamera(TEST_DATA / 'Photo 1.jpg', camera_model='C016')
+    tokens = Vision(camera).snapshot(marker_ids=marker_ids)
+
+    assert [x.id for x in tokens] == expected_ids
@@ -0,0 +1,132 @@
+"""Tests for tracking markers between frames."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from sb_vision import FileCamera, Vision
+from sb_vision.coordinates import PixelCoordinate
+from sb_vision.tracking import RegionTracker
+
+TEST_DATA = Path(__file__).parent / 'test_data'
+
+IMAGE_SIZE = (1280, 720)
+
+CORNERS = [
+    PixelCoordinate(100, 100),
+    PixelCoordinate(100, 200),
+    PixelCoordinate(200, 200),
+    PixelCoordinate(200, 100),
+]
+
+
+def test_full_search_when_not_tracking():
+    """Ensure that the whole frame is searched when nothing is tracked."""
+    tracker = RegionTracker()
+    assert tracker.regions(IMAGE_SIZE) is None
+
+
+def test_searches_around_markers():
+    """Ensure that the region searched surrounds the marker seen."""
+    tracker = RegionTracker()
+    tracker.update([(1, CORNERS)], full_search=True)
+
+    regions = tracker.regions(IMAGE_SIZE)
+    assert regions is not None
+    region, = regions
+    left, top, right, bottom = region
+
+    assert left < 100 and top < 100
+    assert right > 200 and bottom > 200
+
+
+def test_regions_clipped_to_image():
+    """Ensure that regions don't extend beyond the image."""
+    tracker = RegionTracker()
+    tracker.update([(1, CORNERS)], full_search=True)
+
+    regions = tracker.regions((210, 210))
+    assert regions is not None
+    region, = regions
+
+    assert region[2] <= 210 and region[3] <= 210
+
+
+def test_overlapping_regions_merged():
+    """Ensure that no part of the image is searched twice."""
+    tracker = RegionTracker()
+    shifted = [PixelCoordinate(x + 50, y) for x, y in CORNERS]
+    tracker.update([(1, CORNERS), (2, shifted)], full_search=True)
+
+    regions = tracker.regions(IMAGE_SIZE)
+    assert regions is not None
+    region, = regions
+
+    assert region[0] < 100 and region[2] > 250
+
+
+def test_periodic_full_search():
+    """Ensure that the whole frame is searched every so often."""
+    tracker = RegionTracker(full_search_interval=3)
+    tracker.update([(1, CORNERS)], full_search=True)
+
+    for _ in range(2):
+        assert tracker.regions(IMAGE_SIZE) is not None
+        tracker.update([(1, CORNERS)], full_search=False)
+
+    assert tracker.regions(IMAGE_SIZE) is None
+
+
+def test_full_search_when_marker_lost():
+    """Ensure that losing a tracked marker results in a full search."""
+    tracker = RegionTracker()
+    tracker.update([(1, CORNERS), (2, CORNERS)], full_search=True)
+    tracker.update([(1, CORNERS)], full_search=False)
+
+    assert tracker.regions(IMAGE_SIZE) is None
+
+
+def test_duplicate_markers_tracked_separately():
+    """Ensure that each copy of a marker in view is searched around."""
+    tracker = RegionTracker()
+    distant = [PixelCoordinate(x + 800, y) for x, y in CORNERS]
+    tracker.update([(1, CORNERS), (1, distant)], full_search=True)
+
+    regions = tracker.regions(IMAGE_SIZE)
+    assert regions is not None
+    assert len(regions) == 2
+
+    # Losing one of the copies is still losing a marker
+    tracker.update([(1, CORNERS)], full_search=False)
+    assert tracker.regions(IMAGE_SIZE) is None
+
+
+def test_tracked_detections_match_full_frame():
+    """Ensure that markers found in regions are in full-frame coordinates."""
+    camera = FileCamera(TEST_DATA / 'Photo 1.jpg', camera_model=None)
+
+    full_token, = Vision(camera).snapshot()
+
+    vision = Vision(camera, tracking=True)
+    vision.snapshot()
+    tracked_token, = vision.snapshot()
+
+    tracker = vision._region_tracker
+    assert tracker is not None
+    assert tracker.regions(camera.get_image_size()) is not None
+
+    assert tracked_token.id == full_token.id
+    assert np.array(tracked_token.pixel_corners) == pytest.approx(
+        np.array(full_token.pixel_corners),
+        abs=0.5,
+    )
+
+    def normalised(matrix):
+        return matrix / matrix[2, 2]
+
+    assert normalised(tracked_token.homography_matrix) == pytest.approx(
+        normalised(full_token.homography_matrix),
+        rel=0.01,
+        abs=0.5,
+    )
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the detector for each number of bits corrected when decoding.
+
+Each setting is measured in a fresh process, so that its decoding tables are
+built from scratch: the time taken to create the first detector, the resident
+memory that adds, and the per-frame latency and number of markers detected.
+"""
+
+import argparse
+import multiprocessing
+import pathlib
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from sb_vision.native.apriltag import MAX_BITS_CORRECTED, AprilTagDetector
+
+CALIBRATIONS = pathlib.Path(__file__).parent.parent / 'calibrations'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'images',
+        metavar='IMAGE_FILE',
+        type=pathlib.Path,
+        nargs='*',
+        help="Images to detect markers in, default: all images under {}".format(
+            CALIBRATIONS,
+        ),
+    )
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=1,
+        help="The number of times to detect each image, default: %(default)s",
+    )
+    return parser.parse_args()
+
+
+def resident_memory():
+    # In bytes; Linux only
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("Resident memory is not available")
+
+
+def measure(bits_corrected, paths, repeats):
+    images = [np.asarray(Image.open(str(x)).convert('L')) for x in paths]
+
+    memory_before = resident_memory()
+    start = time.perf_counter()
+    detector = AprilTagDetector(bits_corrected=bits_corrected)
+    construction = time.perf_counter() - start
+    memory = resident_memory() - memory_before
+
+    with detector:
+        # Warm up, so that the working memory is allocated
+        detector.detect_records(images[0])
+
+        durations = []
+        detected = 0
+        for _ in range(repeats):
+            detected = 0
+            for image in images:
+                start = time.perf_counter()
+                records = detector.detect_records(image)
+                durations.append(time.perf_counter() - start)
+                detected += len(records)
+
+    return construction, memory, durations, detected
+
+
+def main(args):
+    paths = args.images or sorted(CALIBRATIONS.glob('**/*.jpg'))
+
+    print("{} images".format(len(paths)))
+    print("bits  construction (ms)  memory (MiB)  mean (ms)  median (ms)  markers")
+
+    # A fresh process for each setting, so nothing is shared between them
+    context = multiprocessing.get_context('spawn')
+    for bits_corrected in range(MAX_BITS_CORRECTED + 1):
+        with context.Pool(1) as pool:
+            construction, memory, durations, detected = pool.apply(
+                measure,
+                (bits_corrected, paths, args.repeats),
+            )
+
+        print("{:4d}  {:17.1f}  {:12.1f}  {:9.1f}  {:11.1f}  {:7d}".format(
+            bits_corrected,
+            construction * 1000,
+            memory / 2 ** 20,
+            statistics.mean(durations) * 1000,
+            statistics.median(durations) * 1000,
+            detected,
+        ))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""
+Compare capturing raw frames from a camera with having OpenCV convert them.
+
+Frames are captured with each setting in turn. The processor time per frame
+shows the cost of converting to greyscale, separately from the time spent
+waiting for the camera.
+"""
+
+import argparse
+import time
+
+from sb_vision.cvcapture import CaptureDevice
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'device_id',
+        type=int,
+        nargs='?',
+        default=0,
+        help="The camera to capture from, default: %(default)s",
+    )
+    parser.add_argument(
+        '--resolution',
+        type=int,
+        nargs=2,
+        metavar=('WIDTH', 'HEIGHT'),
+        default=(1280, 720),
+        help="The resolution to capture at, default: 1280 720",
+    )
+    parser.add_argument(
+        '--frames',
+        type=int,
+        default=50,
+        help="The number of frames to capture, default: %(default)s",
+    )
+    return parser.parse_args()
+
+
+def time_captures(device, args):
+    # The first capture may change the resolution, so doesn't count
+    device.acquire_frame(*args.resolution).release()
+
+    start = time.perf_counter()
+    start_cpu = time.process_time()
+    for _ in range(args.frames):
+        device.acquire_frame(*args.resolution).release()
+    return (
+        time.perf_counter() - start,
+        time.process_time() - start_cpu,
+    )
+
+
+def main(args):
+    print("{} frames at {}x{}".format(args.frames, *args.resolution))
+    print("requested  raw  per frame (ms)  processor (ms)")
+
+    for raw_frames in (False, True):
+        with CaptureDevice(args.device_id, raw_frames=raw_frames) as device:
+            duration, processor = time_captures(device, args)
+            print("{:9s}  {:3s}  {:14.1f}  {:14.2f}".format(
+                'raw' if raw_frames else 'converted',
+                'yes' if device.raw_frames else 'no',
+                duration / args.frames * 1000,
+                processor / args.frames * 1000,
+            ))
+
+
+if __name__ == '__main__':
+    main(parse_args())
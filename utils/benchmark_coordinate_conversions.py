@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Compare the per-token cost of the scalar and array coordinate conversions.
+
+Random positions, roughly where markers would be seen, are converted from
+cartesian coordinates both one at a time (as `Token` used to) and as a single
+array, for a range of numbers of tokens.
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from sb_vision.coordinates import (
+    Cartesian,
+    cartesian_to_legacy_polar,
+    cartesian_to_spherical,
+    cartesians_to_legacy_polars,
+    cartesians_to_sphericals,
+)
+
+CONVERSIONS = (
+    ('spherical', cartesian_to_spherical, cartesians_to_sphericals),
+    ('legacy polar', cartesian_to_legacy_polar, cartesians_to_legacy_polars),
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--counts',
+        type=int,
+        nargs='+',
+        default=[1, 4, 16, 64, 256],
+        help="The numbers of tokens to convert at once, default: %(default)s",
+    )
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=1000,
+        help="The number of times to convert each set of tokens, default: "
+             "%(default)s",
+    )
+    return parser.parse_args()
+
+
+def random_translations(count):
+    random = np.random.RandomState(count)
+    translations = random.uniform(-1, 1, size=(count, 3))
+    translations[:, 2] = random.uniform(0.5, 5, size=count)
+    return translations
+
+
+def per_token(function, count, repeats):
+    best = min(timeit.repeat(function, number=repeats, repeat=3))
+    return best / repeats / count
+
+
+def main(args):
+    print("conversion    tokens  scalar (us)  array (us)  speedup")
+
+    for name, scalar, vectorised in CONVERSIONS:
+        for count in args.counts:
+            translations = random_translations(count)
+            cartesians = [Cartesian(*x) for x in translations.tolist()]
+
+            scalar_time = per_token(
+                lambda: [scalar(x) for x in cartesians],
+                count,
+                args.repeats,
+            )
+            array_time = per_token(
+                lambda: vectorised(translations),
+                count,
+                args.repeats,
+            )
+
+            print("{:12s}  {:6d}  {:11.2f}  {:10.2f}  {:6.1f}x".format(
+                name,
+                count,
+                scalar_time * 1e6,
+                array_time * 1e6,
+                scalar_time / array_time,
+            ))
+
+
+if __name__ == '__main__':
+    main(parse_args())
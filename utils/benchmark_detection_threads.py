@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark marker detection latency as the number of detector threads grows.
+
+Every image is detected once per thread count, after a warm-up pass, and the
+per-frame latency is summarised for each thread count.
+"""
+
+import argparse
+import collections
+import pathlib
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from sb_vision.native.apriltag import AprilTagDetector
+
+CALIBRATIONS = pathlib.Path(__file__).parent.parent / 'calibrations'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'images',
+        metavar='IMAGE_FILE',
+        type=pathlib.Path,
+        nargs='*',
+        help="Images to detect markers in, default: all images under {}".format(
+            CALIBRATIONS,
+        ),
+    )
+    parser.add_argument(
+        '--max-threads',
+        type=int,
+        default=4,
+        help="The largest number of threads to try, default: %(default)s",
+    )
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=1,
+        help="The number of times to detect each image, default: %(default)s",
+    )
+    return parser.parse_args()
+
+
+def load_images(paths):
+    by_size = collections.defaultdict(list)
+    for path in paths:
+        array = np.asarray(Image.open(str(path)).convert('L'))
+        by_size[(array.shape[1], array.shape[0])].append(array)
+    return by_size
+
+
+def time_detections(detector, images, repeats):
+    durations = []
+    for _ in range(repeats):
+        for image in images:
+            start = time.perf_counter()
+            for _ in detector.detect_tags_in_buffer(image):
+                pass
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main(args):
+    paths = args.images or sorted(CALIBRATIONS.glob('**/*.jpg'))
+    images_by_size = load_images(paths)
+
+    print("{} images, {} size(s)".format(
+        len(paths),
+        len(images_by_size),
+    ))
+    print("threads  mean (ms)  median (ms)  min (ms)  speedup")
+
+    baseline = None
+    for nthreads in range(1, args.max_threads + 1):
+        durations = []
+        for size, images in images_by_size.items():
+            with AprilTagDetector(size, nthreads=nthreads) as detector:
+                # Warm up, so that the worker pool exists and caches are hot
+                time_detections(detector, images[:1], 1)
+                durations += time_detections(detector, images, args.repeats)
+
+        mean = statistics.mean(durations)
+        if baseline is None:
+            baseline = mean
+
+        print("{:7d}  {:9.1f}  {:11.1f}  {:8.1f}  {:6.2f}x".format(
+            nthreads,
+            mean * 1000,
+            statistics.median(durations) * 1000,
+            min(durations) * 1000,
+            baseline / mean,
+        ))
+
+
+if __name__ == '__main__':
+    main(parse_args())
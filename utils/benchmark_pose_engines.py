@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""
+Compare the speed and accuracy of the pose engines.
+
+Markers are detected once in each of the distance-labelled images, whose names
+give the position of the marker (for example "1.5z-0.2x.jpg"), then the poses of
+those markers are repeatedly calculated by each engine.
+"""
+
+import argparse
+import pathlib
+import re
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from sb_vision.find_3D_coords import (
+    calculate_transforms_batch,
+    load_camera_calibrations,
+)
+from sb_vision.game_specific import MARKER_SIZE_DEFAULT, MARKER_SIZES
+from sb_vision.native.apriltag import AprilTagDetector
+from sb_vision.pose import PoseEngine
+from sb_vision.tokens import Token
+
+CALIBRATIONS = pathlib.Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+
+LABEL_RE = re.compile(r'^(?P<z>-?[\d.]+)z(?P<x>-?[\d.]+)x$')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'directory',
+        type=pathlib.Path,
+        nargs='?',
+        default=CALIBRATIONS,
+        help="Directory of labelled images, default: %(default)s",
+    )
+    parser.add_argument(
+        '--camera-model',
+        default='C016',
+        help="The model of the camera which took the images, default: %(default)s",
+    )
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=100,
+        help="The number of times to calculate each pose, default: %(default)s",
+    )
+    return parser.parse_args()
+
+
+def load_markers(directory):
+    markers = []
+    for path in sorted(directory.glob('*.jpg')):
+        match = LABEL_RE.match(path.stem)
+        if match is None:
+            continue
+
+        image = Image.open(str(path)).convert('L')
+        with AprilTagDetector(image.size) as detector:
+            tokens = Token.from_apriltag_detections(
+                detector.detect_tags_in_buffer(np.asarray(image)),
+                image.size,
+                camera_model=None,
+            )
+
+        if len(tokens) != 1:
+            print("Skipping {} ({} markers found)".format(path.name, len(tokens)))
+            continue
+
+        expected = (float(match.group('x')), 0.0, float(match.group('z')))
+        markers.append((image.size, tokens[0], expected))
+
+    return markers
+
+
+def main(args):
+    markers = load_markers(args.directory)
+    print("{} labelled images".format(len(markers)))
+    print("engine       mean (us)  mean error (%)  max error (%)")
+
+    for engine in PoseEngine:
+        if not engine.is_supported():
+            print("{:11s}  not supported by this version of OpenCV".format(
+                engine.value,
+            ))
+            continue
+
+        durations = []
+        errors = []
+        for image_size, token, expected in markers:
+            calibration = load_camera_calibrations(args.camera_model, image_size)
+
+            arguments = (
+                [MARKER_SIZES.get(token.id, MARKER_SIZE_DEFAULT)],
+                [token.pixel_corners[1:] + token.pixel_corners[:1]],
+                calibration,
+            )
+            keywords = {
+                'pose_engine': engine,
+                'homographies': [token.homography_matrix],
+            }
+
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                translations, _ = calculate_transforms_batch(*arguments, **keywords)
+            durations.append((time.perf_counter() - start) / args.repeats)
+
+            # As a percentage of the distance to the marker
+            error = np.linalg.norm(translations[0] - expected)
+            errors.append(100 * float(error / np.linalg.norm(expected)))
+
+        print("{:11s}  {:9.1f}  {:14.1f}  {:13.1f}".format(
+            engine.value,
+            statistics.mean(durations) * 1e6,
+            statistics.mean(errors),
+            max(errors),
+        ))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Compare the frame rate of sequential snapshots with that of a stream.
+
+Images are "captured" from a file, taking a configurable time to do so to
+stand in for the time a camera takes to grab a frame. Snapshots wait for each
+capture in turn, while the stream captures the next frame while detecting the
+markers in the previous one.
+"""
+
+import argparse
+import pathlib
+import time
+
+from sb_vision import FileCamera, Vision
+
+CALIBRATIONS = pathlib.Path(__file__).parent.parent / 'calibrations' / 'tecknet_25cm'
+IMAGE = CALIBRATIONS / '1.5z-0.2x.jpg'
+
+
+class SlowFileCamera(FileCamera):
+    def __init__(self, file_path, camera_model, capture_time):
+        super().__init__(file_path, camera_model)
+        self.capture_time = capture_time
+
+    def capture_frame(self):
+        time.sleep(self.capture_time)
+        return super().capture_frame()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'image',
+        type=pathlib.Path,
+        nargs='?',
+        default=IMAGE,
+        help="Image to detect markers in, default: %(default)s",
+    )
+    parser.add_argument(
+        '--camera-model',
+        default='C016',
+        help="The model of the camera which took the image, default: %(default)s",
+    )
+    parser.add_argument(
+        '--capture-time',
+        type=float,
+        default=0.03,
+        help="Seconds taken to capture each frame, default: %(default)s",
+    )
+    parser.add_argument(
+        '--frames',
+        type=int,
+        default=50,
+        help="The number of frames to process, default: %(default)s",
+    )
+    parser.add_argument(
+        '--depth',
+        type=int,
+        default=2,
+        help="The depth of the stream's queues, default: %(default)s",
+    )
+    return parser.parse_args()
+
+
+def vision(args):
+    camera = SlowFileCamera(args.image, args.camera_model, args.capture_time)
+    return Vision(camera)
+
+
+def time_snapshots(args):
+    snapshot_vision = vision(args)
+    snapshot_vision.snapshot()
+
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        snapshot_vision.snapshot_token_set()
+    return time.perf_counter() - start
+
+
+def time_stream(args):
+    stream_vision = vision(args)
+    # Without dropping frames, so that the same number are processed
+    with stream_vision.stream(depth=args.depth, drop_oldest=False) as stream:
+        next(stream)
+
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            next(stream)
+        return time.perf_counter() - start
+
+
+def main(args):
+    print("{} frames, {:.1f} ms capture time".format(
+        args.frames,
+        args.capture_time * 1000,
+    ))
+    print("method     per frame (ms)  frames/s")
+
+    for name, function in (
+        ('snapshot', time_snapshots),
+        ('stream', time_stream),
+    ):
+        duration = function(args)
+        print("{:9s}  {:14.1f}  {:8.1f}".format(
+            name,
+            duration / args.frames * 1000,
+            args.frames / duration,
+        ))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -13,8 +13,16 @@ import time
 
 from PIL import Image
 
+from sb_vision.capture_backends import (
+    DEFAULT_BUFFER_COUNT,
+    DEFAULT_SYNTHETIC_FPS,
+    SyntheticBackend,
+    V4L2Backend,
+)
 from sb_vision.cvcapture import CaptureDevice
 
+BACKENDS = ('opencv', 'v4l2', 'synthetic')
+
 
 class Stopwatch:
     @staticmethod
@@ -88,7 +96,9 @@ def parse_args():
         help="The file name and path to use for the images, optionally with a "
              "placeholder for the index of the image within the current "
              "sequence. For example: '/tmp/foo-{}.png' will result in images "
-             "'/tmp/foo-0.png',' /tmp/foo-1.png' and so on.",
+             "'/tmp/foo-0.png',' /tmp/foo-1.png' and so on. A '{pixel_format}' "
+             "placeholder is replaced by the pixel format requested, and is "
+             "required when several are.",
     )
     parser.add_argument(
         '--resolution',
@@ -111,17 +121,98 @@ def parse_args():
         '--timings',
         action='store_true',
         default=False,
-        help="Print the time take to capture each image",
+        help="Print the time take to capture each image, and the frame rate "
+             "achieved when streaming",
+    )
+    parser.add_argument(
+        '--pixel-format',
+        metavar='FOURCC',
+        action='append',
+        dest='pixel_formats',
+        help="The pixel format to request from the device, such as MJPG or "
+             "YUYV. May be given several times to capture (and time) each in "
+             "turn, default: the device's choice",
+    )
+    parser.add_argument(
+        '--fps',
+        type=float,
+        default=None,
+        help="The frame rate to request from the device, default: the device's "
+             "choice",
+    )
+    parser.add_argument(
+        '--fps-frames',
+        type=int,
+        default=30,
+        help="The number of frames to stream when measuring the frame rate "
+             "achieved, default: %(default)s",
+    )
+    parser.add_argument(
+        '--backend',
+        choices=BACKENDS,
+        default='opencv',
+        help="How to capture from the device; 'synthetic' generates frames "
+             "without a camera, default: %(default)s",
+    )
+    parser.add_argument(
+        '--buffer-count',
+        type=int,
+        default=DEFAULT_BUFFER_COUNT,
+        help="The number of kernel buffers to capture into, for the v4l2 "
+             "backend, default: %(default)s",
     )
-    return parser.parse_args()
 
+    args = parser.parse_args()
 
-def main(args):
+    # Otherwise the images of each format would overwrite those of the last
+    pixel_formats = args.pixel_formats or ()
+    if len(pixel_formats) > 1 and '{pixel_format}' not in args.image_template:
+        parser.error(
+            "image_template must contain a '{pixel_format}' placeholder when "
+            "capturing in several pixel formats",
+        )
+
+    return args
+
+
+def measure_fps(capture_device, resolution, num_frames):
+    capture_device.start_streaming(*resolution)
+    try:
+        timestamps = []
+        for _ in range(num_frames + 1):
+            # Wait for a frame grabbed after this one was asked for, so that
+            # each is a new frame
+            with capture_device.acquire_frame(*resolution, max_age=0) as frame:
+                timestamps.append(frame.timestamp)
+    finally:
+        capture_device.stop_streaming()
+
+    return num_frames / (timestamps[-1] - timestamps[0])
+
+
+def open_device(args, pixel_format):
+    if args.backend == 'v4l2':
+        return CaptureDevice.from_backend(V4L2Backend(
+            args.device_id,
+            pixel_format=pixel_format,
+            fps=args.fps,
+            buffer_count=args.buffer_count,
+        ))
+
+    if args.backend == 'synthetic':
+        return CaptureDevice.from_backend(
+            SyntheticBackend(args.fps or DEFAULT_SYNTHETIC_FPS),
+        )
+
+    return CaptureDevice(args.device_id, pixel_format=pixel_format, fps=args.fps)
+
+
+def capture_images(args, pixel_format):
     stopwatch = Stopwatch(on_stop=Stopwatch.print_duration if args.timings else lambda x: None)
 
     with stopwatch:
         print("Initialising camera...")
-        capture_device = CaptureDevice(args.device_id)
+        capture_device = open_device(args, pixel_format)
 
     with capture_device:
         for num in range(args.num_images):
@@ -132,12 +223,30 @@ def main(args):
 
             image = Image.frombytes('L', args.resolution, image_bytes)
 
-            file_name = args.image_template.format(num)
+            file_name = args.image_template.format(num, pixel_format=pixel_format)
             with open(file_name, mode='wb') as f:
                 image.save(f)
 
             print("done")
 
+        if args.timings:
+            # Read back after capturing, as the format and frame rate are
+            # negotiated again for the resolution
+            print("Pixel format: {} (requested {}), frame rate: {} (requested {})".format(
+                capture_device.pixel_format,
+                pixel_format,
+                capture_device.fps,
+                args.fps,
+            ))
+            print("Achieved {:.1f} fps".format(
+                measure_fps(capture_device, args.resolution, args.fps_frames),
+            ))
+
+
+def main(args):
+    for pixel_format in args.pixel_formats or [None]:
+        capture_images(args, pixel_format)
+
 
 if __name__ == '__main__':
     main(parse_args())